@@ -0,0 +1,176 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark the embedding lookup methods of EmbeddingSharedWeights.
+
+The embeddings of a batch of Zipf-distributed ids (most ids of natural text are
+frequent tokens, so ids repeat within a batch) are computed, and the gradient
+of the shared weights is computed from them, with every method of
+embedding_layer.EMBEDDING_METHODS. Every method and batch shape is run in a
+fresh process, so that the peak resident memory of the matmul method's one-hot
+tensors is measured separately. The method picked by
+embedding_layer.choose_method is logged too. Run from the repository root, e.g.:
+
+  python -m benchmark.embedding_benchmark --vocab_size=33708 \
+      --batch_size_values=16,64 --length=64
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import multiprocessing
+import resource
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from model import embedding_layer
+
+
+def make_ids(batch_size, length, vocab_size, zipf_exponent, rng):
+    """Return [batch_size, length] ids drawn from a Zipf distribution."""
+    ids = rng.zipf(zipf_exponent, size=[batch_size, length])
+    # The Zipf samples start at 1, so that no id is padding.
+    return np.minimum(ids, vocab_size - 1).astype(np.int64)
+
+
+def _run_method(args):
+    """Return the step time and the peak memory of one method."""
+    (method, batch_size, length, vocab_size, hidden_size, zipf_exponent,
+     warmup_steps, steps, seed) = args
+    ids = make_ids(batch_size, length, vocab_size, zipf_exponent,
+                   np.random.RandomState(seed))
+
+    with tf.Graph().as_default():
+        tf.set_random_seed(seed)
+        layer = embedding_layer.EmbeddingSharedWeights(
+            vocab_size, hidden_size, method=method)
+        embeddings = layer(tf.constant(ids))
+        gradient = tf.gradients(tf.reduce_sum(embeddings), layer.shared_weights)[0]
+        # Apply the gradient the way the optimizers do, so that an IndexedSlices
+        # gradient is not converted to a dense tensor.
+        if isinstance(gradient, tf.IndexedSlices):
+            update = tf.scatter_sub(layer.shared_weights, gradient.indices,
+                                    gradient.values)
+        else:
+            update = tf.assign_sub(layer.shared_weights, gradient)
+        step = tf.group(update)
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            for _ in range(warmup_steps):
+                sess.run(step)
+            start = time.time()
+            for _ in range(steps):
+                sess.run(step)
+            step_msec = 1000. * (time.time() - start) / steps
+
+    # ru_maxrss is in kilobytes on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"step_msec": step_msec,
+            "peak_rss_mb": peak_rss / 1024.,
+            "unique_ratio": len(np.unique(ids)) / float(ids.size)}
+
+
+def run_benchmark(flags_obj):
+    """Run every method with every batch size in its own process, and log it."""
+    benchmark_logger = logger.get_benchmark_logger()
+    context = multiprocessing.get_context("spawn")
+
+    units = {"step_msec": "ms", "peak_rss_mb": "MB", "unique_ratio": None}
+    for batch_size, method in itertools.product(
+            [int(v) for v in flags_obj.batch_size_values],
+            flags_obj.method_values):
+        if method not in embedding_layer.EMBEDDING_METHODS:
+            raise ValueError("Unknown embedding method: %s" % method)
+        args = (method, batch_size, flags_obj.length, flags_obj.vocab_size,
+                flags_obj.hidden_size, flags_obj.zipf_exponent,
+                flags_obj.warmup_steps, flags_obj.steps, flags_obj.seed)
+        pool = context.Pool(1)
+        try:
+            results = pool.apply(_run_method, (args,))
+        finally:
+            pool.close()
+            pool.join()
+
+        num_tokens = batch_size * flags_obj.length
+        extras = {"method": method,
+                  "auto_method": embedding_layer.choose_method(
+                      flags_obj.vocab_size, num_tokens, False),
+                  "batch_size": batch_size,
+                  "length": flags_obj.length,
+                  "vocab_size": flags_obj.vocab_size,
+                  "hidden_size": flags_obj.hidden_size}
+        tf.logging.info("%s: %s" % (extras, results))
+        for name, value in sorted(results.items()):
+            benchmark_logger.log_metric(
+                name, value, unit=units[name], extras=extras)
+
+
+def define_embedding_benchmark_flags():
+    """Define flags used by the embedding benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_integer(
+        name="vocab_size", short_name="vs", default=33708,
+        help=flags_core.help_wrap("Number of rows of the embedding."))
+    flags.DEFINE_integer(
+        name="hidden_size", short_name="hs", default=512,
+        help=flags_core.help_wrap("Dimensionality of the embedding."))
+    flags.DEFINE_list(
+        name="batch_size_values", default=["16", "64"],
+        help=flags_core.help_wrap("Numbers of sequences per batch."))
+    flags.DEFINE_integer(
+        name="length", default=64,
+        help=flags_core.help_wrap("Number of ids per sequence."))
+    flags.DEFINE_list(
+        name="method_values", default=list(embedding_layer.EMBEDDING_METHODS),
+        help=flags_core.help_wrap(
+            "Embedding lookup methods. Possible values: %s" %
+            ", ".join(embedding_layer.EMBEDDING_METHODS)))
+    flags.DEFINE_float(
+        name="zipf_exponent", default=1.2,
+        help=flags_core.help_wrap(
+            "Exponent of the Zipf distribution of the ids. Larger values repeat "
+            "the frequent ids more often."))
+    flags.DEFINE_integer(
+        name="warmup_steps", short_name="ws", default=3,
+        help=flags_core.help_wrap("Number of untimed steps."))
+    flags.DEFINE_integer(
+        name="steps", default=20,
+        help=flags_core.help_wrap("Number of timed steps."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap("Seed of the ids and of the weights."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_embedding_benchmark_flags()
+    absl_app.run(main)
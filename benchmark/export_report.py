@@ -0,0 +1,177 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Compare loading and serving an exported SavedModel and its frozen graph.
+
+The SavedModel exported with --export_dir and the frozen graph exported with
+--export_frozen (see transformer_main.export_frozen_graph) are each loaded in a
+fresh process, which then translates the same batch of random ids twice. The
+size on disk, the load time and the latency of the first and second requests
+are logged for each model. Run from the repository root, e.g.:
+
+  python -m benchmark.export_report \
+      --saved_model_dir=/tmp/export/1540000000 --frozen_dir=/tmp/export/frozen
+
+The first request includes the one-time graph optimizations of the session,
+which the folded constants of the frozen graph make shorter.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import multiprocessing
+import os
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from utils import tokenizer
+
+
+def _get_size(path):
+    """Return the total size of the files under path, in bytes."""
+    size = 0
+    for dirname, _, filenames in tf.gfile.Walk(path):
+        for filename in filenames:
+            size += tf.gfile.Stat(os.path.join(dirname, filename)).length
+    return size
+
+
+def _load_saved_model(sess, saved_model_dir):
+    """Load the SavedModel, and return its (input, output) tensor names."""
+    meta_graph_def = tf.saved_model.loader.load(
+        sess, [tf.saved_model.tag_constants.SERVING], saved_model_dir)
+    signature = meta_graph_def.signature_def[
+        tf.saved_model.signature_constants.DEFAULT_SERVING_SIGNATURE_DEF_KEY]
+    return (list(signature.inputs.values())[0].name,
+            signature.outputs["outputs"].name)
+
+
+def _load_frozen_graph(sess, frozen_dir):
+    """Import the frozen graph, and return its (input, output) tensor names."""
+    with tf.gfile.Open(os.path.join(frozen_dir, "signature.json")) as f:
+        signature = json.load(f)
+    graph_def = tf.GraphDef()
+    with tf.gfile.GFile(os.path.join(frozen_dir, "frozen_graph.pb"), "rb") as f:
+        graph_def.ParseFromString(f.read())
+    with sess.graph.as_default():
+        tf.import_graph_def(graph_def, name="")
+    return (list(signature["inputs"].values())[0],
+            signature["outputs"]["outputs"])
+
+
+def _run_model(args):
+    """Load a model and time its first two requests.
+
+    Returns:
+      Dictionary of load_time_sec, first_request_ms and second_request_ms.
+    """
+    model_type, path, inputs = args
+    with tf.Graph().as_default():
+        with tf.Session() as sess:
+            start = time.time()
+            if model_type == "saved_model":
+                input_name, output_name = _load_saved_model(sess, path)
+            else:
+                input_name, output_name = _load_frozen_graph(sess, path)
+            load_time = time.time() - start
+
+            latencies = []
+            for _ in range(2):
+                start = time.time()
+                sess.run(output_name, feed_dict={input_name: inputs})
+                latencies.append(time.time() - start)
+    return {"load_time_sec": load_time,
+            "first_request_ms": 1000. * latencies[0],
+            "second_request_ms": 1000. * latencies[1]}
+
+
+def run_report(flags_obj):
+    """Load and query every model in its own process, and log the results."""
+    benchmark_logger = logger.get_benchmark_logger()
+    context = multiprocessing.get_context("spawn")
+    inputs = np.random.RandomState(flags_obj.seed).randint(
+        tokenizer.EOS_ID + 1, flags_obj.max_id,
+        size=[flags_obj.batch_size, flags_obj.input_length])
+    inputs[:, -1] = tokenizer.EOS_ID
+
+    units = {"load_time_sec": "sec", "first_request_ms": "ms",
+             "second_request_ms": "ms", "size_mb": "MB"}
+    models = [("saved_model", flags_obj.saved_model_dir),
+              ("frozen_graph", flags_obj.frozen_dir)]
+    for model_type, path in models:
+        pool = context.Pool(1)
+        try:
+            results = pool.apply(_run_model, ((model_type, path, inputs),))
+        finally:
+            pool.close()
+            pool.join()
+        results["size_mb"] = _get_size(path) / 2. ** 20
+
+        extras = {"model": model_type, "batch_size": flags_obj.batch_size,
+                  "input_length": flags_obj.input_length}
+        tf.logging.info("%s: %s" % (extras, results))
+        for name, value in sorted(results.items()):
+            benchmark_logger.log_metric(
+                name, value, unit=units[name], extras=extras)
+
+
+def define_export_report_flags():
+    """Define flags used by the export report."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_string(
+        name="saved_model_dir", short_name="smd", default=None,
+        help=flags_core.help_wrap(
+            "Directory of the SavedModel, e.g. <--export_dir>/<timestamp>."))
+    flags.DEFINE_string(
+        name="frozen_dir", short_name="fd", default=None,
+        help=flags_core.help_wrap(
+            "Directory of the frozen graph, e.g. <--export_dir>/frozen."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=1,
+        help=flags_core.help_wrap("Number of sentences per request."))
+    flags.DEFINE_integer(
+        name="input_length", short_name="il", default=20,
+        help=flags_core.help_wrap("Number of tokens per sentence, with EOS."))
+    flags.DEFINE_integer(
+        name="max_id", default=100,
+        help=flags_core.help_wrap(
+            "The random input ids are lower than this id, which must not be "
+            "larger than the vocabulary size of the model."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap("Seed of the random input ids."))
+    flags.mark_flags_as_required(["saved_model_dir", "frozen_dir"])
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_report(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_export_report_flags()
+    absl_app.run(main)
@@ -0,0 +1,168 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark the padding strategies of the feedforward networks.
+
+An encoder stack is run forward and backward on random inputs whose padding
+ratio is controlled, with the padding positions of the feedforward networks
+handled by every strategy:
+
+  none: the padding positions are not skipped (allow_ffn_pad=False).
+  remove, shared, dense: see ffn_layer.PAD_STRATEGIES.
+
+The mean step time of every strategy is logged for every padding ratio, along
+with the fastest strategy. Run from the repository root, e.g.:
+
+  python -m benchmark.ffn_padding_benchmark --param_set=base \
+      --padding_ratio_values=0,0.1,0.25,0.5,0.75
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from model import ffn_layer
+from model import model_params
+from model import model_utils
+from model import transformer
+
+PARAMS_MAP = {
+    "tiny": model_params.TINY_PARAMS,
+    "hkh": model_params.HKH_PARAMS,
+    "base": model_params.BASE_PARAMS,
+    "big": model_params.BIG_PARAMS,
+}
+
+_STRATEGIES = ("none",) + ffn_layer.PAD_STRATEGIES
+
+
+def make_inputs(batch_size, length, padding_ratio):
+    """Return ids of [batch_size, length] with about padding_ratio padding."""
+    num_tokens = max(1, int(round((1. - padding_ratio) * length)))
+    ids = np.zeros([batch_size, length], dtype=np.int64)
+    ids[:, :num_tokens] = 1
+    return ids
+
+
+def _time_encoder(params, ids, warmup_steps, steps, seed):
+    """Return the mean time of a forward and backward encoder step, in msec."""
+    with tf.Graph().as_default():
+        tf.set_random_seed(seed)
+        inputs = tf.constant(ids)
+        # A variable, so that the inputs are not constant folded.
+        encoder_inputs = tf.Variable(tf.random_normal(
+            [ids.shape[0], ids.shape[1], params["hidden_size"]]))
+        encoder_stack = transformer.EncoderStack(params, True)
+        outputs = encoder_stack(
+            encoder_inputs, model_utils.get_padding_bias(inputs),
+            model_utils.get_padding(inputs))
+        step = tf.group(*tf.gradients(
+            tf.reduce_sum(outputs), tf.trainable_variables()))
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            for _ in range(warmup_steps):
+                sess.run(step)
+            start = time.time()
+            for _ in range(steps):
+                sess.run(step)
+            return 1000. * (time.time() - start) / steps
+
+
+def run_benchmark(flags_obj):
+    """Time every strategy at every padding ratio, and log the results."""
+    benchmark_logger = logger.get_benchmark_logger()
+    params = PARAMS_MAP[flags_obj.param_set].copy()
+
+    for padding_ratio in [float(v) for v in flags_obj.padding_ratio_values]:
+        ids = make_inputs(flags_obj.batch_size, flags_obj.length, padding_ratio)
+        actual_ratio = float((ids == 0).mean())
+
+        step_msecs = {}
+        for strategy in flags_obj.strategy_values:
+            if strategy not in _STRATEGIES:
+                raise ValueError("Unknown padding strategy: %s" % strategy)
+            params["allow_ffn_pad"] = strategy != "none"
+            params["ffn_pad_strategy"] = None if strategy == "none" else strategy
+            step_msecs[strategy] = _time_encoder(
+                params, ids, flags_obj.warmup_steps, flags_obj.steps,
+                flags_obj.seed)
+
+            extras = {"param_set": flags_obj.param_set,
+                      "strategy": strategy,
+                      "padding_ratio": actual_ratio,
+                      "batch_size": flags_obj.batch_size,
+                      "length": flags_obj.length}
+            benchmark_logger.log_metric(
+                "step_msec", step_msecs[strategy], unit="ms", extras=extras)
+
+        tf.logging.info("Padding ratio %.2f: %s, fastest: %s" % (
+            actual_ratio,
+            ", ".join("%s %.2f ms" % item for item in sorted(step_msecs.items())),
+            min(step_msecs, key=step_msecs.get)))
+
+
+def define_ffn_padding_benchmark_flags():
+    """Define flags used by the feedforward padding benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_enum(
+        name="param_set", short_name="ps", default="base",
+        enum_values=list(PARAMS_MAP.keys()),
+        help=flags_core.help_wrap("Parameter set of the benchmarked encoder."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=32,
+        help=flags_core.help_wrap("Number of sequences per batch."))
+    flags.DEFINE_integer(
+        name="length", default=64,
+        help=flags_core.help_wrap("Number of positions per sequence."))
+    flags.DEFINE_list(
+        name="padding_ratio_values", default=["0", "0.1", "0.25", "0.5", "0.75"],
+        help=flags_core.help_wrap("Fractions of padding positions."))
+    flags.DEFINE_list(
+        name="strategy_values", default=list(_STRATEGIES),
+        help=flags_core.help_wrap(
+            "Padding strategies. Possible values: %s" % ", ".join(_STRATEGIES)))
+    flags.DEFINE_integer(
+        name="warmup_steps", short_name="ws", default=5,
+        help=flags_core.help_wrap("Number of untimed steps."))
+    flags.DEFINE_integer(
+        name="steps", default=20,
+        help=flags_core.help_wrap("Number of timed steps."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap("Seed of the inputs and of the weights."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_ffn_padding_benchmark_flags()
+    absl_app.run(main)
@@ -0,0 +1,249 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark beam search decoding of a randomly initialized Transformer.
+
+A synthetic corpus is drawn with a controlled sentence length distribution and
+translated batch by batch, the way translate.py does, for every combination of
+batch size, beam size, extra decode length and alpha. For each combination the
+sentences/sec, output tokens/sec and the per-batch latency distribution are
+logged with the benchmark logger, e.g. as JSON lines with:
+
+  python -m benchmark.inference_benchmark --param_set=tiny \
+      --benchmark_logger_type=BenchmarkFileLogger --benchmark_log_dir=/tmp/bm \
+      --batch_size_values=1,32 --beam_size_values=1,4
+
+The model weights and the corpus only depend on --seed, so that the results of
+different commits can be compared. Note that a randomly initialized model
+rarely emits EOS, so most sentences are decoded up to the maximum length.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from model import model_params
+from model import transformer
+from utils import tokenizer
+
+PARAMS_MAP = {
+    "tiny": model_params.TINY_PARAMS,
+    "hkh": model_params.HKH_PARAMS,
+    "base": model_params.BASE_PARAMS,
+    "big": model_params.BIG_PARAMS,
+}
+
+_LENGTH_DISTRIBUTIONS = ["fixed", "uniform", "normal"]
+
+
+def generate_corpus(num_sentences, length_distribution, mean_length, max_length,
+                    vocab_size, rng):
+    """Return a list of random id sequences, each ending with EOS.
+
+    Args:
+      num_sentences: Number of sentences in the corpus.
+      length_distribution: One of "fixed" (every sentence has mean_length
+        tokens), "uniform" (between 1 and 2 * mean_length - 1 tokens) or
+        "normal" (standard deviation of mean_length / 2).
+      mean_length: Mean number of tokens per sentence, without EOS.
+      max_length: Sentences are clipped to this number of tokens.
+      vocab_size: Ids are drawn uniformly from the non-reserved ids.
+      rng: numpy RandomState.
+    """
+    if length_distribution == "fixed":
+        lengths = np.full(num_sentences, mean_length)
+    elif length_distribution == "uniform":
+        lengths = rng.randint(1, 2 * mean_length, size=num_sentences)
+    elif length_distribution == "normal":
+        lengths = np.round(rng.normal(mean_length, mean_length / 2.,
+                                      size=num_sentences))
+    else:
+        raise ValueError("Unknown length distribution: %s" % length_distribution)
+    lengths = np.clip(lengths, 1, max_length).astype(np.int64)
+
+    ids = rng.randint(tokenizer.EOS_ID + 1, vocab_size, size=lengths.sum())
+    return [np.append(sentence, tokenizer.EOS_ID)
+            for sentence in np.split(ids, np.cumsum(lengths)[:-1])]
+
+
+def make_batches(corpus, batch_size):
+    """Group the corpus in padded batches of sentences sorted by length."""
+    corpus = sorted(corpus, key=len)
+    batches = []
+    for i in range(0, len(corpus), batch_size):
+        sentences = corpus[i:i + batch_size]
+        batch = np.zeros([len(sentences), max(len(s) for s in sentences)],
+                         dtype=np.int64)
+        for j, sentence in enumerate(sentences):
+            batch[j, :len(sentence)] = sentence
+        batches.append(batch)
+    return batches
+
+
+def _output_lengths(outputs):
+    """Return the number of decoded ids of each output, including EOS."""
+    is_eos = outputs == tokenizer.EOS_ID
+    return np.where(is_eos.any(axis=1), is_eos.argmax(axis=1) + 1,
+                    outputs.shape[1])
+
+
+def _benchmark_decoding(sess, inputs, outputs, batches, warmup_batches):
+    """Decode every batch, and return (latencies, sentences, output tokens)."""
+    for batch in batches[:warmup_batches]:
+        sess.run(outputs, feed_dict={inputs: batch})
+
+    latencies = []
+    num_sentences = 0
+    num_tokens = 0
+    for batch in batches:
+        start = time.time()
+        decoded = sess.run(outputs, feed_dict={inputs: batch})
+        latencies.append(time.time() - start)
+        num_sentences += len(batch)
+        num_tokens += int(_output_lengths(decoded).sum())
+    return np.array(latencies), num_sentences, num_tokens
+
+
+def run_benchmark(flags_obj):
+    """Decode the synthetic corpus with every configuration, and log metrics."""
+    benchmark_logger = logger.get_benchmark_logger()
+    params = PARAMS_MAP[flags_obj.param_set].copy()
+    if flags_obj.vocab_size:
+        params["vocab_size"] = flags_obj.vocab_size
+
+    corpus = generate_corpus(
+        flags_obj.num_sentences, flags_obj.length_distribution,
+        flags_obj.mean_length, flags_obj.max_length, params["vocab_size"],
+        np.random.RandomState(flags_obj.seed))
+    batch_sizes = [int(v) for v in flags_obj.batch_size_values]
+
+    configs = itertools.product(
+        [int(v) for v in flags_obj.beam_size_values],
+        [int(v) for v in flags_obj.extra_decode_length_values],
+        [float(v) for v in flags_obj.alpha_values])
+    for beam_size, extra_decode_length, alpha in configs:
+        params["beam_size"] = beam_size
+        params["extra_decode_length"] = extra_decode_length
+        params["alpha"] = alpha
+
+        with tf.Graph().as_default():
+            tf.set_random_seed(flags_obj.seed)
+            inputs = tf.placeholder(tf.int64, [None, None], name="inputs")
+            outputs = transformer.Transformer(params, train=False)(inputs)["outputs"]
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for batch_size in batch_sizes:
+                    latencies, num_sentences, num_tokens = _benchmark_decoding(
+                        sess, inputs, outputs, make_batches(corpus, batch_size),
+                        flags_obj.warmup_batches)
+                    elapsed = latencies.sum()
+
+                    extras = {"param_set": flags_obj.param_set,
+                              "batch_size": batch_size,
+                              "beam_size": beam_size,
+                              "extra_decode_length": extra_decode_length,
+                              "alpha": alpha,
+                              "length_distribution": flags_obj.length_distribution,
+                              "mean_length": flags_obj.mean_length}
+                    tf.logging.info(
+                        "%s: %.2f sentences/sec, %.1f tokens/sec" % (
+                            extras, num_sentences / elapsed, num_tokens / elapsed))
+                    benchmark_logger.log_metric(
+                        "sentences_per_sec", num_sentences / elapsed,
+                        unit="sentences/sec", extras=extras)
+                    benchmark_logger.log_metric(
+                        "tokens_per_sec", num_tokens / elapsed,
+                        unit="tokens/sec", extras=extras)
+                    benchmark_logger.log_metric(
+                        "latency_mean", 1000. * latencies.mean(), unit="ms",
+                        extras=extras)
+                    for p in (50, 90, 99):
+                        benchmark_logger.log_metric(
+                            "latency_p%d" % p,
+                            1000. * np.percentile(latencies, p), unit="ms",
+                            extras=extras)
+
+
+def define_inference_benchmark_flags():
+    """Define flags used by the inference benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_enum(
+        name="param_set", short_name="ps", default="tiny",
+        enum_values=list(PARAMS_MAP.keys()),
+        help=flags_core.help_wrap("Parameter set of the benchmarked model."))
+    flags.DEFINE_integer(
+        name="vocab_size", short_name="vs", default=None,
+        help=flags_core.help_wrap(
+            "Vocabulary size of the model. Defaults to the vocabulary size of "
+            "--param_set."))
+    flags.DEFINE_integer(
+        name="num_sentences", short_name="ns", default=256,
+        help=flags_core.help_wrap("Number of sentences in the synthetic corpus."))
+    flags.DEFINE_enum(
+        name="length_distribution", short_name="ld", default="normal",
+        enum_values=_LENGTH_DISTRIBUTIONS,
+        help=flags_core.help_wrap("Distribution of the sentence lengths."))
+    flags.DEFINE_integer(
+        name="mean_length", short_name="ml", default=20,
+        help=flags_core.help_wrap("Mean number of tokens per sentence."))
+    flags.DEFINE_integer(
+        name="max_length", default=100,
+        help=flags_core.help_wrap("Maximum number of tokens per sentence."))
+    flags.DEFINE_integer(
+        name="warmup_batches", short_name="wb", default=1,
+        help=flags_core.help_wrap(
+            "Number of untimed batches decoded before each configuration."))
+    flags.DEFINE_list(
+        name="batch_size_values", default=["1", "32"],
+        help=flags_core.help_wrap("Numbers of sentences per batch."))
+    flags.DEFINE_list(
+        name="beam_size_values", default=["4"],
+        help=flags_core.help_wrap("Beam sizes."))
+    flags.DEFINE_list(
+        name="extra_decode_length_values", default=["50"],
+        help=flags_core.help_wrap(
+            "Numbers of tokens that may be decoded after the input length."))
+    flags.DEFINE_list(
+        name="alpha_values", default=["0.6"],
+        help=flags_core.help_wrap("Strengths of the length normalization."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap(
+            "Seed of the model weights and of the synthetic corpus."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_inference_benchmark_flags()
+    absl_app.run(main)
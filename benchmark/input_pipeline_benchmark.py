@@ -0,0 +1,379 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark the input pipelines without the model.
+
+A synthetic corpus is written locally both as TFRecord shards (read by
+`dataset._read_and_batch_from_files`) and as parallel text files with a word
+vocabulary (read by `data_utils.get_dataset`). Each pipeline is then iterated
+on its own, stage by stage:
+
+  tfrecord: read (interleaved records), parse (tf.Examples), batch (full
+    pipeline).
+  text: read (zipped lines), process (split, lookup and add SOS/EOS), batch
+    (full pipeline, including the shuffle buffer).
+
+Every stage includes the previous ones, so the difference between the
+per-element latencies of two stages is the cost of the later stage. Each stage
+runs in a fresh process. The elements (or batches) per second, tokens per
+second, fraction of padding tokens, per-element latency, CPU utilization (CPU
+seconds per wall second, over all threads) and peak resident memory are logged
+for every value of
+--num_parallel_calls_values, --cycle_length_values (TFRecord pipeline only) and
+--text_fused_values (text pipeline only, to compare the chain of maps with the
+fused pipeline). Run from the repository root:
+
+  python -m benchmark.input_pipeline_benchmark --num_batches=200 \
+      --num_parallel_calls_values=1,4,8 --cycle_length_values=1,4
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from utils import data_utils
+from utils import dataset
+from utils import tokenizer
+from utils import vocab_utils
+
+_RESERVED_TOKENS = [vocab_utils.UNK, vocab_utils.SOS, vocab_utils.EOS]
+
+# Number of stages of each pipeline (see _tfrecord_stages and _text_stages).
+_NUM_STAGES = 3
+
+# Flags used to build and iterate the pipelines.
+_Options = collections.namedtuple(
+    "_Options", ["batch_size", "max_length", "sentences_per_batch",
+                 "text_batch_tokens", "num_buckets", "seed", "num_batches",
+                 "warmup_batches"])
+
+
+def write_synthetic_data(data_dir, num_files, examples_per_file, vocab_size,
+                         mean_length, max_length, rng):
+    """Write the same random corpus as TFRecord shards and as text files.
+
+    Returns:
+      Tuple of (TFRecord file pattern, source text file, target text file,
+      vocabulary file).
+    """
+    words = ["w%d" % i for i in range(vocab_size - len(_RESERVED_TOKENS))]
+    vocab_file = os.path.join(data_dir, "vocab.txt")
+    with tf.gfile.Open(vocab_file, "w") as f:
+        f.write("\n".join(_RESERVED_TOKENS + words) + "\n")
+
+    def random_sentence():
+        length = int(np.clip(rng.normal(mean_length, mean_length / 2.), 1,
+                             max_length))
+        return rng.randint(len(_RESERVED_TOKENS), vocab_size, size=length)
+
+    src_file = os.path.join(data_dir, "synthetic.src")
+    tgt_file = os.path.join(data_dir, "synthetic.tgt")
+    with tf.gfile.Open(src_file, "w") as src_f, \
+            tf.gfile.Open(tgt_file, "w") as tgt_f:
+        for n in range(num_files):
+            filename = os.path.join(data_dir, "synthetic-train-%.5d" % n)
+            with tf.python_io.TFRecordWriter(filename) as writer:
+                for _ in range(examples_per_file):
+                    src, tgt = random_sentence(), random_sentence()
+                    offset = len(_RESERVED_TOKENS)
+                    src_f.write(" ".join(words[i - offset] for i in src) + "\n")
+                    tgt_f.write(" ".join(words[i - offset] for i in tgt) + "\n")
+                    features = {
+                        "inputs": tf.train.Feature(int64_list=tf.train.Int64List(
+                            value=list(src) + [tokenizer.EOS_ID])),
+                        "targets": tf.train.Feature(int64_list=tf.train.Int64List(
+                            value=list(tgt) + [tokenizer.EOS_ID]))}
+                    example = tf.train.Example(
+                        features=tf.train.Features(feature=features))
+                    writer.write(example.SerializeToString())
+    return (os.path.join(data_dir, "*train*"), src_file, tgt_file, vocab_file)
+
+
+def _count_ids(tensors):
+    """Return the number of real (non-zero) and padded ids in the tensors."""
+    return (tf.add_n([tf.count_nonzero(t) for t in tensors]),
+            tf.to_int64(tf.add_n([tf.size(t) for t in tensors])))
+
+
+def _tfrecord_stages(file_pattern, options, num_parallel_calls, cycle_length):
+    """Return (stage name, dataset, token count function) of each stage.
+
+    The token count functions return the number of real and padded tokens of
+    an element. Tokens are not counted in the read stage, whose records are not
+    parsed.
+    """
+    def read():
+        ds = tf.data.Dataset.list_files(file_pattern).repeat()
+        return ds.apply(tf.contrib.data.parallel_interleave(
+            dataset._load_records, sloppy=True, cycle_length=cycle_length))
+
+    return [
+        ("read", read(), None),
+        ("parse", read().map(dataset._parse_example,
+                             num_parallel_calls=num_parallel_calls),
+         lambda inputs, targets: _count_ids([inputs, targets])),
+        ("batch", dataset._read_and_batch_from_files(
+            file_pattern, options.batch_size, options.max_length + 1,
+            num_parallel_calls, shuffle=True, repeat=None,
+            cycle_length=cycle_length),
+         lambda inputs, targets: _count_ids([inputs, targets])),
+    ]
+
+
+def _text_stages(src_file, tgt_file, vocab_file, options, num_parallel_calls,
+                 fused):
+    """Return (stage name, dataset, token count function) of each stage.
+
+    The token count functions return the number of real and padded tokens of
+    an element. Tokens are not counted in the read stage, whose lines are not
+    split.
+    """
+    src_vocab_table, tgt_vocab_table = vocab_utils.create_lookup_tables(
+        vocab_file, vocab_file, share_vocab=True)
+
+    def read():
+        return tf.data.Dataset.zip((tf.data.TextLineDataset(src_file).repeat(),
+                                    tf.data.TextLineDataset(tgt_file).repeat()))
+
+    def lookup(token):
+        return tf.cast(tgt_vocab_table.lookup(tf.constant(token)), tf.int32)
+
+    def count_lengths(src, tgt_in, unused_tgt_out, src_len, tgt_len):
+        return (tf.to_int64(tf.reduce_sum(src_len) + tf.reduce_sum(tgt_len)),
+                tf.to_int64(tf.size(src) + tf.size(tgt_in)))
+
+    process_fn = (data_utils._process_examples_fused if fused
+                  else data_utils._process_examples)
+    processed = process_fn(
+        read(), src_vocab_table, tgt_vocab_table, lookup(vocab_utils.SOS),
+        lookup(vocab_utils.EOS), options.max_length, options.max_length,
+        num_parallel_calls,
+        output_buffer_size=options.sentences_per_batch * 1000)
+    batched = data_utils.get_dataset(
+        tf.data.TextLineDataset(src_file).repeat(),
+        tf.data.TextLineDataset(tgt_file).repeat(),
+        src_vocab_table, tgt_vocab_table, options.sentences_per_batch,
+        sos=vocab_utils.SOS, eos=vocab_utils.EOS, random_seed=options.seed,
+        num_buckets=options.num_buckets, src_max_len=options.max_length,
+        tgt_max_len=options.max_length,
+        num_parallel_calls=num_parallel_calls, fused=fused,
+        batch_tokens=options.text_batch_tokens)
+    return [
+        ("read", read(), None),
+        ("process", processed, count_lengths),
+        ("batch", batched, count_lengths),
+    ]
+
+
+def _time_stage(ds, count_fn, num_elements, warmup_elements):
+    """Iterate the dataset, and return its throughput and CPU utilization."""
+    iterator = ds.make_initializable_iterator()
+    next_element = iterator.get_next()
+    fetch = count_fn(*next_element) if count_fn else next_element
+    with tf.Session() as sess:
+        sess.run([tf.tables_initializer(), iterator.initializer])
+        for _ in range(warmup_elements):
+            sess.run(fetch)
+
+        total_tokens = padded_tokens = 0
+        cpu_start = os.times()
+        start = time.time()
+        for _ in range(num_elements):
+            result = sess.run(fetch)
+            if count_fn:
+                total_tokens += result[0]
+                padded_tokens += result[1]
+        elapsed = time.time() - start
+        cpu_end = os.times()
+
+    cpu_seconds = (cpu_end[0] - cpu_start[0]) + (cpu_end[1] - cpu_start[1])
+    results = {"elements_per_sec": num_elements / elapsed,
+               "latency_usec": 1e6 * elapsed / num_elements,
+               "cpu_utilization": cpu_seconds / elapsed}
+    if count_fn:
+        results["tokens_per_sec"] = total_tokens / elapsed
+        results["padding_ratio"] = 1. - total_tokens / max(padded_tokens, 1)
+    return results
+
+
+def _run_stage(args):
+    """Time one stage of a pipeline in a separate process.
+
+    Returns:
+      Dictionary of results, including the peak resident memory of the process.
+    """
+    (options, paths, pipeline, stage_index, num_parallel_calls, cycle_length,
+     fused) = args
+    file_pattern, src_file, tgt_file, vocab_file = paths
+    with tf.Graph().as_default():
+        if pipeline == "tfrecord":
+            stages = _tfrecord_stages(
+                file_pattern, options, num_parallel_calls, cycle_length)
+        else:
+            stages = _text_stages(
+                src_file, tgt_file, vocab_file, options, num_parallel_calls,
+                fused)
+        stage, ds, count_fn = stages[stage_index]
+
+        # Batches are much larger than single examples, so the example stages
+        # are iterated for the same number of examples.
+        num_elements = options.num_batches
+        if stage != "batch":
+            num_elements *= options.sentences_per_batch
+        results = _time_stage(ds, count_fn, num_elements, options.warmup_batches)
+
+    # ru_maxrss is in kilobytes on Linux.
+    results["peak_rss_mb"] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.)
+    return stage, results
+
+
+def run_benchmark(flags_obj):
+    """Iterate every stage of both pipelines, and log the results."""
+    benchmark_logger = logger.get_benchmark_logger()
+    context = multiprocessing.get_context("spawn")
+    data_dir = flags_obj.data_dir or tempfile.mkdtemp()
+    paths = write_synthetic_data(
+        data_dir, flags_obj.num_files, flags_obj.examples_per_file,
+        flags_obj.vocab_size, flags_obj.mean_length, flags_obj.max_length,
+        np.random.RandomState(flags_obj.seed))
+    options = _Options(**{name: flags_obj[name].value
+                          for name in _Options._fields})
+
+    configs = []
+    fused_values = [v.lower() in ("1", "true", "yes")
+                    for v in flags_obj.text_fused_values]
+    for num_parallel_calls in [int(v) for v in flags_obj.num_parallel_calls_values]:
+        for cycle_length in [int(v) for v in flags_obj.cycle_length_values]:
+            configs.append(("tfrecord", num_parallel_calls, cycle_length, None))
+        for fused in fused_values:
+            configs.append(("text", num_parallel_calls, None, fused))
+
+    units = {"elements_per_sec": "elements/sec", "tokens_per_sec": "tokens/sec",
+             "latency_usec": "usec", "cpu_utilization": "cores",
+             "peak_rss_mb": "MB", "padding_ratio": None}
+    for pipeline, num_parallel_calls, cycle_length, fused in configs:
+        # Each stage runs in a fresh process, so that its peak memory is not
+        # hidden by the buffers of the previous stages.
+        for stage_index in range(_NUM_STAGES):
+            args = (options, paths, pipeline, stage_index, num_parallel_calls,
+                    cycle_length, fused)
+            pool = context.Pool(1)
+            try:
+                stage, results = pool.apply(_run_stage, (args,))
+            finally:
+                pool.close()
+                pool.join()
+
+            extras = {"pipeline": pipeline, "stage": stage,
+                      "num_parallel_calls": num_parallel_calls,
+                      "cycle_length": cycle_length or "n/a",
+                      "fused": "n/a" if fused is None else fused}
+            tf.logging.info("%s: %s" % (extras, results))
+            for name, value in sorted(results.items()):
+                benchmark_logger.log_metric(
+                    name, value, unit=units[name], extras=extras)
+
+
+def define_input_pipeline_benchmark_flags():
+    """Define flags used by the input pipeline benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_string(
+        name="data_dir", short_name="dd", default=None,
+        help=flags_core.help_wrap(
+            "Directory where the synthetic data is written. Defaults to a new "
+            "temporary directory."))
+    flags.DEFINE_integer(
+        name="num_files", short_name="nf", default=8,
+        help=flags_core.help_wrap("Number of TFRecord shards."))
+    flags.DEFINE_integer(
+        name="examples_per_file", short_name="epf", default=5000,
+        help=flags_core.help_wrap("Number of examples per TFRecord shard."))
+    flags.DEFINE_integer(
+        name="vocab_size", short_name="vs", default=32000,
+        help=flags_core.help_wrap("Size of the synthetic vocabulary."))
+    flags.DEFINE_integer(
+        name="mean_length", short_name="ml", default=25,
+        help=flags_core.help_wrap("Mean number of tokens per sentence."))
+    flags.DEFINE_integer(
+        name="max_length", default=100,
+        help=flags_core.help_wrap("Maximum number of tokens per sentence."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=4096,
+        help=flags_core.help_wrap(
+            "Maximum number of tokens per batch of the TFRecord pipeline."))
+    flags.DEFINE_integer(
+        name="sentences_per_batch", short_name="spb", default=128,
+        help=flags_core.help_wrap(
+            "Number of sentences per batch of the text pipeline."))
+    flags.DEFINE_integer(
+        name="text_batch_tokens", default=None,
+        help=flags_core.help_wrap(
+            "If set, the text pipeline batches pairs with a token budget per "
+            "length bucket instead of --sentences_per_batch pairs."))
+    flags.DEFINE_integer(
+        name="num_buckets", default=5,
+        help=flags_core.help_wrap(
+            "Number of length buckets of the text pipeline. With 1 bucket, the "
+            "fused text pipeline splits and looks up whole batches of lines."))
+    flags.DEFINE_list(
+        name="text_fused_values", default=["false", "true"],
+        help=flags_core.help_wrap(
+            "Whether the text pipeline fuses its per-example maps (see the "
+            "`fused` argument of data_utils.get_dataset)."))
+    flags.DEFINE_integer(
+        name="num_batches", short_name="nb", default=100,
+        help=flags_core.help_wrap("Number of timed batches per stage."))
+    flags.DEFINE_integer(
+        name="warmup_batches", short_name="wb", default=10,
+        help=flags_core.help_wrap("Number of untimed elements per stage."))
+    flags.DEFINE_list(
+        name="num_parallel_calls_values", default=["1", "4"],
+        help=flags_core.help_wrap("Values of num_parallel_calls."))
+    flags.DEFINE_list(
+        name="cycle_length_values", default=["1", "4"],
+        help=flags_core.help_wrap(
+            "Numbers of TFRecord files read concurrently."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap("Seed of the synthetic corpus."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_input_pipeline_benchmark_flags()
+    absl_app.run(main)
@@ -0,0 +1,192 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Micro-benchmark the layer normalization paths of a single sublayer.
+
+A PrePostProcessingWrapper is built around one sublayer (an identity layer,
+which only leaves the normalization, dropout and residual connection, the
+self-attention layer or the feedforward network), and its forward and
+forward+backward passes are timed on random inputs for every normalization
+path:
+
+  default: LayerNormalization as separate elementwise ops.
+  fused: params["fused_layer_norm"].
+  fused_jit: params["fused_layer_norm"] and params["jit_pre_post_processing"].
+
+Run from the repository root, e.g.:
+
+  python -m benchmark.layer_norm_benchmark --param_set=base --length=64 \
+      --sublayer_values=identity,self_attention,ffn
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from model import attention_layer
+from model import ffn_layer
+from model import model_params
+from model import transformer
+
+PARAMS_MAP = {
+    "tiny": model_params.TINY_PARAMS,
+    "hkh": model_params.HKH_PARAMS,
+    "base": model_params.BASE_PARAMS,
+    "big": model_params.BIG_PARAMS,
+}
+
+# Maps the normalization paths to (fused_layer_norm, jit_pre_post_processing).
+_NORM_PATHS = {
+    "default": (False, False),
+    "fused": (True, False),
+    "fused_jit": (True, True),
+}
+
+_SUBLAYERS = ["identity", "self_attention", "ffn"]
+
+
+def _identity_layer(x, dropout_seed=None):  # pylint: disable=unused-argument
+    return x
+
+
+def _build_sublayer(sublayer, x, params):
+    """Return the output of the wrapped sublayer applied to x."""
+    if sublayer == "identity":
+        layer, args = _identity_layer, []
+    elif sublayer == "self_attention":
+        layer = attention_layer.SelfAttention(
+            params["hidden_size"], params["num_heads"],
+            params["attention_dropout"], True)
+        length = tf.shape(x)[1]
+        args = [tf.zeros([tf.shape(x)[0], 1, 1, length])]
+    elif sublayer == "ffn":
+        layer = ffn_layer.FeedFowardNetwork(
+            params["hidden_size"], params["filter_size"],
+            params["relu_dropout"], True, False)
+        args = []
+    else:
+        raise ValueError("Unknown sublayer: %s" % sublayer)
+
+    wrapper = transformer.PrePostProcessingWrapper(layer, params, True)
+    return wrapper(x, *args)
+
+
+def _time_op(sess, op, warmup_iters, iters):
+    """Return the mean time of running op, in microseconds."""
+    for _ in range(warmup_iters):
+        sess.run(op)
+    start = time.time()
+    for _ in range(iters):
+        sess.run(op)
+    return 1e6 * (time.time() - start) / iters
+
+
+def run_benchmark(flags_obj):
+    """Time every sublayer with every normalization path, and log the results."""
+    benchmark_logger = logger.get_benchmark_logger()
+    params = PARAMS_MAP[flags_obj.param_set].copy()
+
+    for sublayer, norm_path in itertools.product(
+            flags_obj.sublayer_values, flags_obj.norm_path_values):
+        if norm_path not in _NORM_PATHS:
+            raise ValueError("Unknown normalization path: %s" % norm_path)
+        params["fused_layer_norm"], params["jit_pre_post_processing"] = (
+            _NORM_PATHS[norm_path])
+
+        with tf.Graph().as_default():
+            tf.set_random_seed(flags_obj.seed)
+            rng = np.random.RandomState(flags_obj.seed)
+            # A variable, so that the inputs are not constant folded.
+            x = tf.Variable(rng.normal(size=[
+                flags_obj.batch_size, flags_obj.length, params["hidden_size"]]),
+                dtype=tf.float32)
+            y = _build_sublayer(sublayer, x, params)
+            forward = tf.group(y)
+            backward = tf.group(*tf.gradients(
+                tf.reduce_sum(y), [x] + tf.trainable_variables()))
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                results = {
+                    "forward_usec": _time_op(
+                        sess, forward, flags_obj.warmup_iters, flags_obj.iters),
+                    "forward_backward_usec": _time_op(
+                        sess, backward, flags_obj.warmup_iters, flags_obj.iters)}
+
+        extras = {"param_set": flags_obj.param_set,
+                  "sublayer": sublayer,
+                  "norm_path": norm_path,
+                  "batch_size": flags_obj.batch_size,
+                  "length": flags_obj.length}
+        tf.logging.info("%s: %s" % (extras, results))
+        for name, value in sorted(results.items()):
+            benchmark_logger.log_metric(name, value, unit="usec", extras=extras)
+
+
+def define_layer_norm_benchmark_flags():
+    """Define flags used by the layer normalization benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_enum(
+        name="param_set", short_name="ps", default="base",
+        enum_values=list(PARAMS_MAP.keys()),
+        help=flags_core.help_wrap("Parameter set of the benchmarked sublayers."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=32,
+        help=flags_core.help_wrap("Number of sequences per batch."))
+    flags.DEFINE_integer(
+        name="length", default=64,
+        help=flags_core.help_wrap("Number of tokens per sequence."))
+    flags.DEFINE_list(
+        name="sublayer_values", default=_SUBLAYERS,
+        help=flags_core.help_wrap(
+            "Wrapped sublayers. Possible values: %s" % ", ".join(_SUBLAYERS)))
+    flags.DEFINE_list(
+        name="norm_path_values", default=["default", "fused", "fused_jit"],
+        help=flags_core.help_wrap(
+            "Normalization paths. Possible values: %s" %
+            ", ".join(sorted(_NORM_PATHS))))
+    flags.DEFINE_integer(
+        name="warmup_iters", short_name="wi", default=10,
+        help=flags_core.help_wrap("Number of untimed iterations."))
+    flags.DEFINE_integer(
+        name="iters", default=100,
+        help=flags_core.help_wrap("Number of timed iterations."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap("Seed of the inputs and of the weights."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_layer_norm_benchmark_flags()
+    absl_app.run(main)
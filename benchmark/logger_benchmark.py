@@ -0,0 +1,76 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Measure the per-call overhead of the benchmark file loggers.
+
+log_metric is called --num_calls times on a BenchmarkFileLogger and on an
+AsyncBenchmarkFileLogger, and the mean time per call (the time the training
+thread spends logging) is printed for each. Run from the repository root:
+
+  python -m benchmark.logger_benchmark --num_calls=10000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import shutil
+import tempfile
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+
+
+def measure_overhead(logger_class, num_calls):
+    """Return the mean seconds per log_metric call of a logger class."""
+    log_dir = tempfile.mkdtemp()
+    try:
+        log = logger_class(log_dir)
+        start = time.time()
+        for step in range(num_calls):
+            log.log_metric("loss", 0.1, global_step=step,
+                           extras={"name": "value"})
+        elapsed = time.time() - start
+        log.on_finish(logger.RUN_STATUS_SUCCESS)
+    finally:
+        shutil.rmtree(log_dir)
+    return elapsed / num_calls
+
+
+def define_logger_benchmark_flags():
+    """Define flags used by the logger benchmark."""
+    flags.DEFINE_integer(
+        name="num_calls", short_name="nc", default=2000,
+        help=flags_core.help_wrap("Number of log_metric calls per logger."))
+
+
+def main(_):
+    for logger_class in (logger.BenchmarkFileLogger,
+                         logger.AsyncBenchmarkFileLogger):
+        overhead = measure_overhead(logger_class, flags.FLAGS.num_calls)
+        tf.logging.info("%s: %.1f us per log_metric call" % (
+            logger_class.__name__, 1e6 * overhead))
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_logger_benchmark_flags()
+    absl_app.run(main)
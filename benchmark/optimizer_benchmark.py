@@ -0,0 +1,165 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark the LazyAdam step of shared and untied embedding/softmax weights.
+
+A batch of ids is embedded and projected back to the vocabulary by an
+EmbeddingSharedWeights layer, with shared or untied (share_softmax_weights)
+weights, and the cross entropy is minimized with LazyAdamOptimizer, as in
+transformer_main. The optimizer step time is the time of a training step minus
+the time of computing the gradients. The optimizer memory traffic is estimated
+from the rows updated: Adam reads and writes the variable and its two moments,
+every row for a dense gradient, and only the rows of the batch's ids for a
+sparse gradient. Run from the repository root, e.g.:
+
+  python -m benchmark.optimizer_benchmark --vocab_size=64000 --hidden_size=1024
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from model import embedding_layer
+
+# Adam reads and writes the variable, m and v for every updated row.
+_ADAM_ARRAYS_TOUCHED = 6
+
+
+def _time_op(sess, op, warmup_steps, steps):
+    """Return the mean time of running op, in milliseconds."""
+    for _ in range(warmup_steps):
+        sess.run(op)
+    start = time.time()
+    for _ in range(steps):
+        sess.run(op)
+    return 1000. * (time.time() - start) / steps
+
+
+def _optimizer_bytes(sess, gradients):
+    """Estimate the bytes of memory touched by an Adam update of gradients."""
+    num_bytes = 0
+    for gradient, var in gradients:
+        row_bytes = var.dtype.base_dtype.size * int(np.prod(
+            var.shape.as_list()[1:]))
+        if isinstance(gradient, tf.IndexedSlices):
+            num_rows = sess.run(tf.size(tf.unique(gradient.indices)[0]))
+        else:
+            num_rows = var.shape.as_list()[0]
+        num_bytes += _ADAM_ARRAYS_TOUCHED * num_rows * row_bytes
+    return num_bytes
+
+
+def run_config(share_softmax_weights, ids, vocab_size, hidden_size,
+               warmup_steps, steps, seed):
+    """Return the step times and the optimizer traffic of one configuration."""
+    with tf.Graph().as_default():
+        tf.set_random_seed(seed)
+        layer = embedding_layer.EmbeddingSharedWeights(
+            vocab_size, hidden_size,
+            share_softmax_weights=share_softmax_weights)
+        logits = layer.linear(layer(tf.constant(ids)))
+        loss = tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(
+            labels=tf.constant(np.roll(ids, 1, axis=1)), logits=logits))
+
+        optimizer = tf.contrib.opt.LazyAdamOptimizer(1e-3)
+        gradients = optimizer.compute_gradients(loss)
+        gradients_op = tf.group(*[
+            g.values if isinstance(g, tf.IndexedSlices) else g
+            for g, _ in gradients])
+        train_op = optimizer.apply_gradients(gradients)
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            gradients_msec = _time_op(sess, gradients_op, warmup_steps, steps)
+            step_msec = _time_op(sess, train_op, warmup_steps, steps)
+            optimizer_bytes = _optimizer_bytes(sess, gradients)
+
+    return {"step_msec": step_msec,
+            "optimizer_msec": step_msec - gradients_msec,
+            "optimizer_mb": optimizer_bytes / 2. ** 20}
+
+
+def run_benchmark(flags_obj):
+    """Run the shared and untied configurations, and log the results."""
+    benchmark_logger = logger.get_benchmark_logger()
+    rng = np.random.RandomState(flags_obj.seed)
+    ids = rng.randint(1, flags_obj.vocab_size,
+                      size=[flags_obj.batch_size, flags_obj.length])
+
+    units = {"step_msec": "ms", "optimizer_msec": "ms", "optimizer_mb": "MB"}
+    for share_softmax_weights in (True, False):
+        results = run_config(
+            share_softmax_weights, ids, flags_obj.vocab_size,
+            flags_obj.hidden_size, flags_obj.warmup_steps, flags_obj.steps,
+            flags_obj.seed)
+
+        extras = {"weights": "shared" if share_softmax_weights else "untied",
+                  "vocab_size": flags_obj.vocab_size,
+                  "hidden_size": flags_obj.hidden_size,
+                  "batch_size": flags_obj.batch_size,
+                  "length": flags_obj.length}
+        tf.logging.info("%s: %s" % (extras, results))
+        for name, value in sorted(results.items()):
+            benchmark_logger.log_metric(
+                name, value, unit=units[name], extras=extras)
+
+
+def define_optimizer_benchmark_flags():
+    """Define flags used by the optimizer benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_integer(
+        name="vocab_size", short_name="vs", default=64000,
+        help=flags_core.help_wrap("Number of rows of the weights."))
+    flags.DEFINE_integer(
+        name="hidden_size", short_name="hs", default=1024,
+        help=flags_core.help_wrap("Dimensionality of the weights."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=32,
+        help=flags_core.help_wrap("Number of sequences per batch."))
+    flags.DEFINE_integer(
+        name="length", default=64,
+        help=flags_core.help_wrap("Number of ids per sequence."))
+    flags.DEFINE_integer(
+        name="warmup_steps", short_name="ws", default=3,
+        help=flags_core.help_wrap("Number of untimed steps."))
+    flags.DEFINE_integer(
+        name="steps", default=20,
+        help=flags_core.help_wrap("Number of timed steps."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap("Seed of the ids and of the weights."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_optimizer_benchmark_flags()
+    absl_app.run(main)
@@ -0,0 +1,220 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Compare the BLEU and the speed of a float and an int8 quantized model.
+
+The latest checkpoint of --model_dir is quantized the way --export_int8 exports
+it (see transformer_main.quantize_checkpoint): the input ranges of the matmuls
+are calibrated on the first --calibration_lines lines of --bleu_source, and the
+weights are quantized per channel. Both models then translate the next
+--num_sentences lines, in batches sorted by length. The BLEU against
+--bleu_ref, the decoding sentences/sec (graph construction and restore
+excluded) and the size of the quantized weights are logged for each model, and
+the speedup of the int8 model is logged with its metrics. Run from the
+repository root, e.g.:
+
+  python -m benchmark.quantization_report --model_dir=/tmp/transformer_model \
+      --param_set=base --vocab_file=/tmp/translate_ende/vocab.ende.32768 \
+      --bleu_source=newstest2014.en --bleu_ref=newstest2014.de
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import tempfile
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+import compute_bleu
+import transformer_main
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from utils import tokenizer
+
+
+def _read_lines(filename):
+    """Return the lines of filename."""
+    with tf.gfile.Open(filename) as f:
+        return f.read().strip().splitlines()
+
+
+def _make_batches(sequences, batch_size):
+    """Return (indices, padded batch) pairs, grouping sequences by length."""
+    order = sorted(range(len(sequences)), key=lambda i: len(sequences[i]))
+    batches = []
+    for i in range(0, len(order), batch_size):
+        indices = order[i:i + batch_size]
+        batch = np.zeros([len(indices), max(len(sequences[j]) for j in indices)],
+                         dtype=np.int64)
+        for row, j in enumerate(indices):
+            batch[row, :len(sequences[j])] = sequences[j]
+        batches.append((indices, batch))
+    return batches
+
+
+def translate_batches(params, checkpoint_path, batches, num_sentences):
+    """Decode the batches with a checkpoint, after an untimed warmup batch.
+
+    Returns:
+      Tuple of the list of output ids of every sentence, and the seconds spent
+      decoding the batches.
+    """
+    outputs = [None] * num_sentences
+    with tf.Graph().as_default():
+        inputs = tf.placeholder(tf.int64, [None, None], name="inputs")
+        predictions = transformer_main.model_fn(
+            inputs, None, tf.estimator.ModeKeys.PREDICT, params).predictions
+        saver = tf.train.Saver()
+        with tf.Session() as sess:
+            saver.restore(sess, checkpoint_path)
+            sess.run(predictions["outputs"], feed_dict={inputs: batches[0][1]})
+
+            elapsed = 0.
+            for indices, batch in batches:
+                start = time.time()
+                decoded = sess.run(predictions["outputs"],
+                                   feed_dict={inputs: batch})
+                elapsed += time.time() - start
+                for index, ids in zip(indices, decoded):
+                    outputs[index] = ids
+    return outputs, elapsed
+
+
+def _decode(ids, subtokenizer):
+    """Decode output ids, up to their EOS."""
+    ids = list(ids)
+    if tokenizer.EOS_ID in ids:
+        ids = ids[:ids.index(tokenizer.EOS_ID)]
+    return subtokenizer.decode(ids)
+
+
+def run_report(flags_obj):
+    """Evaluate the float and int8 models, and log their metrics."""
+    benchmark_logger = logger.get_benchmark_logger()
+    params = transformer_main.PARAMS_MAP[flags_obj.param_set].copy()
+    subtokenizer = tokenizer.Subtokenizer(flags_obj.vocab_file)
+    work_dir = tempfile.mkdtemp()
+
+    sources = _read_lines(flags_obj.bleu_source)
+    refs = _read_lines(flags_obj.bleu_ref)
+    start, end = (flags_obj.calibration_lines,
+                  flags_obj.calibration_lines + flags_obj.num_sentences)
+    sources, refs = sources[start:end], refs[start:end]
+    ref_file = os.path.join(work_dir, "ref.txt")
+    with tf.gfile.Open(ref_file, "w") as f:
+        f.write("\n".join(refs) + "\n")
+    batches = _make_batches(
+        [subtokenizer.encode(line) + [tokenizer.EOS_ID] for line in sources],
+        flags_obj.batch_size)
+
+    float_path = tf.train.latest_checkpoint(flags_obj.model_dir)
+    int8_path = os.path.join(work_dir, "model.ckpt")
+    stats = transformer_main.quantize_checkpoint(
+        float_path, int8_path, params,
+        transformer_main.get_calibration_sequences(
+            flags_obj.bleu_source, flags_obj.vocab_file,
+            flags_obj.calibration_lines))
+
+    models = [("float32", float_path, None, stats["float_bytes"]),
+              ("int8", int8_path, "int8", stats["int8_bytes"])]
+    sentences_per_sec = {}
+    for name, checkpoint_path, quantize_mode, weight_bytes in models:
+        params["quantize_mode"] = quantize_mode
+        outputs, elapsed = translate_batches(
+            params, checkpoint_path, batches, len(sources))
+        hyp_file = os.path.join(work_dir, "translation_%s.txt" % name)
+        translations = [_decode(ids, subtokenizer) for ids in outputs]
+        with tf.gfile.Open(hyp_file, "w") as f:
+            f.write("\n".join(translations) + "\n")
+        bleu = compute_bleu.bleu_wrapper(ref_file, hyp_file, False)
+        sentences_per_sec[name] = len(sources) / elapsed
+
+        extras = {"param_set": flags_obj.param_set, "model": name,
+                  "num_sentences": len(sources),
+                  "batch_size": flags_obj.batch_size}
+        tf.logging.info(
+            "%s: BLEU %.2f, %.2f sentences/sec, %.1f MB of quantized weights." % (
+                extras, bleu, sentences_per_sec[name], weight_bytes / 2. ** 20))
+        benchmark_logger.log_metric("bleu_uncased", bleu, extras=extras)
+        benchmark_logger.log_metric(
+            "sentences_per_sec", sentences_per_sec[name], unit="sentences/sec",
+            extras=extras)
+        benchmark_logger.log_metric(
+            "quantized_weights_mb", weight_bytes / 2. ** 20, unit="MB",
+            extras=extras)
+
+    speedup = sentences_per_sec["int8"] / sentences_per_sec["float32"]
+    tf.logging.info("int8 speedup: %.2fx, max absolute weight error: %g" % (
+        speedup, stats["max_abs_error"]))
+    benchmark_logger.log_metric(
+        "int8_speedup", speedup, unit="x",
+        extras={"param_set": flags_obj.param_set,
+                "batch_size": flags_obj.batch_size})
+    tf.gfile.DeleteRecursively(work_dir)
+
+
+def define_quantization_report_flags():
+    """Define flags used by the quantization report."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_string(
+        name="model_dir", short_name="md", default="/tmp/transformer_model",
+        help=flags_core.help_wrap(
+            "Directory of the checkpoints of the float model."))
+    flags.DEFINE_enum(
+        name="param_set", short_name="ps", default="base",
+        enum_values=list(transformer_main.PARAMS_MAP.keys()),
+        help=flags_core.help_wrap("Parameter set of the model."))
+    flags.DEFINE_string(
+        name="vocab_file", short_name="vf", default=None,
+        help=flags_core.help_wrap("Path to the subtoken vocabulary file."))
+    flags.DEFINE_string(
+        name="bleu_source", short_name="bls", default=None,
+        help=flags_core.help_wrap("Path to the source sentences."))
+    flags.DEFINE_string(
+        name="bleu_ref", short_name="blr", default=None,
+        help=flags_core.help_wrap("Path to the reference translations."))
+    flags.DEFINE_integer(
+        name="calibration_lines", short_name="cl", default=200,
+        help=flags_core.help_wrap(
+            "Number of --bleu_source lines used to calibrate the int8 model."))
+    flags.DEFINE_integer(
+        name="num_sentences", short_name="ns", default=500,
+        help=flags_core.help_wrap(
+            "Number of --bleu_source lines, after the calibration lines, that "
+            "are translated by both models."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=32,
+        help=flags_core.help_wrap("Number of sentences per batch."))
+    flags.mark_flags_as_required(["vocab_file", "bleu_source", "bleu_ref"])
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_report(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_quantization_report_flags()
+    absl_app.run(main)
@@ -0,0 +1,132 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark the peak memory and the steps/sec of activation recomputation.
+
+The transformer is trained on synthetic data (see benchmark.train_benchmark)
+with the activations of the encoder and/or decoder stacks recomputed in the
+backward pass (params["encoder_recompute"] and params["decoder_recompute"]).
+Every setting is trained in a fresh process, so that the peak resident memory
+of each setting is measured separately. Run from the repository root, e.g.:
+
+  python -m benchmark.recompute_benchmark --param_set=base \
+      --synthetic_length=256 --recompute_values=none,encoder,decoder,both
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+import transformer_main
+from benchmark import train_benchmark
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+
+# Maps the values of --recompute_values to the recomputed (encoder, decoder).
+_RECOMPUTE_STACKS = {
+    "none": (False, False),
+    "encoder": (True, False),
+    "decoder": (False, True),
+    "both": (True, True),
+}
+
+
+def _run_recompute(args):
+    (param_set, batch_size, synthetic_length, recompute, warmup_steps,
+     train_steps) = args
+    params = train_benchmark.get_params(param_set, batch_size, synthetic_length)
+    params["encoder_recompute"], params["decoder_recompute"] = (
+        _RECOMPUTE_STACKS[recompute])
+    return train_benchmark.run_training(params, warmup_steps, train_steps)
+
+
+def run_benchmark(flags_obj):
+    """Train with every recompute setting in its own process, and log it."""
+    benchmark_logger = logger.get_benchmark_logger()
+    context = multiprocessing.get_context("spawn")
+
+    units = {"steps_per_sec": "steps/sec", "tokens_per_sec": "tokens/sec",
+             "peak_rss_mb": "MB"}
+    for recompute in flags_obj.recompute_values:
+        if recompute not in _RECOMPUTE_STACKS:
+            raise ValueError("Unknown recompute value: %s" % recompute)
+        args = (flags_obj.param_set, flags_obj.batch_size,
+                flags_obj.synthetic_length, recompute, flags_obj.warmup_steps,
+                flags_obj.train_steps)
+        pool = context.Pool(1)
+        try:
+            results = pool.apply(_run_recompute, (args,))
+        finally:
+            pool.close()
+            pool.join()
+
+        extras = {"param_set": flags_obj.param_set,
+                  "batch_size": flags_obj.batch_size or "default",
+                  "synthetic_length": flags_obj.synthetic_length or "max_length",
+                  "recompute": recompute}
+        tf.logging.info("%s: %s" % (extras, results))
+        for name, value in sorted(results.items()):
+            benchmark_logger.log_metric(
+                name, value, unit=units[name], extras=extras)
+
+
+def define_recompute_benchmark_flags():
+    """Define flags used by the recompute benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_enum(
+        name="param_set", short_name="ps", default="base",
+        enum_values=list(transformer_main.PARAMS_MAP.keys()),
+        help=flags_core.help_wrap("Parameter set of the benchmarked model."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=None,
+        help=flags_core.help_wrap(
+            "Number of tokens per batch. Defaults to the default batch size of "
+            "--param_set."))
+    flags.DEFINE_integer(
+        name="synthetic_length", short_name="sl", default=None,
+        help=flags_core.help_wrap(
+            "Length of the synthetic examples. Defaults to the maximum length "
+            "of --param_set."))
+    flags.DEFINE_list(
+        name="recompute_values", default=["none", "encoder", "decoder", "both"],
+        help=flags_core.help_wrap(
+            "Stacks whose activations are recomputed. Possible values: %s" %
+            ", ".join(sorted(_RECOMPUTE_STACKS))))
+    flags.DEFINE_integer(
+        name="warmup_steps", short_name="ws", default=5,
+        help=flags_core.help_wrap("Number of untimed training steps."))
+    flags.DEFINE_integer(
+        name="train_steps", short_name="ts", default=20,
+        help=flags_core.help_wrap("Number of timed training steps."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_recompute_benchmark_flags()
+    absl_app.run(main)
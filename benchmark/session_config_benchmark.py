@@ -0,0 +1,142 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Sweep CPU session configurations and report training steps/sec.
+
+Every combination of inter-op threads, intra-op threads, XLA and CPU affinity
+is run in a fresh process (the TensorFlow thread pools and the CPU affinity are
+process-wide), training the transformer on the synthetic input path (see
+benchmark.train_benchmark). Run from the repository root, e.g.:
+
+  python -m benchmark.session_config_benchmark --param_set=base \
+      --inter_op_values=1,2 --intra_op_values=8,16 --xla_values=false,true \
+      --cpu_affinity_values=,node:0
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import multiprocessing
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+import transformer_main
+from benchmark import train_benchmark
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from comm_utils.misc import session_utils
+
+
+def _run_config(args):
+    """Train on synthetic batches with one session configuration.
+
+    Returns:
+      Number of training steps per second.
+    """
+    (param_set, batch_size, max_length, warmup_steps, train_steps,
+     inter_op, intra_op, enable_xla, cpu_affinity) = args
+    if cpu_affinity:
+        session_utils.set_cpu_affinity(cpu_affinity)
+
+    params = train_benchmark.get_params(param_set, batch_size, max_length)
+    config = session_utils.get_session_config(
+        inter_op_threads=inter_op, intra_op_threads=intra_op,
+        enable_xla=enable_xla)
+    results = train_benchmark.run_training(
+        params, warmup_steps, train_steps, session_config=config)
+    return results["steps_per_sec"]
+
+
+def run_sweep(flags_obj):
+    """Run every configuration of the sweep and log its steps/sec."""
+    benchmark_logger = logger.get_benchmark_logger()
+    context = multiprocessing.get_context("spawn")
+
+    xla_values = [v.lower() in ("1", "true", "yes") for v in flags_obj.xla_values]
+    configs = itertools.product(
+        [int(v) for v in flags_obj.inter_op_values],
+        [int(v) for v in flags_obj.intra_op_values],
+        xla_values, flags_obj.cpu_affinity_values or [""])
+    for inter_op, intra_op, enable_xla, cpu_affinity in configs:
+        args = (flags_obj.param_set, flags_obj.batch_size, flags_obj.max_length,
+                flags_obj.warmup_steps, flags_obj.train_steps, inter_op, intra_op,
+                enable_xla, cpu_affinity)
+        pool = context.Pool(1)
+        try:
+            steps_per_sec = pool.apply(_run_config, (args,))
+        finally:
+            pool.close()
+            pool.join()
+
+        extras = {"inter_op_parallelism_threads": inter_op,
+                  "intra_op_parallelism_threads": intra_op,
+                  "enable_xla": enable_xla,
+                  "cpu_affinity": cpu_affinity or "all"}
+        tf.logging.info("%s: %.3f steps/sec" % (extras, steps_per_sec))
+        benchmark_logger.log_metric(
+            "steps_per_sec", steps_per_sec, unit="steps/sec", extras=extras)
+
+
+def define_session_config_benchmark_flags():
+    """Define flags used by the session configuration sweep."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_enum(
+        name="param_set", short_name="ps", default="base",
+        enum_values=list(transformer_main.PARAMS_MAP.keys()),
+        help=flags_core.help_wrap("Parameter set of the benchmarked model."))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=2048,
+        help=flags_core.help_wrap("Number of tokens per batch."))
+    flags.DEFINE_integer(
+        name="max_length", short_name="ml", default=64,
+        help=flags_core.help_wrap("Length of the synthetic sequences."))
+    flags.DEFINE_integer(
+        name="warmup_steps", short_name="ws", default=5,
+        help=flags_core.help_wrap("Number of untimed steps per configuration."))
+    flags.DEFINE_integer(
+        name="train_steps", short_name="ts", default=20,
+        help=flags_core.help_wrap("Number of timed steps per configuration."))
+    flags.DEFINE_list(
+        name="inter_op_values", default=["0", "1", "2"],
+        help=flags_core.help_wrap("Values of inter_op_parallelism_threads."))
+    flags.DEFINE_list(
+        name="intra_op_values", default=["0"],
+        help=flags_core.help_wrap("Values of intra_op_parallelism_threads."))
+    flags.DEFINE_list(
+        name="xla_values", default=["false", "true"],
+        help=flags_core.help_wrap("Whether XLA is enabled."))
+    flags.DEFINE_list(
+        name="cpu_affinity_values", default=[""],
+        help=flags_core.help_wrap(
+            "CPU affinity specs (see --cpu_affinity in transformer_main). An "
+            "empty value runs on all CPUs."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_sweep(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_session_config_benchmark_flags()
+    absl_app.run(main)
@@ -0,0 +1,180 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark the training throughput of the transformer on synthetic data.
+
+`model_fn` is trained for a number of steps on the synthetic input path of
+`dataset.train_input_fn`, so that the model compute is measured without the
+input pipeline. Every parameter set is trained in a fresh process, and the
+steps/sec, tokens/sec and peak resident memory are logged. Run from the
+repository root, e.g.:
+
+  python -m benchmark.train_benchmark --param_set_values=tiny,base \
+      --synthetic_length=64 --train_steps=50
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+import resource
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+import transformer_main
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from utils import dataset
+
+
+def get_params(param_set, batch_size=None, synthetic_length=None,
+               loss_method=None):
+    """Return the parameters of a model trained on synthetic data.
+
+    Args:
+      param_set: Key of transformer_main.PARAMS_MAP.
+      batch_size: Maximum number of tokens per batch. Defaults to the default
+        batch size of the parameter set.
+      synthetic_length: Length of the synthetic examples. Defaults to the
+        maximum length of the parameter set.
+      loss_method: Training loss method (see --loss_method in
+        transformer_main).
+    """
+    params = transformer_main.PARAMS_MAP[param_set].copy()
+    params["batch_size"] = batch_size or params["default_batch_size"]
+    params["synthetic_length"] = synthetic_length
+    params["use_synthetic_data"] = True
+    params["allow_ffn_pad"] = True
+    params["loss_method"] = loss_method
+    return params
+
+
+def run_training(params, warmup_steps, train_steps, session_config=None):
+    """Train model_fn on synthetic batches and return its throughput.
+
+    Returns:
+      Dictionary of steps_per_sec, tokens_per_sec (source and target tokens) and
+      peak_rss_mb (peak resident memory of the process, in MB).
+    """
+    with tf.Graph().as_default() as graph:
+        features, labels = (dataset.train_input_fn(params)
+                            .make_one_shot_iterator().get_next())
+        spec = transformer_main.model_fn(
+            features, labels, tf.estimator.ModeKeys.TRAIN, params)
+        token_counts = [graph.get_tensor_by_name(name + ":0") for name in
+                        transformer_main.TOKEN_COUNT_TENSORS["tokens"]]
+
+        with tf.Session(config=session_config) as sess:
+            sess.run(tf.global_variables_initializer())
+            for _ in range(warmup_steps):
+                sess.run(spec.train_op)
+
+            num_tokens = 0
+            start = time.time()
+            for _ in range(train_steps):
+                _, counts = sess.run([spec.train_op, token_counts])
+                num_tokens += sum(counts)
+            elapsed = time.time() - start
+
+    # ru_maxrss is in kilobytes on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"steps_per_sec": train_steps / elapsed,
+            "tokens_per_sec": num_tokens / elapsed,
+            "peak_rss_mb": peak_rss / 1024.}
+
+
+def _run_param_set(args):
+    (param_set, batch_size, synthetic_length, loss_method, warmup_steps,
+     train_steps) = args
+    params = get_params(param_set, batch_size, synthetic_length, loss_method)
+    return run_training(params, warmup_steps, train_steps)
+
+
+def run_benchmark(flags_obj):
+    """Train every parameter set in its own process, and log the results."""
+    benchmark_logger = logger.get_benchmark_logger()
+    context = multiprocessing.get_context("spawn")
+
+    units = {"steps_per_sec": "steps/sec", "tokens_per_sec": "tokens/sec",
+             "peak_rss_mb": "MB"}
+    for param_set in flags_obj.param_set_values:
+        args = (param_set, flags_obj.batch_size, flags_obj.synthetic_length,
+                flags_obj.loss_method, flags_obj.warmup_steps,
+                flags_obj.train_steps)
+        pool = context.Pool(1)
+        try:
+            results = pool.apply(_run_param_set, (args,))
+        finally:
+            pool.close()
+            pool.join()
+
+        extras = {"param_set": param_set,
+                  "batch_size": flags_obj.batch_size or "default",
+                  "synthetic_length": flags_obj.synthetic_length or "max_length",
+                  "loss_method": flags_obj.loss_method}
+        tf.logging.info("%s: %s" % (extras, results))
+        for name, value in sorted(results.items()):
+            benchmark_logger.log_metric(
+                name, value, unit=units[name], extras=extras)
+
+
+def define_train_benchmark_flags():
+    """Define flags used by the training benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_list(
+        name="param_set_values", default=["tiny", "base"],
+        help=flags_core.help_wrap(
+            "Parameter sets of the benchmarked models. Possible values: %s" %
+            ", ".join(transformer_main.PARAMS_MAP.keys())))
+    flags.DEFINE_integer(
+        name="batch_size", short_name="bs", default=None,
+        help=flags_core.help_wrap(
+            "Number of tokens per batch. Defaults to the default batch size of "
+            "each parameter set."))
+    flags.DEFINE_integer(
+        name="synthetic_length", short_name="sl", default=None,
+        help=flags_core.help_wrap(
+            "Length of the synthetic examples. Defaults to the maximum length "
+            "of each parameter set."))
+    flags.DEFINE_enum(
+        name="loss_method", default="one_hot",
+        enum_values=["one_hot", "logsumexp", "chunked", "sampled_softmax"],
+        help=flags_core.help_wrap(
+            "How the training loss is computed (see --loss_method in "
+            "transformer_main)."))
+    flags.DEFINE_integer(
+        name="warmup_steps", short_name="ws", default=5,
+        help=flags_core.help_wrap("Number of untimed training steps."))
+    flags.DEFINE_integer(
+        name="train_steps", short_name="ts", default=20,
+        help=flags_core.help_wrap("Number of timed training steps."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_train_benchmark_flags()
+    absl_app.run(main)
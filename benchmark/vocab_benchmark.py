@@ -0,0 +1,147 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark per-line and batched vocabulary encoding and decoding.
+
+Lines of random tokens are drawn from the vocabulary (with a fraction of
+out-of-vocabulary tokens), and encoded and decoded chunk by chunk, both one line
+at a time with `VocabHelper.encode`/`decode` and a chunk at a time with
+`VocabHelper.encode_batch`/`decode_batch`. Run from the repository root:
+
+  python -m benchmark.vocab_benchmark --vocab_file=<vocab> --num_lines=10000000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+# pylint: disable=g-bad-import-order
+from absl import app as absl_app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+# pylint: enable=g-bad-import-order
+
+from comm_utils.flags import core as flags_core
+from comm_utils.logs import logger
+from utils import vocab_utils
+
+_OOV_TOKEN = "<oov>"
+
+
+def _generate_lines(tokens, num_lines, max_tokens, oov_rate, rng):
+    """Return a list of lines with random tokens and random lengths."""
+    tokens = np.append(np.asarray(tokens, dtype=object), _OOV_TOKEN)
+    probs = np.full(len(tokens), (1. - oov_rate) / (len(tokens) - 1))
+    probs[-1] = oov_rate
+    lengths = rng.randint(1, max_tokens + 1, size=num_lines)
+    words = rng.choice(tokens, size=lengths.sum(), p=probs)
+    return [" ".join(line) for line in np.split(words, np.cumsum(lengths)[:-1])]
+
+
+def _pad_ids(encoded_lines):
+    """Pad a list of id sequences into a 2-D array, like the model outputs."""
+    max_length = max(len(ids) for ids in encoded_lines)
+    padded = np.zeros([len(encoded_lines), max_length], dtype=np.int64)
+    for i, ids in enumerate(encoded_lines):
+        padded[i, :len(ids)] = ids
+    return padded
+
+
+def run_benchmark(flags_obj):
+    """Encode and decode random lines, and log the lines/sec of each method."""
+    vocab_helper = vocab_utils.VocabHelper(flags_obj.vocab_file)
+    tokens = vocab_helper.src_vocab.id_to_token[3:-1]
+    rng = np.random.RandomState(flags_obj.seed)
+
+    timings = {"encode": 0., "encode_batch": 0., "decode": 0., "decode_batch": 0.}
+    num_lines = 0
+    while num_lines < flags_obj.num_lines:
+        chunk_size = min(flags_obj.chunk_size, flags_obj.num_lines - num_lines)
+        lines = _generate_lines(
+            tokens, chunk_size, flags_obj.max_tokens, flags_obj.oov_rate, rng)
+
+        start = time.time()
+        encoded = [vocab_helper.encode(line, add_eos=True) for line in lines]
+        timings["encode"] += time.time() - start
+
+        start = time.time()
+        encoded_batch = vocab_helper.encode_batch(lines, add_eos=True)
+        timings["encode_batch"] += time.time() - start
+
+        padded = _pad_ids(encoded_batch)
+        start = time.time()
+        for ids in encoded:
+            vocab_helper.decode(ids[:-1])
+        timings["decode"] += time.time() - start
+
+        start = time.time()
+        vocab_helper.decode_batch(padded)
+        timings["decode_batch"] += time.time() - start
+
+        num_lines += chunk_size
+        tf.logging.info("Processed %d lines.", num_lines)
+
+    benchmark_logger = logger.get_benchmark_logger()
+    extras = {"num_lines": num_lines, "chunk_size": flags_obj.chunk_size}
+    for name, seconds in sorted(timings.items()):
+        benchmark_logger.log_metric(
+            "%s_lines_per_sec" % name, num_lines / max(seconds, 1e-9),
+            unit="lines/sec", extras=extras)
+    for name in ("encode", "decode"):
+        benchmark_logger.log_metric(
+            "%s_batch_speedup" % name,
+            timings[name] / max(timings[name + "_batch"], 1e-9), extras=extras)
+
+
+def define_vocab_benchmark_flags():
+    """Define flags used by the vocabulary benchmark."""
+    flags_core.define_benchmark(bigquery_uploader=False)
+    flags.adopt_module_key_flags(flags_core)
+
+    flags.DEFINE_string(
+        name="vocab_file", short_name="vf", default=None,
+        help=flags_core.help_wrap("Path to the vocabulary file."))
+    flags.mark_flag_as_required("vocab_file")
+    flags.DEFINE_integer(
+        name="num_lines", short_name="nl", default=10000000,
+        help=flags_core.help_wrap("Total number of lines to encode and decode."))
+    flags.DEFINE_integer(
+        name="chunk_size", short_name="cs", default=10000,
+        help=flags_core.help_wrap(
+            "Number of lines encoded or decoded together by the batched "
+            "methods."))
+    flags.DEFINE_integer(
+        name="max_tokens", short_name="mt", default=50,
+        help=flags_core.help_wrap("Maximum number of tokens per line."))
+    flags.DEFINE_float(
+        name="oov_rate", short_name="oov", default=0.02,
+        help=flags_core.help_wrap(
+            "Fraction of tokens that are not in the vocabulary."))
+    flags.DEFINE_integer(
+        name="seed", default=0,
+        help=flags_core.help_wrap("Seed used to generate the random lines."))
+
+
+def main(_):
+    with logger.benchmark_context(flags.FLAGS):
+        run_benchmark(flags.FLAGS)
+
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    define_vocab_benchmark_flags()
+    absl_app.run(main)
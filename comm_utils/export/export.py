@@ -19,6 +19,17 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+# Graph transforms applied to frozen graphs. The variables are already
+# constants, so fold_constants also folds the tensors that only depend on them
+# or on static shapes.
+DEFAULT_FREEZE_TRANSFORMS = [
+    "remove_nodes(op=CheckNumerics)",
+    "fold_constants(ignore_errors=true)",
+    "remove_device",
+    "sort_by_execution_order",
+]
 
 
 def build_tensor_serving_input_receiver_fn(shape, dtype=tf.float32,
@@ -47,3 +58,44 @@ def build_tensor_serving_input_receiver_fn(shape, dtype=tf.float32,
         features=features, receiver_tensors=features)
 
   return serving_input_receiver_fn
+
+
+def freeze_saved_model(saved_model_dir, output_file,
+                       transforms=DEFAULT_FREEZE_TRANSFORMS,
+                       signature_key=tf.saved_model.signature_constants
+                       .DEFAULT_SERVING_SIGNATURE_DEF_KEY):
+  """Freezes the serving graph of a SavedModel into a GraphDef file.
+
+  The variables are replaced by constants holding their values, and only the
+  ops needed to compute the outputs of the signature are kept, which removes
+  the variable initialization and restore ops. The graph is then rewritten
+  with the given graph transforms.
+
+  Args:
+    saved_model_dir: directory of the SavedModel, with a "serve" graph.
+    output_file: path of the written binary GraphDef.
+    transforms: list of graph transforms (see tf.tools.graph_transforms).
+    signature_key: key of the frozen signature.
+
+  Returns:
+    A tuple of dictionaries mapping the input and the output keys of the
+    signature to the names of their tensors in the frozen graph.
+  """
+  with tf.Graph().as_default() as graph:
+    with tf.Session() as sess:
+      meta_graph_def = tf.saved_model.loader.load(
+          sess, [tf.saved_model.tag_constants.SERVING], saved_model_dir)
+      signature = meta_graph_def.signature_def[signature_key]
+      inputs = {key: info.name for key, info in signature.inputs.items()}
+      outputs = {key: info.name for key, info in signature.outputs.items()}
+
+      input_nodes = sorted(set(name.split(":")[0] for name in inputs.values()))
+      output_nodes = sorted(set(name.split(":")[0] for name in outputs.values()))
+      graph_def = tf.graph_util.convert_variables_to_constants(
+          sess, graph.as_graph_def(), output_nodes)
+
+  if transforms:
+    graph_def = TransformGraph(graph_def, input_nodes, output_nodes, transforms)
+  with tf.gfile.GFile(output_file, "wb") as f:
+    f.write(graph_def.SerializeToString())
+  return inputs, outputs
@@ -18,6 +18,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+
+import numpy as np
 import tensorflow as tf  # pylint: disable=g-bad-import-order
 
 from official.comm_utils.export import export
@@ -58,6 +61,39 @@ class ExportUtilsTest(tf.test.TestCase):
       self.assertEqual(list(receiver.receiver_tensors.values())[0].shape,
                        tf.TensorShape([10, 4, 5]))
 
+  def test_freeze_saved_model(self):
+    saved_model_dir = os.path.join(self.get_temp_dir(), "saved_model")
+    frozen_file = os.path.join(self.get_temp_dir(), "frozen_graph.pb")
+    x_value = np.arange(6, dtype=np.float32).reshape([2, 3])
+
+    with tf.Graph().as_default():
+      x = tf.placeholder(tf.float32, [None, 3], name="x")
+      weights = tf.get_variable(
+          "weights", initializer=np.ones([3, 2], dtype=np.float32))
+      # A constant subgraph, which is folded into a single constant.
+      offset = tf.reduce_sum(tf.range(4, dtype=tf.float32))
+      y = tf.matmul(x, weights) + offset
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        expected = sess.run(y, feed_dict={x: x_value})
+        tf.saved_model.simple_save(sess, saved_model_dir, {"x": x}, {"y": y})
+
+    inputs, outputs = export.freeze_saved_model(saved_model_dir, frozen_file)
+    graph_def = tf.GraphDef()
+    with tf.gfile.GFile(frozen_file, "rb") as f:
+      graph_def.ParseFromString(f.read())
+    op_types = set(node.op for node in graph_def.node)
+    self.assertNotIn("VariableV2", op_types)
+    self.assertNotIn("Range", op_types)
+    self.assertNotIn("SaveV2", op_types)
+
+    with tf.Graph().as_default() as graph:
+      tf.import_graph_def(graph_def, name="")
+      with self.test_session() as sess:
+        result = sess.run(graph.get_tensor_by_name(outputs["y"]),
+                          feed_dict={inputs["x"]: x_value})
+    self.assertAllClose(expected, result)
+
 
 if __name__ == "__main__":
   tf.test.main()
@@ -0,0 +1,260 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Post-training int8 quantization of the weights and matmuls of a model.
+
+The weights are quantized symmetrically per channel: every channel (a slice of
+the weights along the channel axis) gets its own float32 scale, the maximum
+absolute value of the channel divided by 127, so that large and small channels
+keep the same relative precision. The quantized values are stored as uint8
+with a zero point of 128, the input type of the CPU QuantizedMatMul kernel.
+
+The activations are quantized to uint8 per tensor, with a (min, max) range
+that is calibrated by running the float model on sample inputs: in the
+calibration model, every quantized matmul widens an "input_range" variable to
+cover its inputs (see update_input_range and calibrate_input_ranges).
+
+quantized_matmul then multiplies the uint8 activations and weights with
+QuantizedMatMul, accumulating in int32, and rescales the products to float32
+with the activation and per-channel weight scales.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import re
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.ops import gen_array_ops
+from tensorflow.python.ops import gen_math_ops
+
+_INT8_MAX = 127
+_UINT8_MAX = 255
+ZERO_POINT = 128
+SCALE_SUFFIX = "_scale"
+INPUT_RANGE_SUFFIX = "input_range"
+
+
+def quantize_per_channel(weights, axis):
+  """Quantize weights to uint8 with one scale per channel.
+
+  Args:
+    weights: float numpy array.
+    axis: int axis of the channels.
+
+  Returns:
+    uint8 array with the shape of weights, holding the quantized values plus
+    ZERO_POINT, in [1, 255], and float32 array of the scales of the channels.
+  """
+  axis %= weights.ndim
+  reduce_axes = tuple(i for i in range(weights.ndim) if i != axis)
+  max_abs = np.max(np.abs(weights), axis=reduce_axes)
+  # All-zero channels get a scale of 1, so that they stay zero.
+  scales = np.where(max_abs > 0, max_abs / _INT8_MAX, 1.).astype(np.float32)
+  scales_shape = [-1 if i == axis else 1 for i in range(weights.ndim)]
+  quantized = np.clip(np.round(weights / scales.reshape(scales_shape)),
+                      -_INT8_MAX, _INT8_MAX)
+  return (quantized + ZERO_POINT).astype(np.uint8), scales
+
+
+def dequantize(quantized, scales, axis):
+  """Return the float32 weights of quantize_per_channel's results."""
+  axis %= quantized.ndim
+  scales_shape = [-1 if i == axis else 1 for i in range(quantized.ndim)]
+  return ((quantized.astype(np.float32) - ZERO_POINT) *
+          scales.reshape(scales_shape))
+
+
+def get_channel_axis(name, variable_axes):
+  """Return the channel axis of the variable name, or None if not quantized.
+
+  Args:
+    name: Variable name.
+    variable_axes: list of (regular expression, axis) pairs. The variables whose
+      full name matches a regular expression are quantized along its axis.
+  """
+  for pattern, axis in variable_axes:
+    if re.match(pattern + "$", name):
+      return axis
+  return None
+
+
+def update_input_range(input_range, x):
+  """Return an op widening the (min, max) variable input_range to cover x."""
+  return tf.assign(input_range, tf.stack([
+      tf.minimum(input_range[0], tf.reduce_min(x)),
+      tf.maximum(input_range[1], tf.reduce_max(x))]))
+
+
+def input_range_initializer():
+  """Return the initializer of input ranges, an empty (inf, -inf) range."""
+  return tf.constant_initializer([np.inf, -np.inf])
+
+
+def quantized_matmul(x, quantized_weights, scales, input_range,
+                     transpose_b=False):
+  """Multiply x by quantized weights with 8-bit inputs and 32-bit products.
+
+  Args:
+    x: float32 tensor with shape [rows, depth].
+    quantized_weights: uint8 tensor with shape [depth, channels] (or [channels,
+      depth] if transpose_b), from quantize_per_channel.
+    scales: float32 tensor with shape [channels].
+    input_range: float32 tensor with shape [2], the calibrated (min, max) of x.
+      The values of x outside the range are clipped.
+    transpose_b: Whether the quantized weights are transposed.
+
+  Returns:
+    float32 tensor with shape [rows, channels].
+  """
+  with tf.name_scope("quantized_matmul"):
+    x_quantized, x_min, x_max = gen_array_ops.quantize_v2(
+        x, input_range[0], input_range[1], T=tf.quint8, mode="MIN_FIRST")
+    # The weights are passed with a [0, 255] range, so that their zero point is
+    # 0 and they are multiplied as is; ZERO_POINT is subtracted below.
+    products, _, _ = gen_math_ops.quantized_mat_mul(
+        x_quantized, tf.bitcast(quantized_weights, tf.quint8), x_min, x_max,
+        0., float(_UINT8_MAX), Toutput=tf.qint32, transpose_b=transpose_b)
+
+    # The products are sum((x_quantized - x_zero_point) * quantized_weights),
+    # where x_quantized - x_zero_point is x in units of x_scale.
+    x_scale = (x_max - x_min) / _UINT8_MAX
+    x_zero_point = -tf.round(x_min / x_scale)
+    x_sums = tf.reduce_sum(
+        tf.to_float(tf.bitcast(x_quantized, tf.uint8)) - x_zero_point,
+        axis=1, keepdims=True)
+    products = tf.to_float(tf.bitcast(products, tf.int32)) - ZERO_POINT * x_sums
+    return products * (x_scale * scales)
+
+
+def gather_dequantized(quantized_weights, scales, ids):
+  """Return the float32 rows ids of weights quantized with a scale per row."""
+  with tf.name_scope("gather_dequantized"):
+    rows = tf.to_float(tf.gather(quantized_weights, ids)) - ZERO_POINT
+    return rows * tf.expand_dims(tf.gather(scales, ids), -1)
+
+
+def _pad_batches(sequences, batch_size):
+  """Group the sequences in zero-padded batches, sorted by length."""
+  sequences = sorted(sequences, key=len)
+  for i in range(0, len(sequences), batch_size):
+    batch = sequences[i:i + batch_size]
+    padded = np.zeros([len(batch), max(len(s) for s in batch)], dtype=np.int64)
+    for j, sequence in enumerate(batch):
+      padded[j, :len(sequence)] = sequence
+    yield padded
+
+
+def calibrate_input_ranges(model_fn, checkpoint_path, sequences,
+                           batch_size=32):
+  """Run a calibration model on sample inputs, and return its input ranges.
+
+  Args:
+    model_fn: function building the calibration model from an int64 tensor of
+      inputs with shape [batch_size, length], and returning its outputs. The
+      quantized matmuls of the model update their "input_range" variables with
+      update_input_range when the outputs are computed.
+    checkpoint_path: Path of the float checkpoint restored into the model.
+    sequences: list of lists of input ids.
+    batch_size: Number of sequences run together.
+
+  Returns:
+    Dictionary mapping the names of the input range variables to their
+    calibrated (min, max) numpy arrays.
+
+  Raises:
+    ValueError: if an input range was not updated by the sample inputs.
+  """
+  with tf.Graph().as_default():
+    inputs = tf.placeholder(tf.int64, [None, None], name="inputs")
+    outputs = model_fn(inputs)
+    range_variables = [v for v in tf.global_variables()
+                       if v.op.name.endswith(INPUT_RANGE_SUFFIX)]
+    range_names = set(v.op.name for v in range_variables)
+    saver = tf.train.Saver([v for v in tf.global_variables()
+                            if v.op.name not in range_names])
+
+    with tf.Session() as sess:
+      sess.run(tf.variables_initializer(range_variables))
+      saver.restore(sess, checkpoint_path)
+      for batch in _pad_batches(sequences, batch_size):
+        sess.run(outputs, feed_dict={inputs: batch})
+      values = sess.run(range_variables)
+
+  input_ranges = {}
+  for variable, value in zip(range_variables, values):
+    if not np.all(np.isfinite(value)):
+      raise ValueError("Input range %s was not calibrated." % variable.op.name)
+    input_ranges[variable.op.name] = value
+  return input_ranges
+
+
+def quantize_checkpoint(checkpoint_path, output_path, variable_axes,
+                        input_ranges=None):
+  """Write a copy of a checkpoint with uint8 weights.
+
+  Args:
+    checkpoint_path: Path of the float checkpoint.
+    output_path: Prefix of the written checkpoint, e.g. "/tmp/int8/model.ckpt".
+    variable_axes: list of (regular expression, axis) pairs of the quantized
+      variables, see get_channel_axis. Each quantized variable is written as
+      uint8, with a "<name>_scale" variable holding its channel scales.
+    input_ranges: Dictionary of the calibrated input ranges, from
+      calibrate_input_ranges, which are added to the checkpoint.
+
+  Returns:
+    Dictionary with the number of quantized variables, their float32 and uint8
+    sizes in bytes (with the scales), and the maximum absolute error of the
+    dequantized weights.
+  """
+  reader = tf.train.load_checkpoint(checkpoint_path)
+  stats = {"quantized_variables": 0, "float_bytes": 0, "int8_bytes": 0,
+           "max_abs_error": 0.}
+
+  with tf.Graph().as_default():
+    values = {}
+    for name in sorted(reader.get_variable_to_shape_map()):
+      value = reader.get_tensor(name)
+      axis = get_channel_axis(name, variable_axes)
+      if axis is None:
+        values[name] = value
+        continue
+
+      quantized, scales = quantize_per_channel(value, axis)
+      values[name] = quantized
+      values[name + SCALE_SUFFIX] = scales
+      stats["quantized_variables"] += 1
+      stats["float_bytes"] += value.nbytes
+      stats["int8_bytes"] += quantized.nbytes + scales.nbytes
+      stats["max_abs_error"] = max(stats["max_abs_error"], float(
+          np.max(np.abs(dequantize(quantized, scales, axis) - value))))
+    for name, value in (input_ranges or {}).items():
+      values[name] = np.asarray(value, dtype=np.float32)
+
+    # The values are fed to the initializers, instead of being embedded in the
+    # graph as constants, which are limited to 2GB.
+    feed_dict = {}
+    variables = []
+    for name, value in sorted(values.items()):
+      initial_value = tf.placeholder(tf.as_dtype(value.dtype), value.shape)
+      variables.append(tf.Variable(initial_value, name=name))
+      feed_dict[initial_value] = value
+
+    saver = tf.train.Saver(variables)
+    with tf.Session() as sess:
+      sess.run(tf.variables_initializer(variables), feed_dict=feed_dict)
+      saver.save(sess, output_path, write_meta_graph=False)
+  return stats
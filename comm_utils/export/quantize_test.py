@@ -0,0 +1,92 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the int8 quantization."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from official.comm_utils.export import quantize
+
+_VARIABLE_AXES = [(r"model/dense/kernel", -1)]
+
+
+class QuantizeTest(tf.test.TestCase):
+  """Tests for the quantization functions."""
+
+  def test_quantize_per_channel(self):
+    weights = np.array([[0.5, -2.], [-1., 1.], [0., 0.]], dtype=np.float32)
+    quantized, scales = quantize.quantize_per_channel(weights, axis=-1)
+    self.assertEqual(quantized.dtype, np.uint8)
+    self.assertAllClose(scales, [1. / 127, 2. / 127])
+    self.assertAllEqual(quantized, [[192, 1], [1, 192], [128, 128]])
+    self.assertAllClose(quantize.dequantize(quantized, scales, axis=-1),
+                        weights, atol=1. / 127)
+
+  def test_quantize_zero_channel(self):
+    quantized, scales = quantize.quantize_per_channel(
+        np.zeros([2, 3], dtype=np.float32), axis=0)
+    self.assertAllEqual(scales, np.ones([2]))
+    self.assertAllEqual(quantized, np.full([2, 3], quantize.ZERO_POINT))
+
+  def test_get_channel_axis(self):
+    self.assertEqual(
+        quantize.get_channel_axis("model/dense/kernel", _VARIABLE_AXES), -1)
+    self.assertIsNone(
+        quantize.get_channel_axis("model/dense/kernel_scale", _VARIABLE_AXES))
+    self.assertIsNone(
+        quantize.get_channel_axis("model/dense/bias", _VARIABLE_AXES))
+
+  def _quantized_matmul(self, transpose_b):
+    rng = np.random.RandomState(0)
+    x = rng.uniform(-1., 1., size=[4, 8]).astype(np.float32)
+    weights = rng.normal(size=[8, 16]).astype(np.float32)
+    if transpose_b:
+      quantized, scales = quantize.quantize_per_channel(weights.T, axis=0)
+    else:
+      quantized, scales = quantize.quantize_per_channel(weights, axis=-1)
+
+    with tf.Graph().as_default():
+      product = quantize.quantized_matmul(
+          tf.constant(x), tf.constant(quantized), tf.constant(scales),
+          tf.constant([-1., 1.]), transpose_b=transpose_b)
+      with self.test_session() as sess:
+        self.assertAllClose(np.matmul(x, weights), sess.run(product),
+                            atol=0.1)
+
+  def test_quantized_matmul(self):
+    self._quantized_matmul(transpose_b=False)
+
+  def test_quantized_matmul_transpose_b(self):
+    self._quantized_matmul(transpose_b=True)
+
+  def test_update_input_range(self):
+    with tf.Graph().as_default():
+      input_range = tf.get_variable(
+          "input_range", [2], initializer=quantize.input_range_initializer())
+      x = tf.placeholder(tf.float32, [None])
+      update = quantize.update_input_range(input_range, x)
+      with self.test_session() as sess:
+        sess.run(input_range.initializer)
+        sess.run(update, feed_dict={x: [0.5, -1.]})
+        sess.run(update, feed_dict={x: [2., 0.]})
+        self.assertAllEqual([-1., 2.], sess.run(input_range))
+
+
+if __name__ == "__main__":
+  tf.test.main()
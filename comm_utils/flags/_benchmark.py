@@ -39,7 +39,7 @@ def define_benchmark(benchmark_log_dir=True, bigquery_uploader=True):
     flags.DEFINE_enum(
         name="benchmark_logger_type", default="BaseBenchmarkLogger",
         enum_values=["BaseBenchmarkLogger", "BenchmarkFileLogger",
-                     "BenchmarkBigQueryLogger"],
+                     "AsyncBenchmarkFileLogger", "BenchmarkBigQueryLogger"],
         help=help_wrap("The type of benchmark logger to use. Defaults to using "
                        "BaseBenchmarkLogger which logs to STDOUT. Different "
                        "loggers will require other flags to be able to work."))
@@ -88,11 +88,13 @@ def define_benchmark(benchmark_log_dir=True, bigquery_uploader=True):
 
     @flags.multi_flags_validator(
         ["benchmark_logger_type", "benchmark_log_dir"],
-        message="--benchmark_logger_type=BenchmarkFileLogger will require "
-                "--benchmark_log_dir being set")
+        message="--benchmark_logger_type=BenchmarkFileLogger or "
+                "AsyncBenchmarkFileLogger will require --benchmark_log_dir being "
+                "set")
     def _check_benchmark_log_dir(flags_dict):
         benchmark_logger_type = flags_dict["benchmark_logger_type"]
-        if benchmark_logger_type == "BenchmarkFileLogger":
+        if benchmark_logger_type in ("BenchmarkFileLogger",
+                                     "AsyncBenchmarkFileLogger"):
             return flags_dict["benchmark_log_dir"]
         return True
 
@@ -44,7 +44,7 @@ def get_loss_scale(flags_obj):
 
 def define_performance(num_parallel_calls=True, inter_op=True, intra_op=True,
                        synthetic_data=True, max_train_steps=True, dtype=True,
-                       all_reduce_alg=True):
+                       all_reduce_alg=True, xla=False, cpu_affinity=False):
     """Register flags for specifying performance tuning arguments.
 
     Args:
@@ -55,6 +55,9 @@ def define_performance(num_parallel_calls=True, inter_op=True, intra_op=True,
       max_train_steps: Create a flags to allow specification of maximum number
         of training steps
       dtype: Create flags for specifying dtype.
+      all_reduce_alg: Create a flag to specify the all-reduce algorithm.
+      xla: Create a flag to turn on XLA JIT compilation.
+      cpu_affinity: Create a flag to pin the process to a set of CPUs.
 
     Returns:
       A list of flags for core.py to marks as key flags.
@@ -137,4 +140,20 @@ def define_performance(num_parallel_calls=True, inter_op=True, intra_op=True,
                            "See tf.contrib.distribute.AllReduceCrossTowerOps for "
                            "more details and available options."))
 
+    if xla:
+        flags.DEFINE_bool(
+            name="enable_xla", short_name="xla", default=False,
+            help=help_wrap("If set, the graph is compiled with the XLA JIT "
+                           "compiler."))
+
+    if cpu_affinity:
+        flags.DEFINE_string(
+            name="cpu_affinity", short_name="ca", default=None,
+            help=help_wrap("Pin the process to a set of CPUs, given either as a "
+                           "CPU list (e.g. \"0-15,32-47\") or as \"node:N\" for "
+                           "all the CPUs of NUMA node N. Combined with "
+                           "--intra_op_parallelism_threads, this keeps the "
+                           "thread pools on the cores (and memory) of a single "
+                           "socket."))
+
     return key_flags
@@ -13,12 +13,16 @@
 # limitations under the License.
 # ==============================================================================
 
-"""Hook that counts examples per second every N steps or seconds."""
+"""Hooks that report the training throughput and the step time breakdown."""
 
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import time
+
+import numpy as np
 import tensorflow as tf  # pylint: disable=g-bad-import-order
 
 from comm_utils.logs import logger
@@ -124,3 +128,296 @@ class ExamplesPerSecondHook(tf.train.SessionRunHook):
                 self._logger.log_metric(
                     "current_examples_per_sec", current_examples_per_sec,
                     global_step=global_step)
+
+
+# Type of the op that returns the next batch of the input pipeline.
+_INPUT_OP_TYPE = "IteratorGetNext"
+
+
+def _parse_step_stats(step_stats):
+    """Return the traced duration of a step, and the time waiting for input.
+
+    Args:
+      step_stats: StepStats proto of a traced session.run call.
+
+    Returns:
+      Tuple of (seconds between the start of the first op and the end of the last
+      op, seconds spent in the ops fetching the next input batch).
+    """
+    start = end = None
+    input_wait = 0
+    for dev_stats in step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            node_start = node_stats.all_start_micros
+            node_end = node_start + node_stats.all_end_rel_micros
+            start = node_start if start is None else min(start, node_start)
+            end = node_end if end is None else max(end, node_end)
+            # The timeline label has the format "name = OpType(inputs)".
+            if "= %s(" % _INPUT_OP_TYPE in node_stats.timeline_label:
+                input_wait += node_stats.all_end_rel_micros
+    if start is None:
+        return 0., 0.
+    return (end - start) * 1e-6, input_wait * 1e-6
+
+
+class StepTimeBreakdownHook(tf.train.SessionRunHook):
+    """Hook to split the step time into input wait, compute and host overhead.
+
+    The wall time spent inside and outside of each session.run call is measured
+    on the host. Every `trace_every_n_steps` steps, the step is also run with a
+    software trace, which is only used to split the time spent in the session:
+      input_wait: time spent in IteratorGetNext, waiting for the input pipeline.
+      compute: the rest of the time between the first and the last op.
+      host_overhead: time not covered by any op (session and hook overhead),
+        plus the time spent outside of session.run since the previous step.
+
+    Rolling percentiles over the last `window_size` samples are logged every
+    `every_n_steps` steps, through the benchmark logger and as TensorBoard
+    summaries. Unlike ProfilerHook, no timeline is written to disk, so the hook is
+    cheap enough to stay enabled for the whole training.
+    """
+
+    def __init__(self,
+                 every_n_steps=100,
+                 trace_every_n_steps=100,
+                 window_size=1000,
+                 percentiles=(50, 90, 99),
+                 warm_steps=0,
+                 output_dir=None,
+                 metric_logger=None):
+        """Initializer for StepTimeBreakdownHook.
+
+        Args:
+          every_n_steps: Log the percentiles every n steps.
+          trace_every_n_steps: Trace one step every n steps to split the time
+            spent in the session.
+          window_size: Number of most recent samples used for the percentiles.
+          percentiles: Percentiles to report.
+          warm_steps: The number of steps to be skipped before measuring.
+          output_dir: Directory to write the TensorBoard summaries to. If None,
+            no summaries are written.
+          metric_logger: instance of `BenchmarkLogger`, the benchmark logger that
+              hook should use to write the log. If None, BaseBenchmarkLogger will
+              be used.
+
+        Raises:
+          ValueError: if every_n_steps or trace_every_n_steps is not positive.
+        """
+        if every_n_steps < 1 or trace_every_n_steps < 1:
+            raise ValueError("every_n_steps and trace_every_n_steps should be "
+                             "positive.")
+
+        self._logger = metric_logger or logger.BaseBenchmarkLogger()
+        self._every_n_steps = every_n_steps
+        self._trace_every_n_steps = trace_every_n_steps
+        self._percentiles = percentiles
+        self._warm_steps = warm_steps
+        self._output_dir = output_dir
+        self._samples = collections.OrderedDict(
+            (name, collections.deque(maxlen=window_size))
+            for name in ("step_time", "outside_run", "input_wait", "compute",
+                         "host_overhead"))
+
+    def begin(self):
+        """Called once before using the session to check global step."""
+        self._global_step_tensor = tf.train.get_global_step()
+        if self._global_step_tensor is None:
+            raise RuntimeError(
+                "Global step should be created to use StepTimeBreakdownHook.")
+        self._summary_writer = None
+        if self._output_dir:
+            self._summary_writer = tf.summary.FileWriterCache.get(self._output_dir)
+        self._steps = 0
+        self._last_run_end = None
+
+    def before_run(self, run_context):  # pylint: disable=unused-argument
+        """Called before each call to run().
+
+        Args:
+          run_context: A SessionRunContext object.
+
+        Returns:
+          A SessionRunArgs object, requesting a trace of the traced steps.
+        """
+        self._run_start = time.time()
+        self._outside_run = 0.
+        if self._last_run_end is not None:
+            self._outside_run = self._run_start - self._last_run_end
+
+        self._trace = (self._steps >= self._warm_steps and
+                       self._steps % self._trace_every_n_steps == 0)
+        options = None
+        if self._trace:
+            options = tf.RunOptions(trace_level=tf.RunOptions.SOFTWARE_TRACE)
+        return tf.train.SessionRunArgs(self._global_step_tensor, options=options)
+
+    def after_run(self, run_context, run_values):  # pylint: disable=unused-argument
+        """Called after each call to run().
+
+        Args:
+          run_context: A SessionRunContext object.
+          run_values: A SessionRunValues object.
+        """
+        self._last_run_end = time.time()
+        self._steps += 1
+        if self._steps <= self._warm_steps:
+            return
+
+        run_time = self._last_run_end - self._run_start
+        self._samples["step_time"].append(run_time + self._outside_run)
+        self._samples["outside_run"].append(self._outside_run)
+        if self._trace:
+            traced_time, input_wait = _parse_step_stats(
+                run_values.run_metadata.step_stats)
+            self._samples["input_wait"].append(input_wait)
+            self._samples["compute"].append(max(traced_time - input_wait, 0.))
+            self._samples["host_overhead"].append(
+                max(run_time - traced_time, 0.) + self._outside_run)
+
+        if (self._steps - self._warm_steps) % self._every_n_steps == 0:
+            self._log_percentiles(run_values.results)
+
+    def _log_percentiles(self, global_step):
+        """Log the rolling percentiles of every measured time, in milliseconds."""
+        summary = tf.Summary()
+        for name, samples in self._samples.items():
+            if not samples:
+                continue
+            values = np.percentile(np.array(samples), self._percentiles)
+            for percentile, value in zip(self._percentiles, values):
+                tag = "step_time_breakdown/%s_p%d" % (name, percentile)
+                self._logger.log_metric(tag, value * 1000, unit="ms",
+                                        global_step=global_step)
+                summary.value.add(tag=tag, simple_value=value * 1000)
+        if self._summary_writer is not None:
+            self._summary_writer.add_summary(summary, global_step)
+
+
+class TokensPerSecondHook(tf.train.SessionRunHook):
+    """Hook to print out real and padded tokens per second.
+
+    Batches of variable-length sequences contain a variable number of examples
+    and of padding tokens, so examples/sec does not measure the throughput. This
+    hook reads the number of real (non-padding) and padded tokens of each step
+    from named tensors, and logs the real tokens/sec, the padded tokens/sec and
+    the ratio between them, both averaged since the warm up and for the most
+    recent interval.
+    """
+
+    def __init__(self,
+                 token_count_tensors,
+                 every_n_steps=None,
+                 every_n_secs=None,
+                 warm_steps=0,
+                 metric_logger=None):
+        """Initializer for TokensPerSecondHook.
+
+        Args:
+          token_count_tensors: Dictionary with the names of the scalar tensors
+            counting the tokens of a step. The "tokens" key lists the tensors
+            counting real tokens, and the "padded_tokens" key the tensors counting
+            all tokens, including padding (e.g. one tensor for the source and one
+            for the target sequences).
+          every_n_steps: Log stats every n steps.
+          every_n_secs: Log stats every n seconds. Exactly one of the
+            `every_n_steps` or `every_n_secs` should be set.
+          warm_steps: The number of steps to be skipped before logging and running
+            average calculation.
+          metric_logger: instance of `BenchmarkLogger`, the benchmark logger that
+              hook should use to write the log. If None, BaseBenchmarkLogger will
+              be used.
+
+        Raises:
+          ValueError: if neither `every_n_steps` or `every_n_secs` is set, or
+          both are set.
+        """
+        if (every_n_steps is None) == (every_n_secs is None):
+            raise ValueError("exactly one of every_n_steps"
+                             " and every_n_secs should be provided.")
+
+        self._logger = metric_logger or logger.BaseBenchmarkLogger()
+
+        self._timer = tf.train.SecondOrStepTimer(
+            every_steps=every_n_steps, every_secs=every_n_secs)
+
+        self._token_tensor_names = list(token_count_tensors["tokens"])
+        self._padded_token_tensor_names = list(
+            token_count_tensors["padded_tokens"])
+        self._warm_steps = warm_steps
+
+        self._train_time = 0
+        self._total_tokens = 0
+        self._total_padded_tokens = 0
+        self._interval_tokens = 0
+        self._interval_padded_tokens = 0
+
+    def begin(self):
+        """Called once before using the session to get the tensors."""
+        self._global_step_tensor = tf.train.get_global_step()
+        if self._global_step_tensor is None:
+            raise RuntimeError(
+                "Global step should be created to use TokensPerSecondHook.")
+        graph = tf.get_default_graph()
+        self._token_tensors = [graph.get_tensor_by_name(_as_tensor_name(name))
+                               for name in self._token_tensor_names]
+        self._padded_token_tensors = [
+            graph.get_tensor_by_name(_as_tensor_name(name))
+            for name in self._padded_token_tensor_names]
+
+    def before_run(self, run_context):  # pylint: disable=unused-argument
+        """Called before each call to run().
+
+        Args:
+          run_context: A SessionRunContext object.
+
+        Returns:
+          A SessionRunArgs object fetching the global step and the token counts.
+        """
+        return tf.train.SessionRunArgs(
+            (self._global_step_tensor, self._token_tensors,
+             self._padded_token_tensors))
+
+    def after_run(self, run_context, run_values):  # pylint: disable=unused-argument
+        """Called after each call to run().
+
+        Args:
+          run_context: A SessionRunContext object.
+          run_values: A SessionRunValues object.
+        """
+        global_step, tokens, padded_tokens = run_values.results
+        if global_step <= self._warm_steps:
+            return
+
+        self._interval_tokens += sum(tokens)
+        self._interval_padded_tokens += sum(padded_tokens)
+
+        if self._timer.should_trigger_for_step(global_step):
+            elapsed_time, _ = self._timer.update_last_triggered_step(global_step)
+            if elapsed_time is not None:
+                self._train_time += elapsed_time
+                self._total_tokens += self._interval_tokens
+                self._total_padded_tokens += self._interval_padded_tokens
+
+                metrics = [
+                    ("average_tokens_per_sec",
+                     self._total_tokens / self._train_time),
+                    ("current_tokens_per_sec",
+                     self._interval_tokens / elapsed_time),
+                    ("average_padded_tokens_per_sec",
+                     self._total_padded_tokens / self._train_time),
+                    ("current_padded_tokens_per_sec",
+                     self._interval_padded_tokens / elapsed_time),
+                    ("average_real_to_padded_tokens_ratio",
+                     self._total_tokens / max(self._total_padded_tokens, 1)),
+                ]
+                for name, value in metrics:
+                    self._logger.log_metric(name, value, global_step=global_step)
+
+            # The tokens of the steps before the first trigger are not timed.
+            self._interval_tokens = 0
+            self._interval_padded_tokens = 0
+
+
+def _as_tensor_name(name):
+    """Return the name of the first output of an op, if name is an op name."""
+    return name if ":" in name else name + ":0"
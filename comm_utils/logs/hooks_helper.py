@@ -34,14 +34,20 @@ _TENSORS_TO_LOG = dict((x, x) for x in ['learning_rate',
                                         'cross_entropy',
                                         'train_accuracy'])
 
+_TOKEN_COUNT_TENSORS = {
+    'tokens': ['source_tokens', 'target_tokens'],
+    'padded_tokens': ['padded_source_tokens', 'padded_target_tokens'],
+}
+
 
 def get_train_hooks(name_list, use_tpu=False, **kwargs):
     """Factory for getting a list of TensorFlow hooks for training by name.
 
     Args:
       name_list: a list of strings to name desired hook classes. Allowed:
-        LoggingTensorHook, ProfilerHook, ExamplesPerSecondHook, which are defined
-        as keys in HOOKS
+        LoggingTensorHook, ProfilerHook, ExamplesPerSecondHook,
+        StepTimeBreakdownHook, TokensPerSecondHook, which are defined as keys in
+        HOOKS
       use_tpu: Boolean of whether computation occurs on a TPU. This will disable
         hooks altogether.
       **kwargs: a dictionary of arguments to the hooks.
@@ -132,6 +138,56 @@ def get_examples_per_second_hook(every_n_steps=100,
         warm_steps=warm_steps, metric_logger=logger.get_benchmark_logger())
 
 
+def get_step_time_breakdown_hook(model_dir=None,
+                                 every_n_steps=100,
+                                 trace_every_n_steps=100,
+                                 warm_steps=5,
+                                 **kwargs):  # pylint: disable=unused-argument
+    """Function to get StepTimeBreakdownHook.
+
+    Args:
+      model_dir: The directory to save the TensorBoard summaries to.
+      every_n_steps: `int`, log the step time percentiles every N steps.
+      trace_every_n_steps: `int`, trace one step every N steps to measure the
+        input wait and compute time.
+      warm_steps: skip this number of steps before measuring.
+      **kwargs: a dictionary of arguments to StepTimeBreakdownHook.
+
+    Returns:
+      Returns a StepTimeBreakdownHook that reports rolling percentiles of the input
+      wait, compute and host overhead of each step.
+    """
+    return hooks.StepTimeBreakdownHook(
+        every_n_steps=every_n_steps, trace_every_n_steps=trace_every_n_steps,
+        warm_steps=warm_steps, output_dir=model_dir,
+        metric_logger=logger.get_benchmark_logger())
+
+
+def get_tokens_per_second_hook(token_count_tensors=None,
+                               every_n_steps=100,
+                               warm_steps=5,
+                               **kwargs):  # pylint: disable=unused-argument
+    """Function to get TokensPerSecondHook.
+
+    Args:
+      token_count_tensors: Dictionary with the names of the tensors counting the
+        real ("tokens") and padded ("padded_tokens") tokens of each step. If not
+        set, _TOKEN_COUNT_TENSORS is used.
+      every_n_steps: `int`, print current and average tokens per second every
+        N steps.
+      warm_steps: skip this number of steps before logging and running average.
+      **kwargs: a dictionary of arguments to TokensPerSecondHook.
+
+    Returns:
+      Returns a TokensPerSecondHook that logs the real and padded tokens/sec.
+    """
+    if token_count_tensors is None:
+        token_count_tensors = _TOKEN_COUNT_TENSORS
+    return hooks.TokensPerSecondHook(
+        token_count_tensors=token_count_tensors, every_n_steps=every_n_steps,
+        warm_steps=warm_steps, metric_logger=logger.get_benchmark_logger())
+
+
 def get_logging_metric_hook(tensors_to_log=None,
                             every_n_secs=600,
                             **kwargs):  # pylint: disable=unused-argument
@@ -160,4 +216,6 @@ HOOKS = {
     'profilerhook': get_profiler_hook,
     'examplespersecondhook': get_examples_per_second_hook,
     'loggingmetrichook': get_logging_metric_hook,
+    'steptimebreakdownhook': get_step_time_breakdown_hook,
+    'tokenspersecondhook': get_tokens_per_second_hook,
 }
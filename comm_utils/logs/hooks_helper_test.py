@@ -63,5 +63,12 @@ class BaseTest(unittest.TestCase):
     test_hook_name = 'LoggingMetricHook'
     self.validate_train_hook_name(test_hook_name, 'loggingmetrichook')
 
+  def test_get_tokens_per_second_hook(self):
+    self.validate_train_hook_name('TokensPerSecondHook', 'tokenspersecondhook')
+
+  def test_get_step_time_breakdown_hook(self):
+    self.validate_train_hook_name('StepTimeBreakdownHook',
+                                  'steptimebreakdownhook')
+
 if __name__ == '__main__':
   tf.test.main()
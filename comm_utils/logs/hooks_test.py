@@ -22,6 +22,7 @@ from __future__ import print_function
 import time
 
 import tensorflow as tf  # pylint: disable=g-bad-import-order
+from tensorflow.core.framework import step_stats_pb2
 
 from official.comm_utils.logs import hooks
 from official.comm_utils.testing import mock_lib
@@ -153,5 +154,119 @@ class ExamplesPerSecondHookTest(tf.test.TestCase):
     self.assertEqual(metrics[-1]["name"], "current_examples_per_sec")
 
 
+class TokensPerSecondHookTest(tf.test.TestCase):
+  """Tests for the TokensPerSecondHook."""
+
+  def setUp(self):
+    self._logger = mock_lib.MockBenchmarkLogger()
+
+    self.graph = tf.Graph()
+    with self.graph.as_default():
+      tf.train.create_global_step()
+      # Each step has 9 real tokens out of 8 source and 4 target tokens.
+      inputs = tf.constant([[3, 4, 0, 0], [5, 6, 7, 1]])
+      targets = tf.constant([[3, 1], [4, 0]])
+      tf.identity(tf.count_nonzero(inputs), name="source_tokens")
+      tf.identity(tf.count_nonzero(targets), name="target_tokens")
+      tf.identity(tf.size(inputs, out_type=tf.int64),
+                  name="padded_source_tokens")
+      tf.identity(tf.size(targets, out_type=tf.int64),
+                  name="padded_target_tokens")
+      self.train_op = tf.assign_add(tf.train.get_global_step(), 1)
+      self.token_count_tensors = {
+          "tokens": ["source_tokens", "target_tokens"],
+          "padded_tokens": ["padded_source_tokens", "padded_target_tokens"]}
+
+  def test_raise_in_none_secs_and_steps(self):
+    with self.assertRaises(ValueError):
+      hooks.TokensPerSecondHook(self.token_count_tensors,
+                                metric_logger=self._logger)
+
+  def test_tokens_per_sec_every_2_steps_with_warm_steps(self):
+    with self.graph.as_default():
+      hook = hooks.TokensPerSecondHook(
+          self.token_count_tensors, every_n_steps=2, warm_steps=2,
+          metric_logger=self._logger)
+
+      with tf.train.MonitoredSession(
+          tf.train.ChiefSessionCreator(), [hook]) as mon_sess:
+        for _ in range(4):
+          mon_sess.run(self.train_op)
+          # The warm up steps are skipped, and the first trigger only starts
+          # the timer.
+          self.assertFalse(self._logger.logged_metric)
+        for _ in range(2):
+          mon_sess.run(self.train_op)
+
+    metrics = {metric["name"]: metric["value"]
+               for metric in self._logger.logged_metric}
+    self.assertEqual(
+        sorted(metrics),
+        ["average_padded_tokens_per_sec", "average_real_to_padded_tokens_ratio",
+         "average_tokens_per_sec", "current_padded_tokens_per_sec",
+         "current_tokens_per_sec"])
+    self.assertAllClose(0.75, metrics["average_real_to_padded_tokens_ratio"])
+    self.assertAllClose(0.75, metrics["current_tokens_per_sec"] /
+                        metrics["current_padded_tokens_per_sec"])
+
+
+class StepTimeBreakdownHookTest(tf.test.TestCase):
+  """Tests for the StepTimeBreakdownHook."""
+
+  def setUp(self):
+    self._logger = mock_lib.MockBenchmarkLogger()
+
+    self.graph = tf.Graph()
+    with self.graph.as_default():
+      tf.train.create_global_step()
+      dataset = tf.data.Dataset.range(1000).repeat()
+      next_element = dataset.make_one_shot_iterator().get_next()
+      self.train_op = tf.group(
+          tf.assign_add(tf.train.get_global_step(), 1), next_element)
+
+  def test_raise_in_non_positive_steps(self):
+    with self.assertRaises(ValueError):
+      hooks.StepTimeBreakdownHook(every_n_steps=0, metric_logger=self._logger)
+
+  def test_parse_step_stats(self):
+    step_stats = step_stats_pb2.StepStats()
+    dev_stats = step_stats.dev_stats.add(device="/job:localhost/device:CPU:0")
+    dev_stats.node_stats.add(
+        node_name="IteratorGetNext", all_start_micros=1000,
+        all_end_rel_micros=300,
+        timeline_label="IteratorGetNext = IteratorGetNext(OneShotIterator)")
+    dev_stats.node_stats.add(
+        node_name="MatMul", all_start_micros=1300, all_end_rel_micros=700,
+        timeline_label="MatMul = MatMul(IteratorGetNext, w)")
+
+    traced_time, input_wait = hooks._parse_step_stats(step_stats)
+    self.assertAllClose(1e-3, traced_time)
+    self.assertAllClose(3e-4, input_wait)
+
+  def test_log_breakdown_percentiles(self):
+    with self.graph.as_default():
+      hook = hooks.StepTimeBreakdownHook(
+          every_n_steps=5, trace_every_n_steps=2, percentiles=(50, 90),
+          warm_steps=1, metric_logger=self._logger)
+
+      with tf.train.MonitoredSession(
+          tf.train.ChiefSessionCreator(), [hook]) as mon_sess:
+        for _ in range(5):
+          mon_sess.run(self.train_op)
+        # Nothing is logged before every_n_steps steps after the warm up.
+        self.assertFalse(self._logger.logged_metric)
+
+        mon_sess.run(self.train_op)
+
+    names = [metric["name"] for metric in self._logger.logged_metric]
+    for name in ("step_time", "outside_run", "input_wait", "compute",
+                 "host_overhead"):
+      self.assertIn("step_time_breakdown/%s_p50" % name, names)
+      self.assertIn("step_time_breakdown/%s_p90" % name, names)
+    for metric in self._logger.logged_metric:
+      self.assertEqual(metric["unit"], "ms")
+      self.assertGreaterEqual(metric["value"], 0)
+
+
 if __name__ == "__main__":
   tf.test.main()
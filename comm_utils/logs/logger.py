@@ -29,9 +29,11 @@ import multiprocessing
 import numbers
 import os
 import threading
+import time
 import uuid
 
 from six.moves import _thread as thread
+from six.moves import queue
 from absl import flags
 import tensorflow as tf
 from tensorflow.python.client import device_lib
@@ -66,6 +68,8 @@ def config_benchmark_logger(flag_obj=None):
             _benchmark_logger = BaseBenchmarkLogger()
         elif flag_obj.benchmark_logger_type == "BenchmarkFileLogger":
             _benchmark_logger = BenchmarkFileLogger(flag_obj.benchmark_log_dir)
+        elif flag_obj.benchmark_logger_type == "AsyncBenchmarkFileLogger":
+            _benchmark_logger = AsyncBenchmarkFileLogger(flag_obj.benchmark_log_dir)
         elif flag_obj.benchmark_logger_type == "BenchmarkBigQueryLogger":
             from official.benchmark import benchmark_uploader as bu  # pylint: disable=g-import-not-at-top
             bq_uploader = bu.BigQueryUploader(gcp_project=flag_obj.gcp_project)
@@ -127,10 +131,10 @@ class BaseBenchmarkLogger(object):
                 self.log_metric(key, eval_results[key], global_step=global_step)
 
     def log_metric(self, name, value, unit=None, global_step=None, extras=None):
-        """Log the benchmark metric information to local file.
+        """Log the benchmark metric information with tf.logging.
 
-        Currently the logging is done in a synchronized way. This should be updated
-        to log asynchronously.
+        The metric is logged synchronously. AsyncBenchmarkFileLogger writes the
+        metrics from a background thread instead.
 
         Args:
           name: string, the name of the metric to log.
@@ -167,8 +171,9 @@ class BenchmarkFileLogger(BaseBenchmarkLogger):
     def log_metric(self, name, value, unit=None, global_step=None, extras=None):
         """Log the benchmark metric information to local file.
 
-        Currently the logging is done in a synchronized way. This should be updated
-        to log asynchronously.
+        The metric is written synchronously. AsyncBenchmarkFileLogger writes the
+        metrics from a background thread instead, so that the caller does not wait
+        for the file system.
 
         Args:
           name: string, the name of the metric to log.
@@ -217,6 +222,128 @@ class BenchmarkFileLogger(BaseBenchmarkLogger):
         self._metric_file_handler.close()
 
 
+class AsyncBenchmarkFileLogger(BenchmarkFileLogger):
+    """Class to log the benchmark information to local disk asynchronously.
+
+    Metrics are put in a bounded queue, and written by a background thread in
+    batches. The batch is flushed to disk every `flush_interval_secs`, or as soon
+    as `flush_batch_size` metrics are pending. When the queue is full, log_metric
+    waits at most `put_timeout_secs` for the writer to catch up, and then drops
+    the metric, so that the training thread is never blocked for long. The
+    remaining metrics are written when on_finish is called. The metrics whose
+    write fails are logged and counted in lost_count.
+    """
+
+    def __init__(self, logging_dir, max_queue_size=10000, flush_interval_secs=5.0,
+                 flush_batch_size=100, put_timeout_secs=0.01,
+                 finish_timeout_secs=60.0):
+        super(AsyncBenchmarkFileLogger, self).__init__(logging_dir)
+        self._flush_interval_secs = flush_interval_secs
+        self._flush_batch_size = flush_batch_size
+        self._put_timeout_secs = put_timeout_secs
+        self._finish_timeout_secs = finish_timeout_secs
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self.enqueued_count = 0
+        self.dropped_count = 0
+        self.written_count = 0
+        self.lost_count = 0
+
+        self._writer = threading.Thread(target=self._write_metrics,
+                                        name="AsyncBenchmarkFileLogger")
+        self._writer.daemon = True
+        self._writer.start()
+
+    def log_metric(self, name, value, unit=None, global_step=None, extras=None):
+        """Queue the benchmark metric information to be logged to local file.
+
+        Args:
+          name: string, the name of the metric to log.
+          value: number, the value of the metric. The value will not be logged if it
+            is not a number type.
+          unit: string, the unit of the metric, E.g "image per second".
+          global_step: int, the global_step when the metric is logged.
+          extras: map of string:string, the extra information about the metric.
+        """
+        metric = _process_metric_to_json(name, value, unit, global_step, extras)
+        if not metric:
+            return
+        try:
+            self._queue.put(metric, timeout=self._put_timeout_secs)
+        except queue.Full:
+            with self._lock:
+                self.dropped_count += 1
+            return
+        with self._lock:
+            self.enqueued_count += 1
+
+    def _write_metrics(self):
+        """Background loop writing the queued metrics in batches."""
+        lines = []
+        deadline = time.time() + self._flush_interval_secs
+        finished = False
+        while not finished:
+            try:
+                metric = self._queue.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                metric = None
+            else:
+                if metric is None:  # Sentinel added by on_finish.
+                    finished = True
+                else:
+                    try:
+                        lines.append(json.dumps(metric))
+                    except (TypeError, ValueError) as e:
+                        tf.logging.warning("Failed to dump metric to log file: "
+                                           "name %s, value %s, error %s",
+                                           metric["name"], metric["value"], e)
+
+            if (finished or len(lines) >= self._flush_batch_size or
+                    time.time() >= deadline):
+                if lines:
+                    self._write_lines(lines)
+                    lines = []
+                deadline = time.time() + self._flush_interval_secs
+
+    def _write_lines(self, lines):
+        """Write a batch of lines, counting them as lost if the write fails."""
+        try:
+            self._metric_file_handler.write("\n".join(lines) + "\n")
+            self._metric_file_handler.flush()
+        except (IOError, OSError, tf.errors.OpError) as e:
+            tf.logging.error("Failed to write %d metrics to the log file: %s",
+                             len(lines), e)
+            with self._lock:
+                self.lost_count += len(lines)
+            return
+        with self._lock:
+            self.written_count += len(lines)
+
+    def on_finish(self, status):
+        # Wait for the writer to drain the queue before closing the file. The
+        # writer is not waited for if it died, or if the queue stays full.
+        finished = False
+        if self._writer.is_alive():
+            try:
+                self._queue.put(None, timeout=self._finish_timeout_secs)
+            except queue.Full:
+                tf.logging.error("AsyncBenchmarkFileLogger writer did not drain "
+                                 "the queue in %.0f seconds.",
+                                 self._finish_timeout_secs)
+            else:
+                self._writer.join()
+                finished = True
+        if not finished:
+            with self._lock:
+                self.lost_count += self._queue.qsize()
+        if self.dropped_count or self.lost_count:
+            tf.logging.warning(
+                "AsyncBenchmarkFileLogger dropped %d and lost %d of %d metrics.",
+                self.dropped_count, self.lost_count,
+                self.dropped_count + self.enqueued_count)
+        super(AsyncBenchmarkFileLogger, self).on_finish(status)
+
+
 class BenchmarkBigQueryLogger(BaseBenchmarkLogger):
     """Class to log the benchmark information to BigQuery data store."""
 
@@ -22,6 +22,7 @@ from __future__ import print_function
 import json
 import os
 import tempfile
+import threading
 import time
 import unittest
 
@@ -65,6 +66,15 @@ class BenchmarkLoggerTest(tf.test.TestCase):
         self.assertIsInstance(logger.get_benchmark_logger(),
                               logger.BenchmarkFileLogger)
 
+  def test_config_async_benchmark_file_logger(self):
+    log_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    with flagsaver.flagsaver(benchmark_log_dir=log_dir):
+      with flagsaver.flagsaver(benchmark_logger_type='AsyncBenchmarkFileLogger'):
+        logger.config_benchmark_logger()
+        self.assertIsInstance(logger.get_benchmark_logger(),
+                              logger.AsyncBenchmarkFileLogger)
+        logger.get_benchmark_logger().on_finish(logger.RUN_STATUS_SUCCESS)
+
   @unittest.skipIf(bigquery is None, 'Bigquery dependency is not installed.')
   @mock.patch.object(bigquery, "Client")
   def test_config_benchmark_bigquery_logger(self, mock_bigquery_client):
@@ -297,6 +307,106 @@ class BenchmarkFileLoggerTest(tf.test.TestCase):
     self.assertIsNotNone(run_info["machine_config"]["memory_available"])
 
 
+class AsyncBenchmarkFileLoggerTest(tf.test.TestCase):
+
+  def _read_metrics(self, log_dir):
+    with tf.gfile.GFile(os.path.join(log_dir, "metric.log")) as f:
+      return [json.loads(line) for line in f]
+
+  def test_metrics_are_written_on_finish(self):
+    log_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    log = logger.AsyncBenchmarkFileLogger(log_dir, flush_interval_secs=60)
+    log.log_metric("accuracy", 0.999, global_step=1e4, extras={"name": "value"})
+    log.log_metric("loss", 0.02, global_step=1e4)
+    log.log_metric("invalid", "not a number")
+    log.on_finish(logger.RUN_STATUS_SUCCESS)
+
+    metrics = self._read_metrics(log_dir)
+    self.assertEqual(["accuracy", "loss"], [m["name"] for m in metrics])
+    self.assertEqual(metrics[0]["extras"], [{"name": "name", "value": "value"}])
+    self.assertEqual(2, log.written_count)
+    self.assertEqual(0, log.dropped_count)
+
+  def test_flush_when_batch_is_full(self):
+    log_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    log = logger.AsyncBenchmarkFileLogger(
+        log_dir, flush_interval_secs=60, flush_batch_size=2)
+    log.log_metric("loss", 0.1, global_step=1)
+    log.log_metric("loss", 0.2, global_step=2)
+
+    deadline = time.time() + 10
+    while log.written_count < 2 and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertEqual(2, len(self._read_metrics(log_dir)))
+    log.on_finish(logger.RUN_STATUS_SUCCESS)
+
+  @mock.patch.object(logger.AsyncBenchmarkFileLogger, "_write_metrics")
+  def test_drop_when_queue_is_full(self, unused_mock_write_metrics):
+    log_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    # The writer thread does nothing, so the queue is never drained.
+    log = logger.AsyncBenchmarkFileLogger(
+        log_dir, max_queue_size=2, put_timeout_secs=0.001)
+    for step in range(3):
+      log.log_metric("loss", 0.1, global_step=step)
+    self.assertEqual(2, log.enqueued_count)
+    self.assertEqual(1, log.dropped_count)
+
+  def test_write_errors_are_counted(self):
+    log_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    log = logger.AsyncBenchmarkFileLogger(
+        log_dir, flush_interval_secs=60, flush_batch_size=2)
+    file_handler = log._metric_file_handler
+    log._metric_file_handler = mock.MagicMock(wraps=file_handler)
+    log._metric_file_handler.write.side_effect = IOError("disk full")
+    for step in range(3):
+      log.log_metric("loss", 0.1, global_step=step)
+    log.on_finish(logger.RUN_STATUS_SUCCESS)
+
+    self.assertEqual(3, log.lost_count)
+    self.assertEqual(0, log.written_count)
+
+  @mock.patch.object(logger.AsyncBenchmarkFileLogger, "_write_metrics")
+  def test_on_finish_with_dead_writer(self, unused_mock_write_metrics):
+    log_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    # The writer thread exits at once, and the full queue is never drained.
+    log = logger.AsyncBenchmarkFileLogger(
+        log_dir, max_queue_size=2, put_timeout_secs=0.001)
+    log._writer.join()
+    for step in range(2):
+      log.log_metric("loss", 0.1, global_step=step)
+    log.on_finish(logger.RUN_STATUS_SUCCESS)
+
+    self.assertEqual(2, log.lost_count)
+
+  def test_log_metric_does_not_wait_for_writer(self):
+    log_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+    log = logger.AsyncBenchmarkFileLogger(
+        log_dir, flush_interval_secs=60, flush_batch_size=1)
+    # Block the writer thread in its first write, until the event is set.
+    write_started = threading.Event()
+    release_writer = threading.Event()
+    file_handler = log._metric_file_handler
+    def blocking_write(data):
+      write_started.set()
+      release_writer.wait()
+      return file_handler.write(data)
+    log._metric_file_handler = mock.MagicMock(wraps=file_handler)
+    log._metric_file_handler.write.side_effect = blocking_write
+
+    log.log_metric("loss", 0.1, global_step=0)
+    self.assertTrue(write_started.wait(10))
+    # The metrics logged while the writer is blocked are queued right away.
+    for step in range(1, 100):
+      log.log_metric("loss", 0.1, global_step=step)
+    self.assertEqual(100, log.enqueued_count)
+    self.assertEqual(0, log.dropped_count)
+    self.assertEqual(0, log.written_count)
+
+    release_writer.set()
+    log.on_finish(logger.RUN_STATUS_SUCCESS)
+    self.assertEqual(100, len(self._read_metrics(log_dir)))
+
+
 @unittest.skipIf(bigquery is None, 'Bigquery dependency is not installed.')
 class BenchmarkBigQueryLoggerTest(tf.test.TestCase):
 
@@ -0,0 +1,113 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Helper functions for configuring sessions and CPU placement."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import tensorflow as tf
+
+_NUMA_NODE_CPULIST = "/sys/devices/system/node/node%d/cpulist"
+_NUMA_NODE_PREFIX = "node:"
+
+
+def get_session_config(inter_op_threads=0, intra_op_threads=0,
+                       enable_xla=False):
+  """Return a ConfigProto with the given CPU performance settings.
+
+  Args:
+    inter_op_threads: Number of threads used to run independent ops in
+      parallel. If 0, the system picks an appropriate number.
+    intra_op_threads: Number of threads used inside a single op (e.g. a matrix
+      multiplication). If 0, the system picks an appropriate number.
+    enable_xla: If true, XLA JIT compilation is turned on for the whole graph.
+
+  Returns:
+    tf.ConfigProto
+  """
+  config = tf.ConfigProto(
+      inter_op_parallelism_threads=inter_op_threads,
+      intra_op_parallelism_threads=intra_op_threads)
+  if enable_xla:
+    config.graph_options.optimizer_options.global_jit_level = (
+        tf.OptimizerOptions.ON_1)
+  return config
+
+
+def parse_cpu_list(cpu_list):
+  """Parse a Linux-style CPU list (e.g. "0-3,8,10-11") into a sorted list."""
+  cpus = set()
+  for part in cpu_list.strip().split(","):
+    if not part:
+      continue
+    if "-" in part:
+      first, last = part.split("-")
+      cpus.update(range(int(first), int(last) + 1))
+    else:
+      cpus.add(int(part))
+  return sorted(cpus)
+
+
+def get_numa_node_cpus(node):
+  """Return the CPUs of a NUMA node, as reported by the kernel."""
+  with open(_NUMA_NODE_CPULIST % node) as f:
+    return parse_cpu_list(f.read())
+
+
+def resolve_cpu_affinity(spec):
+  """Return the list of CPUs described by an affinity spec.
+
+  Args:
+    spec: Either a CPU list (e.g. "0-15,32-47"), or "node:N" for all the CPUs
+      of NUMA node N.
+
+  Returns:
+    Sorted list of CPU ids.
+
+  Raises:
+    ValueError: if the spec does not describe any CPU.
+  """
+  if spec.startswith(_NUMA_NODE_PREFIX):
+    cpus = get_numa_node_cpus(int(spec[len(_NUMA_NODE_PREFIX):]))
+  else:
+    cpus = parse_cpu_list(spec)
+  if not cpus:
+    raise ValueError("CPU affinity spec %r does not contain any CPU." % spec)
+  return cpus
+
+
+def set_cpu_affinity(spec):
+  """Pin the current process (and the threads it starts) to a set of CPUs.
+
+  This should be called before the first session is created, so that the
+  TensorFlow thread pools are created on the selected CPUs.
+
+  Args:
+    spec: CPU affinity spec, see resolve_cpu_affinity().
+
+  Returns:
+    The list of CPUs, or None if the platform does not support pinning.
+  """
+  cpus = resolve_cpu_affinity(spec)
+  if not hasattr(os, "sched_setaffinity"):
+    tf.logging.warning("CPU affinity is not supported on this platform; "
+                       "ignoring %r." % spec)
+    return None
+  os.sched_setaffinity(0, cpus)
+  tf.logging.info("Pinned process to CPUs %s." % cpus)
+  return cpus
@@ -0,0 +1,62 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+""" Tests for session util functions."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from official.comm_utils.misc import session_utils
+
+
+class GetSessionConfigTest(tf.test.TestCase):
+  """Tests for get_session_config."""
+
+  def test_thread_pools(self):
+    config = session_utils.get_session_config(
+        inter_op_threads=2, intra_op_threads=8)
+    self.assertEqual(config.inter_op_parallelism_threads, 2)
+    self.assertEqual(config.intra_op_parallelism_threads, 8)
+    self.assertEqual(config.graph_options.optimizer_options.global_jit_level,
+                     tf.OptimizerOptions.DEFAULT)
+
+  def test_xla(self):
+    config = session_utils.get_session_config(enable_xla=True)
+    self.assertEqual(config.graph_options.optimizer_options.global_jit_level,
+                     tf.OptimizerOptions.ON_1)
+
+
+class CpuAffinityTest(tf.test.TestCase):
+  """Tests for parsing CPU affinity specs."""
+
+  def test_parse_cpu_list(self):
+    self.assertEqual(session_utils.parse_cpu_list("0-3,8,10-11\n"),
+                     [0, 1, 2, 3, 8, 10, 11])
+
+  def test_resolve_numa_node(self):
+    with tf.test.mock.patch.object(
+        session_utils, "get_numa_node_cpus", return_value=[4, 5]) as mock_fn:
+      self.assertEqual(session_utils.resolve_cpu_affinity("node:1"), [4, 5])
+      mock_fn.assert_called_once_with(1)
+
+  def test_empty_spec(self):
+    with self.assertRaises(ValueError):
+      session_utils.resolve_cpu_affinity(",")
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -1,3 +1,4 @@
+import itertools
 import os
 import six
 import random
@@ -17,6 +18,9 @@ _PREFIX = "open_subtitles18"
 _TRAIN_TAG = "train"
 _DEV_TAG = "dev"
 
+# Number of lines encoded together by the vocab helper.
+_ENCODE_CHUNK_SIZE = 10000
+
 
 def shuffle_records(fname):
     """Shuffle records in a single file."""
@@ -72,6 +76,17 @@ def txt_line_iterator(path):
             yield line.strip()
 
 
+def txt_line_chunk_iterator(src_path, tgt_path, chunk_size=_ENCODE_CHUNK_SIZE):
+    """Iterate through chunks of aligned lines of the source and target files."""
+    lines = zip(txt_line_iterator(src_path), txt_line_iterator(tgt_path))
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return
+        src_lines, tgt_lines = zip(*chunk)
+        yield list(src_lines), list(tgt_lines)
+
+
 def dict_to_example(dictionary):
     """Converts a dictionary of string->int to a tf.Example."""
     features = {}
@@ -97,21 +112,24 @@ def encode_and_save_files(vocab_helper, data_dir, src_file, tgt_file, tag, total
     tmp_filepaths = [fname + ".incomplete" for fname in filepaths]
     writers = [tf.python_io.TFRecordWriter(fname) for fname in tmp_filepaths]
     counter, shard = 0, 0
-    for counter, (input_line, target_line) in enumerate(zip(txt_line_iterator(src_file), txt_line_iterator(tgt_file))):
-        if counter > 0 and counter % 100000 == 0:
-            tf.logging.info("\tSaving case %d." % counter)
-        example = dict_to_example(
-            {"inputs": vocab_helper.encode_source(input_line, add_eos=True),
-             "targets": vocab_helper.encode_target(target_line, add_eos=True)})
-        writers[shard].write(example.SerializeToString())
-        shard = (shard + 1) % total_shards
+    for input_lines, target_lines in txt_line_chunk_iterator(src_file, tgt_file):
+        # Encode a whole chunk of lines at once.
+        inputs = vocab_helper.encode_source_batch(input_lines, add_eos=True)
+        targets = vocab_helper.encode_target_batch(target_lines, add_eos=True)
+        for input_ids, target_ids in zip(inputs, targets):
+            if counter > 0 and counter % 100000 == 0:
+                tf.logging.info("\tSaving case %d." % counter)
+            example = dict_to_example({"inputs": input_ids, "targets": target_ids})
+            writers[shard].write(example.SerializeToString())
+            shard = (shard + 1) % total_shards
+            counter += 1
     for writer in writers:
         writer.close()
 
     for tmp_name, final_name in zip(tmp_filepaths, filepaths):
         tf.gfile.Rename(tmp_name, final_name)
 
-    tf.logging.info("Saved %d Examples", counter + 1)
+    tf.logging.info("Saved %d Examples", counter)
     return filepaths
 
 
@@ -20,11 +20,18 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from model import quantized_layers
+
 
 class Attention(tf.layers.Layer):
-    """Multi-headed attention layer."""
+    """Multi-headed attention layer.
+
+    quantize_mode is the post-training quantization mode of the dense layers
+    (see quantized_layers.Dense).
+    """
 
-    def __init__(self, hidden_size, num_heads, attention_dropout, train):
+    def __init__(self, hidden_size, num_heads, attention_dropout, train,
+                 quantize_mode=None):
         if hidden_size % num_heads != 0:
             raise ValueError("Hidden size must be evenly divisible by the number of "
                              "heads.")
@@ -36,12 +43,15 @@ class Attention(tf.layers.Layer):
         self.train = train
 
         # Layers for linearly projecting the queries, keys, and values.
-        self.q_dense_layer = tf.layers.Dense(hidden_size, use_bias=False, name="q")
-        self.k_dense_layer = tf.layers.Dense(hidden_size, use_bias=False, name="k")
-        self.v_dense_layer = tf.layers.Dense(hidden_size, use_bias=False, name="v")
+        self.q_dense_layer = quantized_layers.Dense(
+            hidden_size, quantize_mode, use_bias=False, name="q")
+        self.k_dense_layer = quantized_layers.Dense(
+            hidden_size, quantize_mode, use_bias=False, name="k")
+        self.v_dense_layer = quantized_layers.Dense(
+            hidden_size, quantize_mode, use_bias=False, name="v")
 
-        self.output_dense_layer = tf.layers.Dense(hidden_size, use_bias=False,
-                                                  name="output_transform")
+        self.output_dense_layer = quantized_layers.Dense(
+            hidden_size, quantize_mode, use_bias=False, name="output_transform")
 
     def split_heads(self, x):
         """Split x into different heads, and transpose the resulting value.
@@ -83,7 +93,7 @@ class Attention(tf.layers.Layer):
             x = tf.transpose(x, [0, 2, 1, 3])  # --> [batch, length, num_heads, depth]
             return tf.reshape(x, [batch_size, length, self.hidden_size])
 
-    def call(self, x, y, bias, cache=None):
+    def call(self, x, y, bias, cache=None, dropout_seed=None):
         """Apply attention mechanism to x and y.
 
         Args:
@@ -95,6 +105,7 @@ class Attention(tf.layers.Layer):
                 {"k": tensor with shape [batch_size, i, key_channels],
                  "v": tensor with shape [batch_size, i, value_channels]}
             where i is the current decoded length.
+          dropout_seed: (optional) op seed of the attention dropout.
 
         Returns:
           Attention layer output with shape [batch_size, length_x, hidden_size]
@@ -130,7 +141,8 @@ class Attention(tf.layers.Layer):
         logits += bias
         weights = tf.nn.softmax(logits, name="attention_weights")
         if self.train:
-            weights = tf.nn.dropout(weights, 1.0 - self.attention_dropout)
+            weights = tf.nn.dropout(weights, 1.0 - self.attention_dropout,
+                                    seed=dropout_seed)
         attention_output = tf.matmul(weights, v)
 
         # Recombine heads --> [batch_size, length, hidden_size]
@@ -144,5 +156,5 @@ class Attention(tf.layers.Layer):
 class SelfAttention(Attention):
     """Multiheaded self-attention layer."""
 
-    def call(self, x, bias, cache=None):
-        return super(SelfAttention, self).call(x, x, bias, cache)
+    def call(self, x, bias, cache=None, dropout_seed=None):
+        return super(SelfAttention, self).call(x, x, bias, cache, dropout_seed)
@@ -24,6 +24,10 @@ from tensorflow.python.util import nest
 # Default value for INF
 INF = 1. * 1e7
 
+# Reasons for the termination of the search loop, returned in the stats.
+STOP_MAX_DECODE_LENGTH = 0
+STOP_FINISHED_BEAMS = 1
+
 
 class _StateKeys(object):
     """Keys to dictionary storing the state of the beam search loop."""
@@ -55,12 +59,19 @@ class _StateKeys(object):
     # True -> finished sequence, False -> filler. Shape [batch_size, beam_size]
     FINISHED_FLAGS = "FINISHED_FLAGS"
 
+    # Only present when the search is instrumented.
+    # Number of alive sequences that can still score better than the worst
+    # finished sequence, at each step. Shape [batch_size, CUR_INDEX]
+    ALIVE_COUNTS = "ALIVE_COUNTS"
+    # Number of finished sequences at each step. Shape [batch_size, CUR_INDEX]
+    FINISHED_COUNTS = "FINISHED_COUNTS"
+
 
 class SequenceBeamSearch(object):
     """Implementation of beam search loop."""
 
     def __init__(self, symbols_to_logits_fn, vocab_size, batch_size,
-                 beam_size, alpha, max_decode_length, eos_id):
+                 beam_size, alpha, max_decode_length, eos_id, instrument=False):
         self.symbols_to_logits_fn = symbols_to_logits_fn
         self.vocab_size = vocab_size
         self.batch_size = batch_size
@@ -68,9 +79,14 @@ class SequenceBeamSearch(object):
         self.alpha = alpha
         self.max_decode_length = max_decode_length
         self.eos_id = eos_id
+        self.instrument = instrument
 
     def search(self, initial_ids, initial_cache):
-        """Beam search for sequences with highest scores."""
+        """Beam search for sequences with highest scores.
+
+        If the search is instrumented, a dictionary of decoding stats (see
+        _get_stats) is returned after the sequences and scores.
+        """
         state, state_shapes = self._create_initial_state(initial_ids, initial_cache)
 
         finished_state = tf.while_loop(
@@ -91,8 +107,46 @@ class SequenceBeamSearch(object):
             tf.reduce_any(finished_flags, 1), finished_seq, alive_seq)
         finished_scores = tf.where(
             tf.reduce_any(finished_flags, 1), finished_scores, alive_log_probs)
+        if self.instrument:
+            return finished_seq, finished_scores, self._get_stats(finished_state)
         return finished_seq, finished_scores
 
+    def _get_stats(self, finished_state):
+        """Return the decoding stats of the finished search loop.
+
+        Returns:
+          Dictionary of
+            "loop_steps": number of iterations of the search loop (scalar).
+            "decode_steps": number of iterations after which the search was
+              over for each batch item, i.e. no alive sequence could beat the
+              finished ones anymore. [batch_size]
+            "alive_beams": number of alive sequences that could still beat the
+              worst finished sequence after each step. [batch_size, loop_steps]
+            "finished_beams": number of finished sequences after each step.
+              [batch_size, loop_steps]
+            "stop_reason": STOP_MAX_DECODE_LENGTH or STOP_FINISHED_BEAMS.
+        """
+        loop_steps = finished_state[_StateKeys.CUR_INDEX]
+        alive_counts = finished_state[_StateKeys.ALIVE_COUNTS]
+
+        # A batch item is done at the first step without competitive alive beams.
+        done = tf.equal(alive_counts, 0)
+        decode_steps = tf.where(
+            tf.reduce_any(done, 1),
+            tf.to_int32(tf.argmax(tf.to_int32(done), axis=1)) + 1,
+            tf.fill([self.batch_size], loop_steps))
+
+        stop_reason = tf.where(
+            tf.less(loop_steps, self.max_decode_length),
+            STOP_FINISHED_BEAMS, STOP_MAX_DECODE_LENGTH)
+        return {
+            "loop_steps": loop_steps,
+            "decode_steps": decode_steps,
+            "alive_beams": alive_counts,
+            "finished_beams": finished_state[_StateKeys.FINISHED_COUNTS],
+            "stop_reason": stop_reason
+        }
+
     def _create_initial_state(self, initial_ids, initial_cache):
         """Return initial state dictionary and its shape invariants.
 
@@ -159,8 +213,35 @@ class SequenceBeamSearch(object):
             _StateKeys.FINISHED_FLAGS: tf.TensorShape([None, self.beam_size])
         }
 
+        if self.instrument:
+            counts = tf.zeros([self.batch_size, 0], tf.int32)
+            state[_StateKeys.ALIVE_COUNTS] = counts
+            state[_StateKeys.FINISHED_COUNTS] = counts
+            state_shape_invariants[_StateKeys.ALIVE_COUNTS] = tf.TensorShape(
+                [None, None])
+            state_shape_invariants[_StateKeys.FINISHED_COUNTS] = tf.TensorShape(
+                [None, None])
+
         return state, state_shape_invariants
 
+    def _get_lowest_finished_scores(self, state):
+        """Return the worst finished score of each batch item [batch_size].
+
+        Batch items without finished sequences get a score of -INF.
+        """
+        finished_scores = state[_StateKeys.FINISHED_SCORES]
+        finished_flags = state[_StateKeys.FINISHED_FLAGS]
+
+        # Compute worst score in finished sequences for each batch element
+        finished_scores *= tf.to_float(finished_flags)  # set filler scores to zero
+        lowest_finished_scores = tf.reduce_min(finished_scores, axis=1)
+
+        # If there are no finished sequences in a batch element, then set the lowest
+        # finished score to -INF for that element.
+        finished_batches = tf.reduce_any(finished_flags, 1)
+        lowest_finished_scores += (1. - tf.to_float(finished_batches)) * -INF
+        return lowest_finished_scores
+
     def _continue_search(self, state):
         """Return whether to continue the search loop.
 
@@ -179,8 +260,6 @@ class SequenceBeamSearch(object):
         """
         i = state[_StateKeys.CUR_INDEX]
         alive_log_probs = state[_StateKeys.ALIVE_LOG_PROBS]
-        finished_scores = state[_StateKeys.FINISHED_SCORES]
-        finished_flags = state[_StateKeys.FINISHED_FLAGS]
 
         not_at_max_decode_length = tf.less(i, self.max_decode_length)
 
@@ -189,14 +268,7 @@ class SequenceBeamSearch(object):
         # Get the best possible scores from alive sequences.
         best_alive_scores = alive_log_probs[:, 0] / max_length_norm
 
-        # Compute worst score in finished sequences for each batch element
-        finished_scores *= tf.to_float(finished_flags)  # set filler scores to zero
-        lowest_finished_scores = tf.reduce_min(finished_scores, axis=1)
-
-        # If there are no finished sequences in a batch element, then set the lowest
-        # finished score to -INF for that element.
-        finished_batches = tf.reduce_any(finished_flags, 1)
-        lowest_finished_scores += (1. - tf.to_float(finished_batches)) * -INF
+        lowest_finished_scores = self._get_lowest_finished_scores(state)
 
         worst_finished_score_better_than_best_alive_score = tf.reduce_all(
             tf.greater(lowest_finished_scores, best_alive_scores)
@@ -237,8 +309,29 @@ class SequenceBeamSearch(object):
         new_state = {_StateKeys.CUR_INDEX: state[_StateKeys.CUR_INDEX] + 1}
         new_state.update(alive_state)
         new_state.update(finished_state)
+        if self.instrument:
+            new_state.update(self._count_beams(state, new_state))
         return [new_state]
 
+    def _count_beams(self, state, new_state):
+        """Append the alive and finished beam counts of new_state to the stats."""
+        max_length_norm = _length_normalization(self.alpha, self.max_decode_length)
+        best_alive_scores = new_state[_StateKeys.ALIVE_LOG_PROBS] / max_length_norm
+        lowest_finished_scores = self._get_lowest_finished_scores(new_state)
+
+        alive_counts = tf.reduce_sum(tf.to_int32(tf.greater_equal(
+            best_alive_scores, tf.expand_dims(lowest_finished_scores, 1))), 1)
+        finished_counts = tf.reduce_sum(
+            tf.to_int32(new_state[_StateKeys.FINISHED_FLAGS]), 1)
+        return {
+            _StateKeys.ALIVE_COUNTS: tf.concat(
+                [state[_StateKeys.ALIVE_COUNTS],
+                 tf.expand_dims(alive_counts, 1)], axis=1),
+            _StateKeys.FINISHED_COUNTS: tf.concat(
+                [state[_StateKeys.FINISHED_COUNTS],
+                 tf.expand_dims(finished_counts, 1)], axis=1)
+        }
+
     def _grow_alive_seq(self, state):
         """Grow alive sequences by one token, and collect top 2*beam_size sequences.
 
@@ -385,7 +478,7 @@ class SequenceBeamSearch(object):
 
 def sequence_beam_search(
     symbols_to_logits_fn, initial_ids, initial_cache, vocab_size, beam_size,
-    alpha, max_decode_length, eos_id):
+    alpha, max_decode_length, eos_id, instrument=False):
     """Search for sequence of subtoken ids with the largest probability.
 
     Args:
@@ -405,14 +498,17 @@ def sequence_beam_search(
       alpha: float defining the strength of length normalization
       max_decode_length: maximum length to decoded sequence
       eos_id: int id of eos token, used to determine when a sequence has finished
+      instrument: bool, whether to also return the decoding stats.
 
     Returns:
       Top decoded sequences [batch_size, beam_size, max_decode_length]
       sequence scores [batch_size, beam_size]
+      if instrument, dictionary of decoding stats (see SequenceBeamSearch)
     """
     batch_size = tf.shape(initial_ids)[0]
     sbs = SequenceBeamSearch(symbols_to_logits_fn, vocab_size, batch_size,
-                             beam_size, alpha, max_decode_length, eos_id)
+                             beam_size, alpha, max_decode_length, eos_id,
+                             instrument=instrument)
     return sbs.search(initial_ids, initial_cache)
 
 
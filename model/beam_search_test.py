@@ -96,6 +96,38 @@ class BeamSearchHelperTests(tf.test.TestCase):
                               [20, 21, 22, 23]]],
                             y)
 
+    def _search_with_stats(self, logits, max_decode_length):
+        logits = tf.constant([logits])
+
+        def symbols_to_logits_fn(ids, unused_i, cache):
+            return tf.tile(logits, [tf.shape(ids)[0], 1]), cache
+
+        _, _, stats = beam_search.sequence_beam_search(
+            symbols_to_logits_fn, initial_ids=tf.zeros([2], tf.int32),
+            initial_cache={"x": tf.zeros([2, 1])}, vocab_size=3, beam_size=1,
+            alpha=0.6, max_decode_length=max_decode_length, eos_id=1,
+            instrument=True)
+        with self.test_session() as sess:
+            return sess.run(stats)
+
+    def test_stats_when_all_beams_finish(self):
+        stats = self._search_with_stats([0., 5., 0.], max_decode_length=10)
+
+        self.assertEqual(1, stats["loop_steps"])
+        self.assertAllEqual([1, 1], stats["decode_steps"])
+        self.assertAllEqual([[0], [0]], stats["alive_beams"])
+        self.assertAllEqual([[1], [1]], stats["finished_beams"])
+        self.assertEqual(beam_search.STOP_FINISHED_BEAMS, stats["stop_reason"])
+
+    def test_stats_at_max_decode_length(self):
+        stats = self._search_with_stats([5., 0., -5.], max_decode_length=3)
+
+        self.assertEqual(3, stats["loop_steps"])
+        self.assertAllEqual([3, 3], stats["decode_steps"])
+        self.assertAllEqual([[1, 1, 1], [1, 1, 1]], stats["alive_beams"])
+        self.assertAllEqual([[1, 1, 1], [1, 1, 1]], stats["finished_beams"])
+        self.assertEqual(beam_search.STOP_MAX_DECODE_LENGTH, stats["stop_reason"])
+
 
 if __name__ == "__main__":
     tf.test.main()
@@ -21,12 +21,38 @@ from __future__ import print_function
 import tensorflow as tf  # pylint: disable=g-bad-import-order
 
 from comm_utils.accelerator import tpu as tpu_utils
+from comm_utils.export import quantize
+from model import quantized_layers
+
+EMBEDDING_METHODS = ("gather", "matmul", "unique_gather")
+
+
+def choose_method(vocab_size, batch_size, use_tpu):
+    """Return the embedding lookup method suited to the device and batch shape.
+
+    The matmul formulation is only used on TPUs, where gathers are slow; on CPUs
+    and GPUs its [batch_size, length, vocab_size] one-hot tensors are far more
+    expensive than a gather. The unique gather is picked when a batch holds more
+    tokens than the vocabulary, so that many ids are repeated and aggregating
+    the gradient rows of the repeated ids pays off.
+
+    Args:
+      vocab_size: Number of tokens in the embedding.
+      batch_size: Maximum number of tokens per batch.
+      use_tpu: Whether the model runs on TPUs.
+    """
+    if use_tpu:
+        return "matmul"
+    if batch_size and batch_size > vocab_size:
+        return "unique_gather"
+    return "gather"
 
 
 class EmbeddingSharedWeights(tf.layers.Layer):
     """Calculates input embeddings and pre-softmax linear with shared weights."""
 
-    def __init__(self, vocab_size, hidden_size, method="gather"):
+    def __init__(self, vocab_size, hidden_size, method="gather",
+                 share_softmax_weights=True, quantize_mode=None):
         """Specify characteristic parameters of embedding layer.
 
         Args:
@@ -38,25 +64,71 @@ class EmbeddingSharedWeights(tf.layers.Layer):
             matrix multiplication. The matmul formulation is wasteful as it does
             extra work, however matrix multiplication is very fast on TPUs which
             makes "matmul" considerably faster than "gather" on TPUs.
+            "unique_gather" gathers the rows of the unique ids of the batch once,
+            and expands them to the positions of the ids, so that the gradient of
+            the weights has a single, aggregated row per unique id (see
+            choose_method).
+          share_softmax_weights: If False, the pre-softmax linear uses its own
+            weights instead of the embedding weights. The embedding weights then
+            only receive the sparse gradient of the lookup, so that sparse
+            optimizer updates (e.g. LazyAdamOptimizer) only touch the rows of the
+            ids of the batch, instead of every row.
+          quantize_mode: Post-training quantization mode (see
+            quantized_layers.Dense). With "int8", the weights are uint8 with a
+            scale per token: the embedding gathers and dequantizes the rows of
+            the ids, whatever the method, and the pre-softmax linear is a
+            quantized matmul.
         """
         super(EmbeddingSharedWeights, self).__init__()
         self.vocab_size = vocab_size
         self.hidden_size = hidden_size
-        if method not in ("gather", "matmul"):
-            raise ValueError("method {} must be 'gather' or 'matmul'".format(method))
+        if method not in EMBEDDING_METHODS:
+            raise ValueError("method {} must be one of {}".format(
+                method, EMBEDDING_METHODS))
         self.method = method
+        self.share_softmax_weights = share_softmax_weights
+        quantized_layers.check_quantize_mode(quantize_mode)
+        self.quantize_mode = quantize_mode
 
     def build(self, _):
         with tf.variable_scope("embedding_and_softmax", reuse=tf.AUTO_REUSE):
             # Create and initialize weights. The random normal initializer was chosen
             # randomly, and works well.
-            self.shared_weights = tf.get_variable(
-                "weights", [self.vocab_size, self.hidden_size],
-                initializer=tf.random_normal_initializer(
-                    0., self.hidden_size ** -0.5))
+            self.shared_weights, self.shared_weights_scale = self._get_weights(
+                "weights")
+            if self.share_softmax_weights:
+                self.softmax_weights = self.shared_weights
+                self.softmax_weights_scale = self.shared_weights_scale
+            else:
+                self.softmax_weights, self.softmax_weights_scale = (
+                    self._get_weights("softmax_weights"))
+            if self.quantize_mode:
+                self.softmax_input_range = tf.get_variable(
+                    "softmax_" + quantize.INPUT_RANGE_SUFFIX, [2],
+                    initializer=quantize.input_range_initializer(),
+                    trainable=False)
 
         self.built = True
 
+    def _get_weights(self, name):
+        """Return the [vocab_size, hidden_size] weights and their scales.
+
+        The scales are None, unless the weights are quantized.
+        """
+        if self.quantize_mode != "int8":
+            weights = tf.get_variable(
+                name, [self.vocab_size, self.hidden_size],
+                initializer=tf.random_normal_initializer(
+                    0., self.hidden_size ** -0.5))
+            return weights, None
+        weights = tf.get_variable(
+            name, [self.vocab_size, self.hidden_size], dtype=tf.uint8,
+            initializer=tf.zeros_initializer(), trainable=False)
+        scales = tf.get_variable(
+            name + quantize.SCALE_SUFFIX, [self.vocab_size],
+            initializer=tf.ones_initializer(), trainable=False)
+        return weights, scales
+
     def call(self, x):
         """Get token embeddings of x.
 
@@ -71,9 +143,16 @@ class EmbeddingSharedWeights(tf.layers.Layer):
             # Create binary mask of size [batch_size, length]
             mask = tf.to_float(tf.not_equal(x, 0))
 
-            if self.method == "gather":
+            if self.quantize_mode == "int8":
+                embeddings = quantize.gather_dequantized(
+                    self.shared_weights, self.shared_weights_scale, x)
+                embeddings *= tf.expand_dims(mask, -1)
+            elif self.method == "gather":
                 embeddings = tf.gather(self.shared_weights, x)
                 embeddings *= tf.expand_dims(mask, -1)
+            elif self.method == "unique_gather":
+                embeddings = self._unique_gather(x)
+                embeddings *= tf.expand_dims(mask, -1)
             else:  # matmul
                 embeddings = tpu_utils.embedding_matmul(
                     embedding_table=self.shared_weights,
@@ -88,6 +167,20 @@ class EmbeddingSharedWeights(tf.layers.Layer):
 
             return embeddings
 
+    def _unique_gather(self, x):
+        """Gather the embeddings of x through the unique ids of x.
+
+        The gradient of the expanding gather is summed per unique id (a segment
+        sum over the positions), so the gradient of the weights is an
+        IndexedSlices with one row per unique id instead of one per position.
+        """
+        with tf.name_scope("unique_gather"):
+            unique_ids, positions = tf.unique(tf.reshape(x, [-1]))
+            unique_embeddings = tf.gather(self.shared_weights, unique_ids)
+            embeddings = tf.gather(unique_embeddings, positions)
+            return tf.reshape(
+                embeddings, tf.concat([tf.shape(x), [self.hidden_size]], axis=0))
+
     def linear(self, x):
         """Computes logits by running x through a linear layer.
 
@@ -101,6 +194,15 @@ class EmbeddingSharedWeights(tf.layers.Layer):
             length = tf.shape(x)[1]
 
             x = tf.reshape(x, [-1, self.hidden_size])
-            logits = tf.matmul(x, self.shared_weights, transpose_b=True)
+            if self.quantize_mode == "int8":
+                logits = quantize.quantized_matmul(
+                    x, self.softmax_weights, self.softmax_weights_scale,
+                    self.softmax_input_range, transpose_b=True)
+            elif self.quantize_mode == "calibrate":
+                with tf.control_dependencies([quantize.update_input_range(
+                        self.softmax_input_range, x)]):
+                    logits = tf.matmul(x, self.softmax_weights, transpose_b=True)
+            else:
+                logits = tf.matmul(x, self.softmax_weights, transpose_b=True)
 
             return tf.reshape(logits, [batch_size, length, self.vocab_size])
@@ -0,0 +1,89 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the embedding lookup methods."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from model import embedding_layer
+
+_VOCAB_SIZE = 20
+_HIDDEN_SIZE = 4
+
+
+class EmbeddingSharedWeightsTest(tf.test.TestCase):
+
+    def test_methods_match(self):
+        # Repeated ids and padding.
+        x = tf.constant([[3, 5, 3, 0], [5, 5, 7, 0]], dtype=tf.int64)
+        layer = embedding_layer.EmbeddingSharedWeights(_VOCAB_SIZE, _HIDDEN_SIZE)
+        # Weight the outputs, so that every position has its own gradient.
+        position_weights = tf.reshape(
+            tf.range(2 * 4 * _HIDDEN_SIZE, dtype=tf.float32), [2, 4, _HIDDEN_SIZE])
+
+        results = []
+        for method in embedding_layer.EMBEDDING_METHODS:
+            # The same layer, so that every method looks up the same weights.
+            layer.method = method
+            embeddings = layer(x)
+            gradient = tf.gradients(
+                tf.reduce_sum(embeddings * position_weights),
+                layer.shared_weights)[0]
+            results.append((embeddings, tf.convert_to_tensor(gradient)))
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            results = sess.run(results)
+        expected_embeddings, expected_gradient = results[0]
+        for embeddings, gradient in results[1:]:
+            self.assertAllClose(expected_embeddings, embeddings)
+            self.assertAllClose(expected_gradient, gradient)
+
+    def test_untied_softmax_weights(self):
+        x = tf.constant([[3, 5, 3, 0]], dtype=tf.int64)
+        gradients = {}
+        for share in (True, False):
+            with tf.variable_scope("shared" if share else "untied"):
+                layer = embedding_layer.EmbeddingSharedWeights(
+                    _VOCAB_SIZE, _HIDDEN_SIZE, share_softmax_weights=share)
+                loss = tf.reduce_sum(layer.linear(layer(x)))
+            gradients[share] = tf.gradients(
+                loss, [layer.shared_weights, layer.softmax_weights])
+
+        # The shared weights get the dense gradient of the softmax.
+        self.assertIsInstance(gradients[True][0], tf.Tensor)
+        # The untied embedding weights only get the sparse gradient of the lookup.
+        self.assertIsInstance(gradients[False][0], tf.IndexedSlices)
+        self.assertIsInstance(gradients[False][1], tf.Tensor)
+
+    def test_choose_method(self):
+        self.assertEqual(
+            "matmul", embedding_layer.choose_method(33708, 2048, True))
+        self.assertEqual(
+            "gather", embedding_layer.choose_method(33708, 2048, False))
+        self.assertEqual(
+            "unique_gather", embedding_layer.choose_method(8000, 25000, False))
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            embedding_layer.EmbeddingSharedWeights(
+                _VOCAB_SIZE, _HIDDEN_SIZE, method="segment")
+
+
+if __name__ == "__main__":
+    tf.test.main()
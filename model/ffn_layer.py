@@ -20,24 +20,51 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from model import model_utils
+from model import quantized_layers
+
+# Ways of skipping the padding positions, see FeedFowardNetwork.
+PAD_STRATEGIES = ("remove", "shared", "dense")
 
-class FeedFowardNetwork(tf.layers.Layer):
-    """Fully connected feedforward network."""
 
-    def __init__(self, hidden_size, filter_size, relu_dropout, train, allow_pad):
+class FeedFowardNetwork(tf.layers.Layer):
+    """Fully connected feedforward network.
+
+    When allow_pad is set, the padding positions are handled according to
+    pad_strategy:
+      "remove": the padding positions are removed from x before the dense layers
+        and put back after them, with a model_utils.PadRemover built at every
+        call.
+      "shared": same as "remove", using the PadRemover passed by the stack, which
+        computes the nonpadding indices once for all of its layers.
+      "dense": the dense layers run on every position, and the outputs at the
+        padding positions are zeroed. This avoids the gather and scatter copies
+        and the dynamic shapes, at the cost of the padding positions' compute.
+
+    quantize_mode is the post-training quantization mode of the dense layers
+    (see quantized_layers.Dense).
+    """
+
+    def __init__(self, hidden_size, filter_size, relu_dropout, train, allow_pad,
+                 pad_strategy="remove", quantize_mode=None):
         super(FeedFowardNetwork, self).__init__()
         self.hidden_size = hidden_size
         self.filter_size = filter_size
         self.relu_dropout = relu_dropout
         self.train = train
         self.allow_pad = allow_pad
-
-        self.filter_dense_layer = tf.layers.Dense(
-            filter_size, use_bias=True, activation=tf.nn.relu, name="filter_layer")
-        self.output_dense_layer = tf.layers.Dense(
-            hidden_size, use_bias=True, name="output_layer")
-
-    def call(self, x, padding=None):
+        if pad_strategy not in PAD_STRATEGIES:
+            raise ValueError("pad_strategy {} must be one of {}".format(
+                pad_strategy, PAD_STRATEGIES))
+        self.pad_strategy = pad_strategy
+
+        self.filter_dense_layer = quantized_layers.Dense(
+            filter_size, quantize_mode, use_bias=True, activation=tf.nn.relu,
+            name="filter_layer")
+        self.output_dense_layer = quantized_layers.Dense(
+            hidden_size, quantize_mode, use_bias=True, name="output_layer")
+
+    def call(self, x, padding=None, dropout_seed=None, pad_remover=None):
         """Return outputs of the feedforward network.
 
         Args:
@@ -46,44 +73,37 @@ class FeedFowardNetwork(tf.layers.Layer):
             from x (provided self.allow_pad is set). The padding values are placed
             back in the output tensor in the same locations.
             shape [batch_size, length]
+          dropout_seed: (optional) op seed of the relu dropout.
+          pad_remover: (optional) model_utils.PadRemover of padding, used with the
+            "shared" strategy.
 
         Returns:
           Output of the feedforward network.
           tensor with shape [batch_size, length, hidden_size]
         """
-        padding = None if not self.allow_pad else padding
+        if not self.allow_pad or padding is None:
+            return self._dense(x, dropout_seed)
+
+        if self.pad_strategy == "dense":
+            output = self._dense(x, dropout_seed)
+            return output * tf.expand_dims(1.0 - padding, -1)
+
+        if self.pad_strategy == "remove" or pad_remover is None:
+            pad_remover = model_utils.PadRemover(padding)
 
         # Retrieve dynamically known shapes
         batch_size = tf.shape(x)[0]
         length = tf.shape(x)[1]
 
-        if padding is not None:
-            with tf.name_scope("remove_padding"):
-                # Flatten padding to [batch_size*length]
-                pad_mask = tf.reshape(padding, [-1])
-
-                nonpad_ids = tf.to_int32(tf.where(pad_mask < 1e-9))
-
-                # Reshape x to [batch_size*length, hidden_size] to remove padding
-                x = tf.reshape(x, [-1, self.hidden_size])
-                x = tf.gather_nd(x, indices=nonpad_ids)
-
-                # Reshape x from 2 dimensions to 3 dimensions.
-                x.set_shape([None, self.hidden_size])
-                x = tf.expand_dims(x, axis=0)
+        # Run the nonpadding positions, flattened to [num_nonpadding, hidden_size]
+        x = pad_remover.remove(tf.reshape(x, [-1, self.hidden_size]))
+        output = pad_remover.restore(self._dense(x, dropout_seed))
+        return tf.reshape(output, [batch_size, length, self.hidden_size])
 
+    def _dense(self, x, dropout_seed):
+        """Run x through the filter and output dense layers."""
         output = self.filter_dense_layer(x)
         if self.train:
-            output = tf.nn.dropout(output, 1.0 - self.relu_dropout)
-        output = self.output_dense_layer(output)
-
-        if padding is not None:
-            with tf.name_scope("re_add_padding"):
-                output = tf.squeeze(output, axis=0)
-                output = tf.scatter_nd(
-                    indices=nonpad_ids,
-                    updates=output,
-                    shape=[batch_size * length, self.hidden_size]
-                )
-                output = tf.reshape(output, [batch_size, length, self.hidden_size])
-        return output
+            output = tf.nn.dropout(output, 1.0 - self.relu_dropout,
+                                   seed=dropout_seed)
+        return self.output_dense_layer(output)
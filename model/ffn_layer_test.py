@@ -0,0 +1,63 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the padding strategies of the feedforward network."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from model import ffn_layer
+from model import model_utils
+
+_HIDDEN_SIZE = 8
+
+
+class FeedFowardNetworkTest(tf.test.TestCase):
+
+    def _run_ffn(self, pad_strategy):
+        rng = np.random.RandomState(0)
+        x = tf.constant(rng.normal(size=[3, 5, _HIDDEN_SIZE]), dtype=tf.float32)
+        padding = model_utils.get_padding(
+            tf.constant([[1, 2, 3, 0, 0], [1, 2, 3, 4, 5], [1, 0, 0, 0, 0]]))
+        pad_remover = model_utils.PadRemover(padding)
+        # The seeded initializer gives the same weights to every strategy.
+        with tf.variable_scope(pad_strategy,
+                               initializer=tf.glorot_uniform_initializer(seed=0)):
+            ffn = ffn_layer.FeedFowardNetwork(
+                _HIDDEN_SIZE, 16, 0., False, True, pad_strategy)
+            output = ffn(x, padding, pad_remover=pad_remover)
+        gradient = tf.gradients(tf.reduce_sum(output), x)[0]
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            return sess.run([output, gradient])
+
+    def test_pad_strategies_match(self):
+        expected_output, expected_gradient = self._run_ffn("remove")
+        self.assertAllEqual(np.zeros([2, _HIDDEN_SIZE]), expected_output[0, 3:])
+        for pad_strategy in ("shared", "dense"):
+            output, gradient = self._run_ffn(pad_strategy)
+            self.assertAllClose(expected_output, output, rtol=1e-5, atol=1e-5)
+            self.assertAllClose(expected_gradient, gradient, rtol=1e-5, atol=1e-5)
+
+    def test_unknown_pad_strategy(self):
+        with self.assertRaises(ValueError):
+            ffn_layer.FeedFowardNetwork(_HIDDEN_SIZE, 16, 0., False, True, "skip")
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -56,7 +56,36 @@ BASE_PARAMS = defaultdict(
     # TPU specific parameters
     use_tpu=False,
     static_batch=False,
+    # If set, inputs are truncated to this number of tokens when predicting, and
+    # the position tables are built with a static shape, so that they are folded
+    # into constants when the graph is frozen.
+    static_max_length=None,
+    # Post-training quantization mode of the matmuls (see
+    # quantized_layers.QUANTIZE_MODES), set when exporting with --export_int8.
+    quantize_mode=None,
     allow_ffn_pad=True,
+    # How the feedforward networks skip the padding positions when
+    # allow_ffn_pad is set (see ffn_layer.PAD_STRATEGIES). If None, the encoder
+    # removes the padding in every layer and the decoder does not skip it.
+    ffn_pad_strategy=None,
+    # Embedding lookup method (see embedding_layer.EMBEDDING_METHODS), or "auto"
+    # to choose it from the device and the batch size.
+    embedding_method="auto",
+    # Whether the embedding and the pre-softmax linear share their weights. If
+    # False, the embedding weights only get sparse gradients, which
+    # LazyAdamOptimizer applies to the rows of the batch's ids only.
+    share_embedding_softmax=True,
+
+    # Memory params. Recomputing the activations of every sublayer of a stack in
+    # the backward pass, instead of storing them, trades compute for memory.
+    encoder_recompute=False,
+    decoder_recompute=False,
+
+    # Layer normalization params. fused_layer_norm computes the normalization
+    # with fewer elementwise passes, and jit_pre_post_processing clusters the
+    # normalization, dropout and residual connection of every sublayer for XLA.
+    fused_layer_norm=False,
+    jit_pre_post_processing=False,
 )
 
 BIG_PARAMS = BASE_PARAMS.copy()
@@ -108,3 +108,52 @@ def get_padding_bias(x):
         attention_bias = tf.expand_dims(
             tf.expand_dims(attention_bias, axis=1), axis=1)
     return attention_bias
+
+
+class PadRemover(object):
+    """Remove the padding positions of a batch, and put them back.
+
+    The indices of the nonpadding positions are computed once, so that every
+    layer of a stack can reuse them.
+    """
+
+    def __init__(self, padding):
+        """Compute the nonpadding indices.
+
+        Args:
+          padding: float tensor with shape [batch_size, length], 1 at the padding
+            positions (see get_padding).
+        """
+        with tf.name_scope("pad_remover"):
+            pad_mask = tf.reshape(padding, [-1])
+            self.nonpad_ids = tf.to_int32(tf.where(pad_mask < 1e-9))
+            self.num_positions = tf.shape(pad_mask)[0]
+
+    def remove(self, x):
+        """Remove the padding positions of x.
+
+        Args:
+          x: tensor with shape [batch_size * length, depth]
+
+        Returns:
+          tensor with shape [num_nonpadding, depth]
+        """
+        with tf.name_scope("remove_padding"):
+            x_shape = x.get_shape().as_list()
+            x = tf.gather_nd(x, indices=self.nonpad_ids)
+            x.set_shape([None] + x_shape[1:])
+            return x
+
+    def restore(self, x):
+        """Put zeros back at the padding positions of x.
+
+        Args:
+          x: tensor with shape [num_nonpadding, depth]
+
+        Returns:
+          tensor with shape [batch_size * length, depth]
+        """
+        with tf.name_scope("re_add_padding"):
+            return tf.scatter_nd(
+                indices=self.nonpad_ids, updates=x,
+                shape=tf.stack([self.num_positions, tf.shape(x)[1]]))
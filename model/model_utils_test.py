@@ -63,6 +63,20 @@ class ModelUtilsTest(tf.test.TestCase):
                                [0, 0, 0, 0, 0]]]],
                             bias)
 
+    def test_pad_remover(self):
+        x = tf.constant([[1, 0, 0, 0, 2], [3, 4, 0, 0, 0], [0, 5, 6, 0, 7]])
+        pad_remover = model_utils.PadRemover(model_utils.get_padding(x))
+        values = tf.expand_dims(tf.to_float(tf.reshape(x, [-1])), -1)
+        removed = pad_remover.remove(values)
+        restored = pad_remover.restore(removed * 10.)
+        with self.test_session() as sess:
+            removed, restored = sess.run((removed, restored))
+
+        self.assertAllEqual([[1], [2], [3], [4], [5], [6], [7]], removed)
+        self.assertAllEqual(
+            [[10, 0, 0, 0, 20], [30, 40, 0, 0, 0], [0, 50, 60, 0, 70]],
+            restored.reshape([3, 5]))
+
 
 if __name__ == "__main__":
     tf.test.main()
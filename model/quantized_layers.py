@@ -0,0 +1,97 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Dense layer whose matmul can be calibrated and quantized to int8."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from comm_utils.export import quantize
+
+# Modes of the post-training quantization, see Dense.
+QUANTIZE_MODES = ("calibrate", "int8")
+
+
+def check_quantize_mode(quantize_mode):
+    """Raise a ValueError if quantize_mode is neither None nor a QUANTIZE_MODES."""
+    if quantize_mode is not None and quantize_mode not in QUANTIZE_MODES:
+        raise ValueError("quantize_mode {} must be None or one of {}".format(
+            quantize_mode, QUANTIZE_MODES))
+
+
+class Dense(tf.layers.Dense):
+    """Densely-connected layer with the post-training quantization modes.
+
+    quantize_mode is one of:
+      None: the float32 tf.layers.Dense.
+      "calibrate": the float32 layer, which also widens its "input_range"
+        variable to cover its inputs (see quantize.calibrate_input_ranges).
+      "int8": the kernel is a uint8 variable with a "kernel_scale" variable, as
+        written by quantize.quantize_checkpoint, and the inputs are multiplied by
+        quantize.quantized_matmul using the calibrated "input_range".
+    The variables keep the names of the float32 layer in every mode, so that the
+    checkpoints of the float32 model can be calibrated and quantized.
+    """
+
+    def __init__(self, units, quantize_mode=None, **kwargs):
+        super(Dense, self).__init__(units, **kwargs)
+        check_quantize_mode(quantize_mode)
+        self.quantize_mode = quantize_mode
+
+    def build(self, input_shape):
+        if self.quantize_mode == "int8":
+            input_depth = tf.TensorShape(input_shape)[-1].value
+            self.kernel = self.add_weight(
+                "kernel", shape=[input_depth, self.units], dtype=tf.uint8,
+                initializer=tf.zeros_initializer(), trainable=False)
+            self.kernel_scale = self.add_weight(
+                "kernel" + quantize.SCALE_SUFFIX, shape=[self.units],
+                initializer=tf.ones_initializer(), trainable=False)
+            self.bias = None
+            if self.use_bias:
+                self.bias = self.add_weight(
+                    "bias", shape=[self.units], initializer=self.bias_initializer,
+                    trainable=False)
+        else:
+            super(Dense, self).build(input_shape)
+
+        if self.quantize_mode:
+            self.input_range = self.add_weight(
+                quantize.INPUT_RANGE_SUFFIX, shape=[2],
+                initializer=quantize.input_range_initializer(), trainable=False)
+        self.built = True
+
+    def call(self, inputs):
+        if self.quantize_mode is None:
+            return super(Dense, self).call(inputs)
+        if self.quantize_mode == "calibrate":
+            with tf.control_dependencies(
+                    [quantize.update_input_range(self.input_range, inputs)]):
+                return super(Dense, self).call(inputs)
+
+        input_depth = self.kernel.shape[0].value
+        outputs = quantize.quantized_matmul(
+            tf.reshape(inputs, [-1, input_depth]), self.kernel, self.kernel_scale,
+            self.input_range)
+        outputs = tf.reshape(
+            outputs, tf.concat([tf.shape(inputs)[:-1], [self.units]], axis=0))
+        outputs.set_shape(inputs.shape[:-1].concatenate([self.units]))
+        if self.bias is not None:
+            outputs = tf.nn.bias_add(outputs, self.bias)
+        if self.activation is not None:
+            outputs = self.activation(outputs)
+        return outputs
@@ -0,0 +1,78 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the calibration and int8 modes of the quantized Dense layer."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from comm_utils.export import quantize
+from model import quantized_layers
+
+_VARIABLE_AXES = [(r"dense/kernel", -1)]
+
+
+def _dense(inputs, quantize_mode):
+    layer = quantized_layers.Dense(
+        16, quantize_mode, activation=tf.nn.relu, name="dense")
+    x = tf.to_float(inputs) / 10.
+    # The calibration inputs are [batch_size, length] ids, used as features.
+    return layer(tf.reshape(x, [tf.shape(x)[0], -1, 8]))
+
+
+class QuantizedDenseTest(tf.test.TestCase):
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            quantized_layers.Dense(16, "int4")
+
+    def test_int8_matches_float(self):
+        inputs = np.random.RandomState(0).randint(-10, 11, size=[2, 3, 8])
+        float_path = os.path.join(self.get_temp_dir(), "float.ckpt")
+        int8_path = os.path.join(self.get_temp_dir(), "int8.ckpt")
+
+        with tf.Graph().as_default():
+            outputs = _dense(tf.constant(inputs), None)
+            saver = tf.train.Saver()
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                expected = sess.run(outputs)
+                saver.save(sess, float_path)
+
+        input_ranges = quantize.calibrate_input_ranges(
+            lambda x: _dense(x, "calibrate"), float_path,
+            list(inputs.reshape([-1, 8])))
+        self.assertAllClose([inputs.min() / 10., inputs.max() / 10.],
+                            input_ranges["dense/input_range"])
+        quantize.quantize_checkpoint(
+            float_path, int8_path, _VARIABLE_AXES, input_ranges)
+
+        with tf.Graph().as_default():
+            outputs = _dense(tf.constant(inputs), "int8")
+            self.assertEqual(outputs.shape, tf.TensorShape([2, 3, 16]))
+            kernel = tf.global_variables("dense/kernel")[0]
+            self.assertEqual(kernel.dtype.base_dtype, tf.uint8)
+            with self.test_session() as sess:
+                tf.train.Saver().restore(sess, int8_path)
+                self.assertAllClose(expected, sess.run(outputs), atol=0.05)
+
+
+if __name__ == "__main__":
+    tf.test.main()
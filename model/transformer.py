@@ -22,6 +22,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import contextlib
+import zlib
+
 import tensorflow as tf  # pylint: disable=g-bad-import-order
 
 from model import attention_layer
@@ -55,27 +58,41 @@ class Transformer(object):
         self.train = train
         self.params = params
 
+        embedding_method = params["embedding_method"] or "auto"
+        if embedding_method == "auto":
+            embedding_method = embedding_layer.choose_method(
+                params["vocab_size"], params["batch_size"], params["use_tpu"])
         self.embedding_softmax_layer = embedding_layer.EmbeddingSharedWeights(
-            params["vocab_size"], params["hidden_size"],
-            method="matmul" if params["tpu"] else "gather")
+            params["vocab_size"], params["hidden_size"], method=embedding_method,
+            share_softmax_weights=params["share_embedding_softmax"] is not False,
+            quantize_mode=params["quantize_mode"])
         self.encoder_stack = EncoderStack(params, train)
         self.decoder_stack = DecoderStack(params, train)
 
-    def __call__(self, inputs, targets=None):
+    def __call__(self, inputs, targets=None, output_logits=True):
         """Calculate target logits or inferred target sequences.
 
         Args:
           inputs: int tensor with shape [batch_size, input_length].
           targets: None or int tensor with shape [batch_size, target_length].
+          output_logits: If False, the decoder outputs are returned instead of the
+            logits when targets is defined, so that the loss can be computed
+            without the full logits (see metrics.chunked_cross_entropy_loss).
 
         Returns:
           If targets is defined, then return logits for each word in the target
           sequence. float tensor with shape [batch_size, target_length, vocab_size]
+          (or [batch_size, target_length, hidden_size] if output_logits is False)
           If target is none, then generate output sequence one token at a time.
             returns a dictionary {
               output: [batch_size, decoded length]
               score: [batch_size, float]}
         """
+        # The position tables of a static maximum length only cover the first
+        # params["static_max_length"] input positions.
+        if targets is None and self.params["static_max_length"]:
+            inputs = inputs[:, :self.params["static_max_length"]]
+
         # Variance scaling is used here because it seems to work in many problems.
         # Other reasonable initializers may also work just as well.
         initializer = tf.variance_scaling_initializer(
@@ -94,7 +111,8 @@ class Transformer(object):
             if targets is None:
                 return self.predict(encoder_outputs, attention_bias)
             else:
-                logits = self.decode(targets, encoder_outputs, attention_bias)
+                logits = self.decode(targets, encoder_outputs, attention_bias,
+                                     output_logits)
                 return logits
 
     def encode(self, inputs, attention_bias):
@@ -115,8 +133,7 @@ class Transformer(object):
 
             with tf.name_scope("add_pos_encoding"):
                 length = tf.shape(embedded_inputs)[1]
-                pos_encoding = model_utils.get_position_encoding(
-                    length, self.params["hidden_size"])
+                pos_encoding = self._get_position_encoding(length)
                 encoder_inputs = embedded_inputs + pos_encoding
 
             if self.train:
@@ -125,7 +142,8 @@ class Transformer(object):
 
             return self.encoder_stack(encoder_inputs, attention_bias, inputs_padding)
 
-    def decode(self, targets, encoder_outputs, attention_bias):
+    def decode(self, targets, encoder_outputs, attention_bias,
+               output_logits=True):
         """Generate logits for each value in the target sequence.
 
         Args:
@@ -134,9 +152,12 @@ class Transformer(object):
           encoder_outputs: continuous representation of input sequence.
             float tensor with shape [batch_size, input_length, hidden_size]
           attention_bias: float tensor with shape [batch_size, 1, 1, input_length]
+          output_logits: If False, return the decoder outputs before the
+            pre-softmax linear transformation.
 
         Returns:
-          float32 tensor with shape [batch_size, target_length, vocab_size]
+          float32 tensor with shape [batch_size, target_length, vocab_size], or
+          [batch_size, target_length, hidden_size] if output_logits is False.
         """
         with tf.name_scope("decode"):
             # Prepare inputs to decoder layers by shifting targets, adding positional
@@ -148,8 +169,7 @@ class Transformer(object):
                     decoder_inputs, [[0, 0], [1, 0], [0, 0]])[:, :-1, :]
             with tf.name_scope("add_pos_encoding"):
                 length = tf.shape(decoder_inputs)[1]
-                decoder_inputs += model_utils.get_position_encoding(
-                    length, self.params["hidden_size"])
+                decoder_inputs += self._get_position_encoding(length)
             if self.train:
                 decoder_inputs = tf.nn.dropout(
                     decoder_inputs, 1 - self.params["layer_postprocess_dropout"])
@@ -157,19 +177,57 @@ class Transformer(object):
             # Run values
             decoder_self_attention_bias = model_utils.get_decoder_self_attention_bias(
                 length)
+            # The outputs at the positions whose target is padding do not affect
+            # the loss, so the feedforward networks may skip them. The original
+            # decoder ignored the padding, which is kept as the default.
+            targets_padding = None
+            if self.params["ffn_pad_strategy"]:
+                targets_padding = model_utils.get_padding(targets)
             outputs = self.decoder_stack(
                 decoder_inputs, encoder_outputs, decoder_self_attention_bias,
-                attention_bias)
+                attention_bias, targets_padding=targets_padding)
+            if not output_logits:
+                return outputs
             logits = self.embedding_softmax_layer.linear(outputs)
             return logits
 
+    def _get_static_table_length(self):
+        """Return the static length of the position tables, or None.
+
+        With params["static_max_length"], the tables cover the longest decoded
+        sequence of the longest input, plus the initial decoder input.
+        """
+        if not self.params["static_max_length"]:
+            return None
+        return (self.params["static_max_length"] +
+                self.params["extra_decode_length"] + 1)
+
+    def _get_position_encoding(self, length):
+        """Return the position encoding of the first length positions.
+
+        With params["static_max_length"], the encoding is sliced from a table of
+        static shape, which constant folding turns into a constant of the graph
+        (see export.freeze_saved_model).
+        """
+        table_length = self._get_static_table_length()
+        if table_length is None:
+            return model_utils.get_position_encoding(
+                length, self.params["hidden_size"])
+        return model_utils.get_position_encoding(
+            table_length, self.params["hidden_size"])[:length]
+
     def _get_symbols_to_logits_fn(self, max_decode_length):
         """Returns a decoding function that calculates logits of the next tokens."""
 
-        timing_signal = model_utils.get_position_encoding(
-            max_decode_length + 1, self.params["hidden_size"])
-        decoder_self_attention_bias = model_utils.get_decoder_self_attention_bias(
-            max_decode_length)
+        timing_signal = self._get_position_encoding(max_decode_length + 1)
+        table_length = self._get_static_table_length()
+        if table_length is None:
+            decoder_self_attention_bias = (
+                model_utils.get_decoder_self_attention_bias(max_decode_length))
+        else:
+            decoder_self_attention_bias = (
+                model_utils.get_decoder_self_attention_bias(table_length)
+                [:, :, :max_decode_length, :max_decode_length])
 
         def symbols_to_logits_fn(ids, i, cache):
             """Generate logits for next potential IDs.
@@ -226,7 +284,8 @@ class Transformer(object):
         cache["encoder_decoder_attention_bias"] = encoder_decoder_attention_bias
 
         # Use beam search to find the top beam_size sequences and scores.
-        decoded_ids, scores = beam_search.sequence_beam_search(
+        instrument = bool(self.params["instrument_decode"])
+        results = beam_search.sequence_beam_search(
             symbols_to_logits_fn=symbols_to_logits_fn,
             initial_ids=initial_ids,
             initial_cache=cache,
@@ -234,21 +293,54 @@ class Transformer(object):
             beam_size=self.params["beam_size"],
             alpha=self.params["alpha"],
             max_decode_length=max_decode_length,
-            eos_id=EOS_ID)
+            eos_id=EOS_ID,
+            instrument=instrument)
+        decoded_ids, scores = results[:2]
 
         # Get the top sequence for each batch element
         top_decoded_ids = decoded_ids[:, 0, 1:]
         top_scores = scores[:, 0]
 
-        return {"outputs": top_decoded_ids, "scores": top_scores}
+        predictions = {"outputs": top_decoded_ids, "scores": top_scores}
+        if instrument:
+            predictions.update(
+                self._get_decode_stats(results[2], top_decoded_ids, batch_size))
+        return predictions
+
+    def _get_decode_stats(self, stats, top_decoded_ids, batch_size):
+        """Return the beam search stats as predictions of shape [batch_size, ...].
+
+        The scalar stats are repeated for every batch element, so that they can
+        be returned one example at a time by the Estimator. "output_lengths" is
+        the number of decoded ids of the top sequence, including EOS.
+        """
+        is_eos = tf.equal(top_decoded_ids, EOS_ID)
+        output_lengths = tf.where(
+            tf.reduce_any(is_eos, 1),
+            tf.to_int32(tf.argmax(tf.to_int32(is_eos), axis=1)) + 1,
+            tf.fill([batch_size], tf.shape(top_decoded_ids)[1]))
+        return {
+            "loop_steps": tf.fill([batch_size], stats["loop_steps"]),
+            "decode_steps": stats["decode_steps"],
+            "output_lengths": output_lengths,
+            "alive_beams": stats["alive_beams"],
+            "finished_beams": stats["finished_beams"],
+            "stop_reason": tf.fill([batch_size], stats["stop_reason"])
+        }
 
 
 class LayerNormalization(tf.layers.Layer):
-    """Applies layer normalization."""
+    """Applies layer normalization.
 
-    def __init__(self, hidden_size):
+    If fused is set, the mean and variance are computed together by
+    tf.nn.moments, and the normalization, scale and bias are folded into a
+    single multiply and add of x.
+    """
+
+    def __init__(self, hidden_size, fused=False):
         super(LayerNormalization, self).__init__()
         self.hidden_size = hidden_size
+        self.fused = fused
 
     def build(self, _):
         self.scale = tf.get_variable("layer_norm_scale", [self.hidden_size],
@@ -258,6 +350,11 @@ class LayerNormalization(tf.layers.Layer):
         self.built = True
 
     def call(self, x, epsilon=1e-6):
+        if self.fused:
+            mean, variance = tf.nn.moments(x, [-1], keep_dims=True)
+            multiplier = tf.rsqrt(variance + epsilon) * self.scale
+            return x * multiplier + (self.bias - mean * multiplier)
+
         mean = tf.reduce_mean(x, axis=[-1], keepdims=True)
         variance = tf.reduce_mean(tf.square(x - mean), axis=[-1], keepdims=True)
         norm_x = (x - mean) * tf.rsqrt(variance + epsilon)
@@ -265,27 +362,74 @@ class LayerNormalization(tf.layers.Layer):
 
 
 class PrePostProcessingWrapper(object):
-    """Wrapper class that applies layer pre-processing and post-processing."""
+    """Wrapper class that applies layer pre-processing and post-processing.
 
-    def __init__(self, layer, params, train):
+    If recompute is set, the forward pass of the wrapped block is run again in
+    the backward pass (see tf.contrib.layers.recompute_grad) instead of keeping
+    its activations, when training. If params["jit_pre_post_processing"] is
+    set, the layer normalization and the dropout and residual connection are
+    compiled by XLA, which fuses their elementwise ops.
+    """
+
+    def __init__(self, layer, params, train, recompute=False):
         self.layer = layer
         self.postprocess_dropout = params["layer_postprocess_dropout"]
         self.train = train
+        self.recompute = recompute and train
+        self.jit = bool(params["jit_pre_post_processing"])
 
         # Create normalization layer
-        self.layer_norm = LayerNormalization(params["hidden_size"])
+        self.layer_norm = LayerNormalization(
+            params["hidden_size"], fused=bool(params["fused_layer_norm"]))
 
     def __call__(self, x, *args, **kwargs):
+        if not self.train:
+            return self._process(x, *args, **kwargs)
+
+        # The dropout ops of a block get fixed seeds, so that a recomputed
+        # forward pass draws the same dropout masks, and so that the masks do
+        # not depend on whether the block is recomputed. The seeds are derived
+        # from the variable scope, which is unique to each block.
+        scope_name = tf.get_variable_scope().name
+        seed = zlib.crc32(scope_name.encode("utf-8")) & 0x7fffffff
+        if not self.recompute:
+            return self._process(x, *args, dropout_seed=seed, **kwargs)
+
+        def block(*inputs):
+            return self._process(*inputs, dropout_seed=seed, **kwargs)
+
+        # recompute_grad requires resource variables. The tensor arguments are
+        # passed as inputs of the block, so that they receive gradients.
+        with tf.variable_scope(tf.get_variable_scope(), use_resource=True):
+            return tf.contrib.layers.recompute_grad(block)(x, *args)
+
+    def _process(self, x, *args, **kwargs):
+        dropout_seed = kwargs.pop("dropout_seed", None)
+
         # Preprocessing: apply layer normalization
-        y = self.layer_norm(x)
+        with _maybe_jit_scope(self.jit):
+            y = self.layer_norm(x)
 
         # Get layer output
-        y = self.layer(y, *args, **kwargs)
+        y = self.layer(y, *args, dropout_seed=dropout_seed, **kwargs)
 
         # Postprocessing: apply dropout and residual connection
-        if self.train:
-            y = tf.nn.dropout(y, 1 - self.postprocess_dropout)
-        return x + y
+        with _maybe_jit_scope(self.jit):
+            if self.train:
+                y = tf.nn.dropout(
+                    y, 1 - self.postprocess_dropout,
+                    seed=None if dropout_seed is None else dropout_seed + 1)
+            return x + y
+
+
+@contextlib.contextmanager
+def _maybe_jit_scope(enabled):
+    """Compile the ops created in the scope with XLA if enabled."""
+    if enabled:
+        with tf.contrib.compiler.jit.experimental_jit_scope():
+            yield
+    else:
+        yield
 
 
 class EncoderStack(tf.layers.Layer):
@@ -299,22 +443,29 @@ class EncoderStack(tf.layers.Layer):
 
     def __init__(self, params, train):
         super(EncoderStack, self).__init__()
+        recompute = params["encoder_recompute"]
+        self.allow_pad = params["allow_ffn_pad"]
+        self.pad_strategy = params["ffn_pad_strategy"] or "remove"
         self.layers = []
         for _ in range(params["num_hidden_layers"]):
             # Create sublayers for each layer.
             self_attention_layer = attention_layer.SelfAttention(
                 params["hidden_size"], params["num_heads"],
-                params["attention_dropout"], train)
+                params["attention_dropout"], train, params["quantize_mode"])
             feed_forward_network = ffn_layer.FeedFowardNetwork(
                 params["hidden_size"], params["filter_size"],
-                params["relu_dropout"], train, params["allow_ffn_pad"])
+                params["relu_dropout"], train, params["allow_ffn_pad"],
+                self.pad_strategy, params["quantize_mode"])
 
             self.layers.append([
-                PrePostProcessingWrapper(self_attention_layer, params, train),
-                PrePostProcessingWrapper(feed_forward_network, params, train)])
+                PrePostProcessingWrapper(
+                    self_attention_layer, params, train, recompute),
+                PrePostProcessingWrapper(
+                    feed_forward_network, params, train, recompute)])
 
         # Create final layer normalization layer.
-        self.output_normalization = LayerNormalization(params["hidden_size"])
+        self.output_normalization = LayerNormalization(
+            params["hidden_size"], fused=bool(params["fused_layer_norm"]))
 
     def call(self, encoder_inputs, attention_bias, inputs_padding):
         """Return the output of the encoder layer stacks.
@@ -323,12 +474,15 @@ class EncoderStack(tf.layers.Layer):
           encoder_inputs: tensor with shape [batch_size, input_length, hidden_size]
           attention_bias: bias for the encoder self-attention layer.
             [batch_size, 1, 1, input_length]
-          inputs_padding: P
+          inputs_padding: float tensor with shape [batch_size, input_length], 1 at
+            the padding positions.
 
         Returns:
           Output of encoder layer stack.
           float32 tensor with shape [batch_size, input_length, hidden_size]
         """
+        pad_remover = _get_shared_pad_remover(
+            inputs_padding, self.allow_pad, self.pad_strategy)
         for n, layer in enumerate(self.layers):
             # Run inputs through the sublayers.
             self_attention_layer = layer[0]
@@ -338,11 +492,23 @@ class EncoderStack(tf.layers.Layer):
                 with tf.variable_scope("self_attention"):
                     encoder_inputs = self_attention_layer(encoder_inputs, attention_bias)
                 with tf.variable_scope("ffn"):
-                    encoder_inputs = feed_forward_network(encoder_inputs, inputs_padding)
+                    encoder_inputs = feed_forward_network(
+                        encoder_inputs, inputs_padding, pad_remover=pad_remover)
 
         return self.output_normalization(encoder_inputs)
 
 
+def _get_shared_pad_remover(padding, allow_pad, pad_strategy):
+    """Return the PadRemover shared by the layers of a stack, or None.
+
+    With the "shared" strategy, the nonpadding indices are computed once for the
+    feedforward networks of every layer of the stack.
+    """
+    if padding is None or not allow_pad or pad_strategy != "shared":
+        return None
+    return model_utils.PadRemover(padding)
+
+
 class DecoderStack(tf.layers.Layer):
     """Transformer decoder stack.
 
@@ -356,27 +522,35 @@ class DecoderStack(tf.layers.Layer):
 
     def __init__(self, params, train):
         super(DecoderStack, self).__init__()
+        recompute = params["decoder_recompute"]
+        self.allow_pad = params["allow_ffn_pad"]
+        self.pad_strategy = params["ffn_pad_strategy"] or "remove"
         self.layers = []
         for _ in range(params["num_hidden_layers"]):
             self_attention_layer = attention_layer.SelfAttention(
                 params["hidden_size"], params["num_heads"],
-                params["attention_dropout"], train)
+                params["attention_dropout"], train, params["quantize_mode"])
             enc_dec_attention_layer = attention_layer.Attention(
                 params["hidden_size"], params["num_heads"],
-                params["attention_dropout"], train)
+                params["attention_dropout"], train, params["quantize_mode"])
             feed_forward_network = ffn_layer.FeedFowardNetwork(
                 params["hidden_size"], params["filter_size"],
-                params["relu_dropout"], train, params["allow_ffn_pad"])
+                params["relu_dropout"], train, params["allow_ffn_pad"],
+                self.pad_strategy, params["quantize_mode"])
 
             self.layers.append([
-                PrePostProcessingWrapper(self_attention_layer, params, train),
-                PrePostProcessingWrapper(enc_dec_attention_layer, params, train),
-                PrePostProcessingWrapper(feed_forward_network, params, train)])
+                PrePostProcessingWrapper(
+                    self_attention_layer, params, train, recompute),
+                PrePostProcessingWrapper(
+                    enc_dec_attention_layer, params, train, recompute),
+                PrePostProcessingWrapper(
+                    feed_forward_network, params, train, recompute)])
 
-        self.output_normalization = LayerNormalization(params["hidden_size"])
+        self.output_normalization = LayerNormalization(
+            params["hidden_size"], fused=bool(params["fused_layer_norm"]))
 
     def call(self, decoder_inputs, encoder_outputs, decoder_self_attention_bias,
-             attention_bias, cache=None):
+             attention_bias, cache=None, targets_padding=None):
         """Return the output of the decoder layer stacks.
 
         Args:
@@ -391,11 +565,17 @@ class DecoderStack(tf.layers.Layer):
               {layer_n: {"k": tensor with shape [batch_size, i, key_channels],
                          "v": tensor with shape [batch_size, i, value_channels]},
                ...}
+          targets_padding: (optional) float tensor with shape
+            [batch_size, target_length], 1 at the positions whose target is
+            padding. If set, the feedforward networks skip these positions.
 
         Returns:
           Output of decoder layer stack.
           float32 tensor with shape [batch_size, target_length, hidden_size]
         """
+        pad_remover = _get_shared_pad_remover(
+            targets_padding, self.allow_pad, self.pad_strategy)
+        ffn_args = [] if targets_padding is None else [targets_padding]
         for n, layer in enumerate(self.layers):
             self_attention_layer = layer[0]
             enc_dec_attention_layer = layer[1]
@@ -412,6 +592,7 @@ class DecoderStack(tf.layers.Layer):
                     decoder_inputs = enc_dec_attention_layer(
                         decoder_inputs, encoder_outputs, attention_bias)
                 with tf.variable_scope("ffn"):
-                    decoder_inputs = feed_forward_network(decoder_inputs)
+                    decoder_inputs = feed_forward_network(
+                        decoder_inputs, *ffn_args, pad_remover=pad_remover)
 
         return self.output_normalization(decoder_inputs)
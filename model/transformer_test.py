@@ -0,0 +1,139 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the Transformer layer normalization, position tables and recompute."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from model import model_params
+from model import model_utils
+from model import transformer
+
+_HIDDEN_SIZE = 16
+
+
+class LayerNormalizationTest(tf.test.TestCase):
+
+    def _normalize(self, fused):
+        rng = np.random.RandomState(0)
+        x = tf.constant(rng.normal(loc=2., scale=3., size=[2, 5, _HIDDEN_SIZE]),
+                        dtype=tf.float32)
+        with tf.variable_scope("fused" if fused else "unfused"):
+            layer_norm = transformer.LayerNormalization(_HIDDEN_SIZE, fused=fused)
+            y = layer_norm(x)
+        # Weight the outputs, so that the gradients are not trivially zero.
+        loss = tf.reduce_sum(y * tf.range(_HIDDEN_SIZE, dtype=tf.float32))
+        gradients = tf.gradients(loss, [x, layer_norm.scale, layer_norm.bias])
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            return sess.run([y] + gradients)
+
+    def test_fused_matches_unfused(self):
+        expected = self._normalize(fused=False)
+        results = self._normalize(fused=True)
+        for value, expected_value in zip(results, expected):
+            self.assertAllClose(expected_value, value, rtol=1e-4, atol=1e-4)
+
+
+class StaticMaxLengthTest(tf.test.TestCase):
+
+    def _predict(self, static_max_length):
+        params = model_params.TINY_PARAMS.copy()
+        params["vocab_size"] = 20
+        params["extra_decode_length"] = 3
+        params["static_max_length"] = static_max_length
+        inputs = np.random.RandomState(0).randint(2, 20, size=[2, 6])
+        checkpoint = os.path.join(self.get_temp_dir(), "model.ckpt")
+        with tf.Graph().as_default():
+            predictions = transformer.Transformer(params, train=False)(
+                tf.constant(inputs, dtype=tf.int64))
+            saver = tf.train.Saver()
+            with self.test_session() as sess:
+                # Both models restore the weights of the first one.
+                if static_max_length is None:
+                    sess.run(tf.global_variables_initializer())
+                    saver.save(sess, checkpoint)
+                else:
+                    saver.restore(sess, checkpoint)
+                return sess.run(predictions)
+
+    def test_static_tables_match_dynamic(self):
+        expected = self._predict(static_max_length=None)
+        results = self._predict(static_max_length=8)
+        self.assertAllEqual(expected["outputs"], results["outputs"])
+        self.assertAllClose(expected["scores"], results["scores"])
+
+
+class RecomputeTest(tf.test.TestCase):
+
+    def _train_stacks(self, recompute):
+        """Return the loss and the gradients of the encoder and decoder stacks."""
+        params = model_params.TINY_PARAMS.copy()
+        params["num_hidden_layers"] = 2
+        params["layer_postprocess_dropout"] = 0.3
+        params["attention_dropout"] = 0.3
+        params["relu_dropout"] = 0.3
+        params["encoder_recompute"] = recompute
+        params["decoder_recompute"] = recompute
+        rng = np.random.RandomState(0)
+        inputs = rng.randint(1, 20, size=[2, 6])
+        inputs[0, 4:] = 0
+        checkpoint = os.path.join(self.get_temp_dir(), "model.ckpt")
+        with tf.Graph().as_default():
+            tf.set_random_seed(1)
+            encoder_inputs = tf.constant(
+                rng.normal(size=[2, 6, params["hidden_size"]]), dtype=tf.float32)
+            decoder_inputs = tf.constant(
+                rng.normal(size=[2, 5, params["hidden_size"]]), dtype=tf.float32)
+            attention_bias = model_utils.get_padding_bias(inputs)
+            encoder_outputs = transformer.EncoderStack(params, train=True)(
+                encoder_inputs, attention_bias, model_utils.get_padding(inputs))
+            outputs = transformer.DecoderStack(params, train=True)(
+                decoder_inputs, encoder_outputs,
+                model_utils.get_decoder_self_attention_bias(5), attention_bias)
+            # Weight the outputs, so that the gradients are not trivially zero.
+            loss = tf.reduce_sum(
+                outputs * tf.range(params["hidden_size"], dtype=tf.float32))
+            variables = tf.trainable_variables()
+            gradients = tf.gradients(loss, variables)
+            saver = tf.train.Saver()
+            with self.test_session() as sess:
+                # Both models restore the weights of the first one.
+                if not recompute:
+                    sess.run(tf.global_variables_initializer())
+                    saver.save(sess, checkpoint)
+                else:
+                    saver.restore(sess, checkpoint)
+                loss, gradients = sess.run([loss, gradients])
+                return loss, {v.op.name: g for v, g in zip(variables, gradients)}
+
+    def test_recompute_matches_stored_activations(self):
+        expected_loss, expected_gradients = self._train_stacks(recompute=False)
+        loss, gradients = self._train_stacks(recompute=True)
+        self.assertAllClose(expected_loss, loss, rtol=1e-5, atol=1e-4)
+        self.assertEqual(sorted(expected_gradients), sorted(gradients))
+        for name, gradient in gradients.items():
+            self.assertAllClose(expected_gradients[name], gradient,
+                                rtol=1e-4, atol=1e-4, msg=name)
+
+
+if __name__ == "__main__":
+    tf.test.main()
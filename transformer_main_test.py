@@ -0,0 +1,126 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the gradient accumulation of the training op."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+import transformer_main
+
+# Two batches of ids and targets. The first batch repeats an id, so that its
+# embedding gradient has two rows for the same index.
+_IDS = [np.array([1, 2, 2]), np.array([2, 3, 5])]
+_TARGETS = [np.array([1., 0., -1.]), np.array([0.5, 2., 1.])]
+_VARIABLE_NAMES = ["embedding", "weights"]
+
+
+def _build_model(ids, targets):
+    """Return the loss of a tiny model with an embedding and a projection."""
+    embedding = tf.get_variable(
+        "embedding", initializer=np.arange(18, dtype=np.float32).reshape([6, 3]) / 10.)
+    weights = tf.get_variable(
+        "weights", initializer=np.array([[0.5], [-1.], [0.2]], dtype=np.float32))
+    predictions = tf.squeeze(tf.matmul(tf.gather(embedding, ids), weights), 1)
+    return tf.reduce_mean(tf.square(predictions - targets))
+
+
+def _get_optimizer():
+    # A large epsilon keeps the first Adam step proportional to the gradient,
+    # instead of its sign.
+    return tf.train.AdamOptimizer(0.1, epsilon=1.)
+
+
+class GradientAccumulationTest(tf.test.TestCase):
+
+    def _get_values(self, sess):
+        return sess.run([tf.global_variables(name)[0] for name in _VARIABLE_NAMES])
+
+    def _train_without_accumulation(self):
+        """Return the variables after one step on both batches together."""
+        with tf.Graph().as_default():
+            global_step = tf.train.get_or_create_global_step()
+            loss = _build_model(np.concatenate(_IDS), np.concatenate(_TARGETS))
+            optimizer = _get_optimizer()
+            train_op = optimizer.apply_gradients(
+                optimizer.compute_gradients(loss), global_step=global_step)
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run(train_op)
+                return self._get_values(sess)
+
+    def test_accumulated_step_matches_single_step(self):
+        expected = self._train_without_accumulation()
+
+        with tf.Graph().as_default():
+            global_step = tf.train.get_or_create_global_step()
+            ids = tf.placeholder(tf.int32, [None])
+            targets = tf.placeholder(tf.float32, [None])
+            loss = _build_model(ids, targets)
+            optimizer = _get_optimizer()
+            gradients = optimizer.compute_gradients(loss)
+            self.assertIsInstance(gradients[0][0], tf.IndexedSlices)
+            train_op, _ = transformer_main.get_accumulating_train_op(
+                optimizer, gradients, global_step, 2)
+            dense_gradients = [tf.convert_to_tensor(g) for g, _ in gradients]
+            accumulators = [
+                tf.global_variables("gradient_accumulation/%s" % name)[0]
+                for name in _VARIABLE_NAMES]
+
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                initial = self._get_values(sess)
+                feeds = [{ids: i, targets: t} for i, t in zip(_IDS, _TARGETS)]
+                first_gradients = sess.run(dense_gradients, feed_dict=feeds[0])
+
+                # The first step only accumulates the gradients; the repeated
+                # id's embedding rows are summed by the scatter_add.
+                sess.run(train_op, feed_dict=feeds[0])
+                for value, initial_value in zip(self._get_values(sess), initial):
+                    self.assertAllEqual(initial_value, value)
+                for value, gradient in zip(sess.run(accumulators),
+                                           first_gradients):
+                    self.assertAllClose(gradient, value)
+                self.assertEqual(1, sess.run(global_step))
+
+                # The second step applies one Adam step on the mean gradient,
+                # and resets the accumulators.
+                sess.run(train_op, feed_dict=feeds[1])
+                for value, expected_value in zip(self._get_values(sess), expected):
+                    self.assertAllClose(expected_value, value)
+                for value in sess.run(accumulators):
+                    self.assertAllEqual(np.zeros_like(value), value)
+                self.assertEqual(2, sess.run(global_step))
+
+    def test_learning_rate_counts_updates(self):
+        with tf.Graph().as_default():
+            global_step = tf.train.get_or_create_global_step()
+            learning_rates = [
+                transformer_main.get_learning_rate(2.0, 16, 4, num_steps)
+                for num_steps in (1, 2)]
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run(global_step.assign(5))
+                single, accumulated = sess.run(learning_rates)
+                sess.run(global_step.assign(2))
+                self.assertAllClose(sess.run(learning_rates[0]), accumulated)
+                self.assertFalse(np.allclose(single, accumulated))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -21,6 +21,7 @@ BLEU score.
 from __future__ import division
 from __future__ import print_function
 
+import json
 import os
 import tempfile
 
@@ -31,11 +32,13 @@ from model import transformer
 from utils import dataset, vocab_utils, metrics
 from utils import schedule
 from comm_utils.export import export
+from comm_utils.export import quantize
 from comm_utils.flags import core as flags_core
 from comm_utils.logs import hooks_helper
 from comm_utils.logs import logger
 from comm_utils.misc import distribution_utils
 from comm_utils.misc import model_helpers
+from comm_utils.misc import session_utils
 
 # pylint: disable=g-bad-import-order
 from six.moves import xrange  # pylint: disable=redefined-builtin
@@ -62,6 +65,26 @@ TENSORS_TO_LOG = {
     "learning_rate": "model/get_train_op/learning_rate/learning_rate",
     "cross_entropy_loss": "model/cross_entropy"}
 
+# Names of the tensors counting the real (non-padding) and padded tokens of each
+# batch, read by the TokensPerSecondHook.
+TOKEN_COUNT_TENSORS = {
+    "tokens": ["model/source_tokens", "model/target_tokens"],
+    "padded_tokens": ["model/padded_source_tokens", "model/padded_target_tokens"]}
+
+# Loss methods that are computed from the decoder outputs instead of the logits
+# when training.
+_OUTPUT_LOSS_METHODS = ("chunked", "sampled_softmax")
+
+# (Regular expression, channel axis) pairs of the variables quantized with
+# --export_int8: the Dense kernels of the attention and feedforward layers, with
+# one scale per output unit, and the embedding weights, with one scale per token.
+# The quantized model_fn (params["quantize_mode"] = "int8") multiplies them with
+# 8-bit matmuls.
+QUANTIZED_VARIABLE_AXES = [
+    (r".*/(self_attention|encdec_attention|ffn)/.*/kernel", -1),
+    (r".*/embedding_and_softmax/(weights|softmax_weights)", 0),
+]
+
 
 def model_fn(features, labels, mode, params):
     """Defines how to train, evaluate and predict from the transformer model."""
@@ -71,7 +94,14 @@ def model_fn(features, labels, mode, params):
         # Create model and get output logits.
         model = transformer.Transformer(params, mode == tf.estimator.ModeKeys.TRAIN)
 
-        logits = model(inputs, targets)
+        # The chunked and sampled losses are computed from the decoder outputs and
+        # the softmax weights, so that the full logits are never built when
+        # training. Evaluation always uses the logits, which the metrics need.
+        loss_method = params["loss_method"] or "one_hot"
+        output_logits = (mode != tf.estimator.ModeKeys.TRAIN or
+                         loss_method not in _OUTPUT_LOSS_METHODS)
+
+        logits = model(inputs, targets, output_logits=output_logits)
 
         # When in prediction mode, the labels/targets is None. The model output
         # is the prediction
@@ -90,13 +120,28 @@ def model_fn(features, labels, mode, params):
         # are the dimensions of targets. Note that the ambiguous shape of logits is
         # not a problem when computing xentropy, because padded_cross_entropy_loss
         # resolves the shape on the TPU.
-        logits.set_shape(targets.shape.as_list() + logits.shape.as_list()[2:])
+        if output_logits:
+            logits.set_shape(targets.shape.as_list() + logits.shape.as_list()[2:])
+
+        # Count the tokens of the batch for the TokensPerSecondHook.
+        record_token_counts(inputs, targets)
 
         # Calculate model loss.
         # xentropy contains the cross entropy loss of every nonpadding token in the
         # targets.
-        xentropy, weights = metrics.padded_cross_entropy_loss(
-            logits, targets, params["label_smoothing"], params["vocab_size"])
+        if output_logits:
+            xentropy, weights = metrics.padded_cross_entropy_loss(
+                logits, targets, params["label_smoothing"], params["vocab_size"],
+                method="one_hot" if loss_method == "one_hot" else "logsumexp")
+        elif loss_method == "chunked":
+            xentropy, weights = metrics.chunked_cross_entropy_loss(
+                logits, model.embedding_softmax_layer.softmax_weights, targets,
+                params["label_smoothing"], params["vocab_size"],
+                chunk_size=params["loss_chunk_size"] or 1024)
+        else:
+            xentropy, weights = metrics.sampled_softmax_loss(
+                logits, model.embedding_softmax_layer.softmax_weights, targets,
+                params["vocab_size"], params["num_sampled"] or 4096)
         loss = tf.reduce_sum(xentropy) / tf.reduce_sum(weights)
 
         # Save loss as named tensor that will be logged with the logging hook.
@@ -116,16 +161,32 @@ def model_fn(features, labels, mode, params):
             return tf.estimator.EstimatorSpec(mode=mode, loss=loss, train_op=train_op)
 
 
+def record_token_counts(inputs, targets):
+    """Save the number of real and padded tokens as named tensors."""
+    tf.identity(tf.count_nonzero(inputs), name="source_tokens")
+    tf.identity(tf.count_nonzero(targets), name="target_tokens")
+    tf.identity(tf.size(inputs, out_type=tf.int64), name="padded_source_tokens")
+    tf.identity(tf.size(targets, out_type=tf.int64), name="padded_target_tokens")
+
+
 def record_scalars(metric_dict):
     for key, value in metric_dict.items():
         tf.contrib.summary.scalar(name=key, tensor=value)
 
 
-def get_learning_rate(learning_rate, hidden_size, learning_rate_warmup_steps):
-    """Calculate learning rate with linear warmup and rsqrt decay."""
+def get_learning_rate(learning_rate, hidden_size, learning_rate_warmup_steps,
+                      gradient_accumulation_steps=1):
+    """Calculate learning rate with linear warmup and rsqrt decay.
+
+    The warmup and the decay follow the number of applied updates, which is the
+    global step divided by gradient_accumulation_steps.
+    """
     with tf.name_scope("learning_rate"):
         warmup_steps = tf.to_float(learning_rate_warmup_steps)
-        step = tf.to_float(tf.train.get_or_create_global_step())
+        step = tf.train.get_or_create_global_step()
+        if gradient_accumulation_steps > 1:
+            step //= gradient_accumulation_steps
+        step = tf.to_float(step)
 
         learning_rate *= (hidden_size ** -0.5)
         # Apply linear warmup
@@ -141,13 +202,71 @@ def get_learning_rate(learning_rate, hidden_size, learning_rate_warmup_steps):
         return learning_rate
 
 
+def get_accumulating_train_op(optimizer, gradients, global_step, num_steps):
+    """Accumulate the gradients of num_steps steps, and apply their mean.
+
+    The gradients of every step are added to non-trainable accumulation
+    variables. The optimizer only runs on the last step of every num_steps steps,
+    which applies the mean of the accumulated gradients and resets the
+    accumulators. The global step is incremented at every step.
+
+    Args:
+      optimizer: tf.train.Optimizer applying the accumulated gradients.
+      gradients: list of (gradient, variable) pairs of the current step.
+      global_step: global step variable.
+      num_steps: int number of steps whose gradients are accumulated.
+
+    Returns:
+      train op, and the list of (accumulated gradient, variable) pairs
+      including the gradients of the current step. On the last step of every
+      num_steps steps, these are the gradients applied by the optimizer.
+    """
+    with tf.variable_scope("gradient_accumulation"):
+        accumulate_ops = []
+        accumulators = []
+        for gradient, var in gradients:
+            if gradient is None:
+                continue
+            # Resource variables, so that the reads of the accumulated gradients
+            # are not changed by the reset that follows the update.
+            accumulator = tf.get_variable(
+                var.op.name, var.shape, dtype=var.dtype.base_dtype,
+                initializer=tf.zeros_initializer(), trainable=False,
+                use_resource=True)
+            if isinstance(gradient, tf.IndexedSlices):
+                # The embedding gradients only touch the rows of the batch.
+                accumulate_ops.append(tf.scatter_add(
+                    accumulator, gradient.indices, gradient.values))
+            else:
+                accumulate_ops.append(accumulator.assign_add(gradient))
+            accumulators.append((accumulator, var))
+
+        with tf.control_dependencies(accumulate_ops):
+            accumulated = [(accumulator.read_value() / num_steps, var)
+                           for accumulator, var in accumulators]
+
+        def apply_and_reset():
+            apply_op = optimizer.apply_gradients(accumulated, name="train")
+            with tf.control_dependencies([apply_op]):
+                return tf.group(*[accumulator.assign(tf.zeros_like(accumulator))
+                                  for accumulator, _ in accumulators])
+
+        is_update_step = tf.equal((global_step + 1) % num_steps, 0)
+        update_op = tf.cond(is_update_step, apply_and_reset, tf.no_op)
+        with tf.control_dependencies([update_op]):
+            train_op = tf.assign_add(global_step, 1)
+        return train_op, accumulated
+
+
 def get_train_op_and_metrics(loss, params):
     """Generate training op and metrics to save in TensorBoard."""
     with tf.variable_scope("get_train_op"):
+        gradient_accumulation_steps = params["gradient_accumulation_steps"] or 1
         learning_rate = get_learning_rate(
             learning_rate=params["learning_rate"],
             hidden_size=params["hidden_size"],
-            learning_rate_warmup_steps=params["learning_rate_warmup_steps"])
+            learning_rate_warmup_steps=params["learning_rate_warmup_steps"],
+            gradient_accumulation_steps=gradient_accumulation_steps)
 
         # Create optimizer. Use LazyAdamOptimizer from TF contrib, which is faster
         # than the TF core Adam optimizer.
@@ -162,8 +281,13 @@ def get_train_op_and_metrics(loss, params):
         tvars = tf.trainable_variables()
         gradients = optimizer.compute_gradients(
             loss, tvars, colocate_gradients_with_ops=True)
-        minimize_op = optimizer.apply_gradients(
-            gradients, global_step=global_step, name="train")
+        if gradient_accumulation_steps > 1:
+            # The norm below is computed on the accumulated gradients.
+            minimize_op, gradients = get_accumulating_train_op(
+                optimizer, gradients, global_step, gradient_accumulation_steps)
+        else:
+            minimize_op = optimizer.apply_gradients(
+                gradients, global_step=global_step, name="train")
         update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
         train_op = tf.group(minimize_op, update_ops)
 
@@ -342,12 +466,14 @@ def define_transformer_flags():
     flags_core.define_base()
     flags_core.define_performance(
         num_parallel_calls=True,
-        inter_op=False,
-        intra_op=False,
+        inter_op=True,
+        intra_op=True,
         synthetic_data=True,
         max_train_steps=False,
         dtype=False,
-        all_reduce_alg=True
+        all_reduce_alg=True,
+        xla=True,
+        cpu_affinity=True
     )
     flags_core.define_benchmark()
     flags_core.define_device(tpu=True)
@@ -415,6 +541,86 @@ def define_transformer_flags():
         help=flags_core.help_wrap(
             "Possible values: ['', 'bpe', 'spm']"))
 
+    flags.DEFINE_bool(
+        name="checkpoint_input_pipeline", short_name="cip", default=False,
+        help=flags_core.help_wrap(
+            "If set, the position of the training input iterator is saved with "
+            "each checkpoint and restored when training resumes, so that every "
+            "train/eval iteration (and a restarted job) continues reading the "
+            "training data where the previous one stopped. This makes the input "
+            "order deterministic and requires --train_steps."))
+    flags.DEFINE_integer(
+        name="num_workers", short_name="nw", default=1,
+        help=flags_core.help_wrap(
+            "Number of workers training on the same data. Each worker only reads "
+            "its own shard of the training files (or of the training records, "
+            "when there are fewer files than workers)."))
+    flags.DEFINE_integer(
+        name="worker_index", short_name="wi", default=0,
+        help=flags_core.help_wrap(
+            "Index of this worker, in the range [0, --num_workers)."))
+    flags.DEFINE_enum(
+        name="loss_method", default="one_hot",
+        enum_values=["one_hot", "logsumexp", "chunked", "sampled_softmax"],
+        help=flags_core.help_wrap(
+            "How the label-smoothed cross entropy is computed. 'logsumexp' gives "
+            "the same loss as 'one_hot' without building a soft targets tensor "
+            "of the size of the logits, which lowers the peak memory. 'chunked' "
+            "also gives the same loss when training, computing the logits "
+            "--loss_chunk_size positions at a time so that the full logits are "
+            "never held. 'sampled_softmax' trains with a sampled softmax over "
+            "--num_sampled classes, without label smoothing. Evaluation always "
+            "uses the full logits."))
+    flags.DEFINE_integer(
+        name="loss_chunk_size", default=1024,
+        help=flags_core.help_wrap(
+            "Number of target positions whose logits are computed together with "
+            "--loss_method=chunked."))
+    flags.DEFINE_integer(
+        name="num_sampled", default=4096,
+        help=flags_core.help_wrap(
+            "Number of classes sampled per batch with "
+            "--loss_method=sampled_softmax."))
+    flags.DEFINE_integer(
+        name="gradient_accumulation_steps", short_name="gas", default=1,
+        lower_bound=1,
+        help=flags_core.help_wrap(
+            "Number of batches whose gradients are accumulated before each update "
+            "of the model, e.g. 12 batches of 2048 tokens for updates of about "
+            "25k tokens. The global step, --train_steps and --steps_between_evals "
+            "count batches, while the learning rate schedule counts updates."))
+    flags.DEFINE_bool(
+        name="export_int8", default=False,
+        help=flags_core.help_wrap(
+            "Also export a SavedModel with 8-bit matmuls to <--export_dir>/int8. "
+            "The attention, feedforward and embedding weights are quantized "
+            "with per-channel scales, and the ranges of the matmul inputs are "
+            "calibrated by translating the first --int8_calibration_lines lines "
+            "of --bleu_source with the float model."))
+    flags.DEFINE_integer(
+        name="int8_calibration_lines", default=200, lower_bound=1,
+        help=flags_core.help_wrap(
+            "Number of --bleu_source lines translated to calibrate the input "
+            "ranges of the --export_int8 matmuls."))
+    flags.DEFINE_bool(
+        name="export_frozen", default=False,
+        help=flags_core.help_wrap(
+            "Also export a frozen inference graph to <--export_dir>/frozen: the "
+            "variables are turned into constants, the restore ops are removed "
+            "and the constant subgraphs are folded. The directory holds "
+            "frozen_graph.pb, the vocab file and signature.json, the names of "
+            "the input and output tensors."))
+    flags.DEFINE_integer(
+        name="export_beam_size", default=None, lower_bound=1,
+        help=flags_core.help_wrap(
+            "Beam size of the frozen graph. Defaults to the beam size of "
+            "--param_set."))
+    flags.DEFINE_integer(
+        name="export_max_length", default=None, lower_bound=1,
+        help=flags_core.help_wrap(
+            "If set, the inputs of the frozen graph are truncated to this number "
+            "of tokens, and its position tables become constants of this size "
+            "(plus the extra decode length)."))
     flags.DEFINE_bool(
         name="gpu_allow_growth", short_name="gag", default=True,
         help=flags_core.help_wrap(
@@ -436,6 +642,20 @@ def define_transformer_flags():
     def _check_train_limits(flag_dict):
         return flag_dict["train_epochs"] is None or flag_dict["train_steps"] is None
 
+    @flags.multi_flags_validator(
+        ["checkpoint_input_pipeline", "train_steps"],
+        message="--checkpoint_input_pipeline requires --train_steps, because the "
+                "resumable training dataset is repeated indefinitely.")
+    def _check_checkpoint_input_pipeline(flags_dict):
+        return (not flags_dict["checkpoint_input_pipeline"] or
+                flags_dict["train_steps"] is not None)
+
+    @flags.multi_flags_validator(
+        ["num_workers", "worker_index"],
+        message="--worker_index must be in the range [0, --num_workers).")
+    def _check_worker_index(flags_dict):
+        return 0 <= flags_dict["worker_index"] < flags_dict["num_workers"]
+
     @flags.multi_flags_validator(
         ["bleu_source", "bleu_ref"],
         message="Both or neither --bleu_source and --bleu_ref must be defined.")
@@ -460,6 +680,28 @@ def define_transformer_flags():
             return flags_dict["vocab_file"] is not None
         return True
 
+    @flags.multi_flags_validator(
+        ["export_int8", "export_dir", "bleu_source"],
+        message="--export_int8 requires --export_dir, and --bleu_source to "
+                "calibrate the quantized model.")
+    def _check_export_int8(flags_dict):
+        return not flags_dict["export_int8"] or bool(
+            flags_dict["export_dir"] and flags_dict["bleu_source"])
+
+    @flags.multi_flags_validator(
+        ["export_frozen", "export_dir"],
+        message="--export_frozen requires --export_dir.")
+    def _check_export_frozen(flags_dict):
+        return not flags_dict["export_frozen"] or flags_dict["export_dir"]
+
+    @flags.multi_flags_validator(
+        ["gradient_accumulation_steps", "num_gpus"],
+        message="--gradient_accumulation_steps is not supported with multiple "
+                "GPUs.")
+    def _check_gradient_accumulation(flags_dict):
+        return (flags_dict["gradient_accumulation_steps"] == 1 or
+                flags_dict["num_gpus"] in (0, 1))
+
     flags_core.require_cloud_storage(["data_dir", "model_dir", "export_dir"])
 
 
@@ -470,6 +712,7 @@ def construct_estimator(flags_obj, params, schedule_manager, session_config):
       flags_obj: The FLAGS object parsed from command line.
       params: A dict of run specific parameters.
       schedule_manager: A schedule.Manager object containing the run schedule.
+      session_config: tf.ConfigProto used to create the sessions.
 
     Returns:
       An estimator object to be used for training and eval.
@@ -478,7 +721,109 @@ def construct_estimator(flags_obj, params, schedule_manager, session_config):
         flags_core.get_num_gpus(flags_obj), flags_obj.all_reduce_alg)
     return tf.estimator.Estimator(
         model_fn=model_fn, model_dir=flags_obj.model_dir, params=params,
-        config=tf.estimator.RunConfig(train_distribute=distribution_strategy))
+        config=tf.estimator.RunConfig(train_distribute=distribution_strategy,
+                                      session_config=session_config))
+
+
+def get_calibration_sequences(source_file, vocab_file, num_lines):
+    """Return the first num_lines lines of source_file, encoded with EOS."""
+    vocab_helper = vocab_utils.VocabHelper(vocab_file)
+    with tf.gfile.Open(source_file) as f:
+        lines = f.read().strip().splitlines()[:num_lines]
+    return [list(ids) for ids in vocab_helper.encode_batch(lines, add_eos=True)]
+
+
+def quantize_checkpoint(checkpoint_path, output_path, params, sequences):
+    """Write an int8 copy of a float checkpoint, calibrated on sequences.
+
+    The input ranges of the matmuls are calibrated by translating the encoded
+    sequences with the float model, and the weights of QUANTIZED_VARIABLE_AXES
+    are quantized per channel.
+
+    Returns:
+      The stats of quantize.quantize_checkpoint.
+    """
+    calibration_params = params.copy()
+    calibration_params["quantize_mode"] = "calibrate"
+
+    def calibration_model_fn(inputs):
+        return model_fn(inputs, None, tf.estimator.ModeKeys.PREDICT,
+                        calibration_params).predictions
+
+    input_ranges = quantize.calibrate_input_ranges(
+        calibration_model_fn, checkpoint_path, sequences)
+    stats = quantize.quantize_checkpoint(
+        checkpoint_path, output_path, QUANTIZED_VARIABLE_AXES, input_ranges)
+    tf.logging.info(
+        "Quantized %d variables from %.1f MB to %.1f MB (max abs error %g), "
+        "calibrated %d input ranges on %d sequences." % (
+            stats["quantized_variables"], stats["float_bytes"] / 2. ** 20,
+            stats["int8_bytes"] / 2. ** 20, stats["max_abs_error"],
+            len(input_ranges), len(sequences)))
+    return stats
+
+
+def export_quantized(flags_obj, params, serving_input_fn, session_config):
+    """Export the latest checkpoint with int8 matmuls to <export_dir>/int8.
+
+    The checkpoint is quantized into <model_dir>/int8 (see quantize_checkpoint),
+    calibrated on the first --int8_calibration_lines lines of --bleu_source, and
+    exported with params["quantize_mode"] = "int8".
+    """
+    quantized_dir = os.path.join(flags_obj.model_dir, "int8")
+    quantized_path = os.path.join(quantized_dir, "model.ckpt")
+    tf.gfile.MakeDirs(quantized_dir)
+    quantize_checkpoint(
+        tf.train.latest_checkpoint(flags_obj.model_dir), quantized_path, params,
+        get_calibration_sequences(flags_obj.bleu_source, flags_obj.vocab_file,
+                                  flags_obj.int8_calibration_lines))
+
+    params = params.copy()
+    params["quantize_mode"] = "int8"
+    estimator = tf.estimator.Estimator(
+        model_fn=model_fn, model_dir=quantized_dir, params=params,
+        config=tf.estimator.RunConfig(session_config=session_config))
+    return estimator.export_savedmodel(
+        os.path.join(flags_obj.export_dir, "int8"), serving_input_fn,
+        assets_extra={"vocab.txt": flags_obj.vocab_file},
+        checkpoint_path=quantized_path)
+
+
+def export_frozen_graph(flags_obj, params, serving_input_fn, session_config):
+    """Export the latest checkpoint as a frozen graph to <export_dir>/frozen.
+
+    The graph is first exported as a SavedModel, with the beam size and the
+    static maximum length of --export_beam_size and --export_max_length, and
+    then frozen by export.freeze_saved_model.
+    """
+    params = params.copy()
+    if flags_obj.export_beam_size:
+        params["beam_size"] = flags_obj.export_beam_size
+    params["static_max_length"] = flags_obj.export_max_length
+    estimator = tf.estimator.Estimator(
+        model_fn=model_fn, model_dir=flags_obj.model_dir, params=params,
+        config=tf.estimator.RunConfig(session_config=session_config))
+
+    frozen_dir = os.path.join(flags_obj.export_dir, "frozen")
+    tf.gfile.MakeDirs(frozen_dir)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        saved_model_dir = tf.compat.as_str(
+            estimator.export_savedmodel(tmp_dir, serving_input_fn))
+        inputs, outputs = export.freeze_saved_model(
+            saved_model_dir, os.path.join(frozen_dir, "frozen_graph.pb"))
+    finally:
+        tf.gfile.DeleteRecursively(tmp_dir)
+
+    tf.gfile.Copy(flags_obj.vocab_file, os.path.join(frozen_dir, "vocab.txt"),
+                  overwrite=True)
+    with tf.gfile.Open(os.path.join(frozen_dir, "signature.json"), "w") as f:
+        json.dump({"inputs": inputs, "outputs": outputs,
+                   "beam_size": params["beam_size"],
+                   "max_length": params["static_max_length"]},
+                  f, indent=2, sort_keys=True)
+    tf.logging.info("Exported the frozen graph to %s" % frozen_dir)
+    return frozen_dir
 
 
 def run_transformer(flags_obj):
@@ -489,6 +834,10 @@ def run_transformer(flags_obj):
     """
     num_gpus = flags_core.get_num_gpus(flags_obj)
 
+    # Pin the process before any session (and its thread pools) is created.
+    if flags_obj.cpu_affinity:
+        session_utils.set_cpu_affinity(flags_obj.cpu_affinity)
+
     # Add flag-defined parameters to params object
     params = PARAMS_MAP[flags_obj.param_set]
     if num_gpus > 1:
@@ -507,6 +856,13 @@ def run_transformer(flags_obj):
     params["allow_ffn_pad"] = not params["use_tpu"]
 
     params["use_synthetic_data"] = flags_obj.use_synthetic_data
+    params["checkpoint_input_pipeline"] = flags_obj.checkpoint_input_pipeline
+    params["num_workers"] = flags_obj.num_workers
+    params["worker_index"] = flags_obj.worker_index
+    params["loss_method"] = flags_obj.loss_method
+    params["loss_chunk_size"] = flags_obj.loss_chunk_size
+    params["num_sampled"] = flags_obj.num_sampled
+    params["gradient_accumulation_steps"] = flags_obj.gradient_accumulation_steps
 
     params["batch_size"] = flags_obj.batch_size or params["default_batch_size"]
     params["batch_size"] = distribution_utils.per_device_batch_size(params["batch_size"], num_gpus)
@@ -523,7 +879,12 @@ def run_transformer(flags_obj):
         num_tpu_shards=flags_obj.num_tpu_shards
     )
 
-    params["repeat_dataset"] = schedule_manager.repeat_dataset
+    # A resumable input pipeline is never exhausted; the number of steps in each
+    # iteration is bounded by the schedule instead.
+    if params["checkpoint_input_pipeline"]:
+        params["repeat_dataset"] = None
+    else:
+        params["repeat_dataset"] = schedule_manager.repeat_dataset
 
     model_helpers.apply_clean(flags.FLAGS)
 
@@ -533,6 +894,7 @@ def run_transformer(flags_obj):
         model_dir=flags_obj.model_dir,
         tensors_to_log=TENSORS_TO_LOG,  # used for logging hooks
         batch_size=schedule_manager.batch_size,  # for ExamplesPerSecondHook
+        token_count_tensors=TOKEN_COUNT_TENSORS,  # for TokensPerSecondHook
         use_tpu=params["use_tpu"]  # Not all hooks can run with TPUs
     )
     benchmark_logger = logger.get_benchmark_logger()
@@ -543,10 +905,17 @@ def run_transformer(flags_obj):
         test_id=flags_obj.benchmark_test_id)
 
     # Train and evaluate transformer model
-    session_config = tf.ConfigProto()
+    session_config = session_utils.get_session_config(
+        inter_op_threads=flags_obj.inter_op_parallelism_threads,
+        intra_op_threads=flags_obj.intra_op_parallelism_threads,
+        enable_xla=flags_obj.enable_xla)
     session_config.gpu_options.allow_growth = flags_obj.gpu_allow_growth
     session_config.gpu_options.per_process_gpu_memory_fraction = flags_obj.gpu_memory_fraction
     estimator = construct_estimator(flags_obj, params, schedule_manager, session_config)
+    if params["checkpoint_input_pipeline"]:
+        # Save the training iterator state next to the model checkpoints, and
+        # restore it at the start of every estimator.train call.
+        train_hooks.append(tf.contrib.data.CheckpointInputPipelineHook(estimator))
     run_loop(
         estimator=estimator,
         # Training arguments
@@ -571,6 +940,11 @@ def run_transformer(flags_obj):
         estimator.export_savedmodel(
             flags_obj.export_dir, serving_input_fn,
             assets_extra={"vocab.txt": flags_obj.vocab_file})
+        if flags_obj.export_int8:
+            export_quantized(flags_obj, params, serving_input_fn, session_config)
+        if flags_obj.export_frozen:
+            export_frozen_graph(
+                flags_obj, params, serving_input_fn, session_config)
 
 
 def main(_):
@@ -18,7 +18,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import os
+import time
 
 # pylint: disable=g-bad-import-order
 from absl import app as absl_app
@@ -26,7 +28,9 @@ from absl import flags
 import tensorflow as tf
 # pylint: enable=g-bad-import-order
 
+from utils import decode_stats
 from utils import tokenizer
+from utils import translation_cache
 from comm_utils.flags import core as flags_core
 
 _DECODE_BATCH_SIZE = 32
@@ -38,11 +42,15 @@ _ALPHA = 0.6
 def _get_sorted_inputs(filename):
     """Read and sort lines from the file sorted by decreasing length.
 
+    Duplicate lines are only returned once, so that each distinct line is
+    translated a single time. Lines are duplicates when their normalized text
+    (the key of the translation cache) is the same; the first of them is kept.
+
     Args:
       filename: String name of file to read inputs from.
     Returns:
-      Sorted list of inputs, and dictionary mapping original index->sorted index
-      of each element.
+      Sorted list of distinct inputs, and list mapping the index of every line in
+      the file->sorted index of its input.
     """
     with tf.gfile.Open(filename) as f:
         records = f.read().split("\n")
@@ -50,14 +58,25 @@ def _get_sorted_inputs(filename):
         if not inputs[-1]:
             inputs.pop()
 
-    input_lens = [(i, len(line.split())) for i, line in enumerate(inputs)]
+    # Maps the normalized text of each distinct line to its first line.
+    keys = [translation_cache.normalize(line) for line in inputs]
+    first_lines = collections.OrderedDict()
+    for key, line in zip(keys, inputs):
+        first_lines.setdefault(key, line)
+    unique_inputs = list(first_lines.values())
+    if len(unique_inputs) < len(inputs):
+        tf.logging.info("Removed %d duplicate lines out of %d." %
+                        (len(inputs) - len(unique_inputs), len(inputs)))
+
+    input_lens = [(i, len(line.split())) for i, line in enumerate(unique_inputs)]
     sorted_input_lens = sorted(input_lens, key=lambda x: x[1], reverse=True)
 
     sorted_inputs = [None] * len(sorted_input_lens)
-    sorted_keys = [0] * len(sorted_input_lens)
+    sorted_index = {}
     for i, (index, _) in enumerate(sorted_input_lens):
-        sorted_inputs[i] = inputs[index]
-        sorted_keys[index] = i
+        sorted_inputs[i] = unique_inputs[index]
+        sorted_index[translation_cache.normalize(unique_inputs[index])] = i
+    sorted_keys = [sorted_index[key] for key in keys]
     return sorted_inputs, sorted_keys
 
 
@@ -66,16 +85,8 @@ def _encode_and_add_eos(line, subtokenizer):
     return subtokenizer.encode(line) + [tokenizer.EOS_ID]
 
 
-def _trim_and_decode(ids, subtokenizer):
-    """Trim EOS and PAD tokens from ids, and decode to return a string."""
-    try:
-        index = list(ids).index(tokenizer.EOS_ID)
-        return subtokenizer.decode(ids[:index])
-    except ValueError:  # No EOS found in sequence
-        return subtokenizer.decode(ids)
-
-
-def translate_file(estimator, subtokenizer, input_file, output_file=None, print_all_translations=True):
+def translate_file(estimator, subtokenizer, input_file, output_file=None,
+                   print_all_translations=True, cache=None):
     """Translate lines in file, and save to output file if specified.
 
     Args:
@@ -85,6 +96,8 @@ def translate_file(estimator, subtokenizer, input_file, output_file=None, print_
       input_file: file containing lines to translate
       output_file: file that stores the generated translations.
       print_all_translations: If true, all translations are printed to stdout.
+      cache: Optional TranslationCache. Cached lines are not sent to the
+        estimator, and new translations are added to the cache.
 
     Raises:
       ValueError: if output file is invalid.
@@ -94,11 +107,18 @@ def translate_file(estimator, subtokenizer, input_file, output_file=None, print_
     # Read and sort inputs by length. Keep dictionary (original index-->new index
     # in sorted list) to write translations in the original order.
     sorted_inputs, sorted_keys = _get_sorted_inputs(input_file)
-    num_decode_batches = (len(sorted_inputs) - 1) // batch_size + 1
+
+    # Only the lines that are not in the cache are sent to the estimator.
+    translations = [None] * len(sorted_inputs)
+    if cache is not None:
+        translations = [cache.get(line) for line in sorted_inputs]
+    uncached_indices = [i for i, t in enumerate(translations) if t is None]
+    uncached_inputs = [sorted_inputs[i] for i in uncached_indices]
+    num_decode_batches = (len(uncached_inputs) - 1) // batch_size + 1
 
     def input_generator():
-        """Yield encoded strings from sorted_inputs."""
-        for i, line in enumerate(sorted_inputs):
+        """Yield encoded strings from uncached_inputs."""
+        for i, line in enumerate(uncached_inputs):
             if i % batch_size == 0:
                 batch_num = (i // batch_size) + 1
 
@@ -113,14 +133,31 @@ def translate_file(estimator, subtokenizer, input_file, output_file=None, print_
         ds = ds.padded_batch(batch_size, [None])
         return ds
 
-    translations = []
-    for i, prediction in enumerate(estimator.predict(input_fn)):
-        translation = _trim_and_decode(prediction["outputs"], subtokenizer)
-        translations.append(translation)
-
-        if print_all_translations:
-            tf.logging.info("Translating:\n\tInput: %s\n\tOutput: %s" %
-                            (sorted_inputs[i], translation))
+    # Decode the predictions a whole batch at a time. Instrumented models
+    # (params["instrument_decode"]) also return the beam search stats.
+    num_translated = 0
+    stats = decode_stats.DecodeStats()
+    start = time.time()
+    if uncached_inputs:
+        for predictions in estimator.predict(input_fn, yield_single_examples=False):
+            if "loop_steps" in predictions:
+                stats.add_batch(predictions)
+            for translation in subtokenizer.decode_batch(predictions["outputs"]):
+                index = uncached_indices[num_translated]
+                num_translated += 1
+                translations[index] = translation
+                if cache is not None:
+                    cache.put(sorted_inputs[index], translation)
+
+                if print_all_translations:
+                    tf.logging.info("Translating:\n\tInput: %s\n\tOutput: %s" %
+                                    (sorted_inputs[index], translation))
+
+    stats.log_report(time.time() - start)
+
+    if cache is not None:
+        cache.flush()
+        cache.log_stats()
 
     # Write translations in the order they appeared in the original file.
     if output_file is not None:
@@ -133,18 +170,22 @@ def translate_file(estimator, subtokenizer, input_file, output_file=None, print_
                 f.write("%s\n" % translations[i])
 
 
-def translate_text(estimator, subtokenizer, txt):
+def translate_text(estimator, subtokenizer, txt, cache=None):
     """Translate a single string."""
-    encoded_txt = _encode_and_add_eos(txt, subtokenizer)
-
-    def input_fn():
-        ds = tf.data.Dataset.from_tensors(encoded_txt)
-        ds = ds.batch(_DECODE_BATCH_SIZE)
-        return ds
-
-    predictions = estimator.predict(input_fn)
-    translation = next(predictions)["outputs"]
-    translation = _trim_and_decode(translation, subtokenizer)
+    translation = cache.get(txt) if cache is not None else None
+    if translation is None:
+        encoded_txt = _encode_and_add_eos(txt, subtokenizer)
+
+        def input_fn():
+            ds = tf.data.Dataset.from_tensors(encoded_txt)
+            ds = ds.batch(_DECODE_BATCH_SIZE)
+            return ds
+
+        predictions = estimator.predict(input_fn)
+        translation = next(predictions)["outputs"]
+        translation = subtokenizer.decode_batch([translation])[0]
+        if cache is not None:
+            cache.put(txt, translation)
     tf.logging.info("Translation of \"%s\": \"%s\"" % (txt, translation))
 
 
@@ -166,13 +207,24 @@ def main(unused_argv):
     params["alpha"] = _ALPHA
     params["extra_decode_length"] = _EXTRA_DECODE_LENGTH
     params["batch_size"] = _DECODE_BATCH_SIZE
+    params["instrument_decode"] = FLAGS.instrument_decode
     estimator = tf.estimator.Estimator(
         model_fn=transformer_main.model_fn, model_dir=FLAGS.model_dir,
         params=params)
 
+    cache = None
+    if FLAGS.cache_size or FLAGS.cache_file:
+        signature = translation_cache.make_signature(
+            estimator.latest_checkpoint(), beam_size=params["beam_size"],
+            alpha=params["alpha"],
+            extra_decode_length=params["extra_decode_length"])
+        cache = translation_cache.TranslationCache(
+            signature, capacity=FLAGS.cache_size, ttl=FLAGS.cache_ttl,
+            db_path=FLAGS.cache_file)
+
     if FLAGS.text is not None:
         tf.logging.info("Translating text: %s" % FLAGS.text)
-        translate_text(estimator, subtokenizer, FLAGS.text)
+        translate_text(estimator, subtokenizer, FLAGS.text, cache)
 
     if FLAGS.file is not None:
         input_file = os.path.abspath(FLAGS.file)
@@ -185,7 +237,11 @@ def main(unused_argv):
             output_file = os.path.abspath(FLAGS.file_out)
             tf.logging.info("File output specified: %s" % output_file)
 
-        translate_file(estimator, subtokenizer, input_file, output_file)
+        translate_file(estimator, subtokenizer, input_file, output_file,
+                       cache=cache)
+
+    if cache is not None:
+        cache.close()
 
 
 def define_translate_flags():
@@ -226,6 +282,31 @@ def define_translate_flags():
         name="file_out", default=None,
         help=flags_core.help_wrap(
             "If --file flag is specified, save translation to this file."))
+    flags.DEFINE_bool(
+        name="instrument_decode", default=False,
+        help=flags_core.help_wrap(
+            "If set, record the beam search loop iterations and the number of "
+            "alive and finished beams at every step, and log a report of the "
+            "decode steps per sentence, the steps wasted after EOS and the "
+            "effective tokens/sec of --file."))
+
+    # Translation cache flags
+    flags.DEFINE_integer(
+        name="cache_size", default=0,
+        help=flags_core.help_wrap(
+            "Maximum number of translations kept in the in-memory translation "
+            "cache. Translations are cached by normalized source sentence, model "
+            "checkpoint and decoding parameters."))
+    flags.DEFINE_string(
+        name="cache_file", default=None,
+        help=flags_core.help_wrap(
+            "Path of a SQLite database used as on-disk translation cache. It may "
+            "be shared across runs."))
+    flags.DEFINE_float(
+        name="cache_ttl", default=None,
+        help=flags_core.help_wrap(
+            "Number of seconds after which cached translations expire. By "
+            "default, cached translations never expire."))
 
 
 if __name__ == "__main__":
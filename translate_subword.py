@@ -18,7 +18,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import os
+import time
 import re
 
 # pylint: disable=g-bad-import-order
@@ -27,6 +29,8 @@ from absl import flags
 import tensorflow as tf
 # pylint: enable=g-bad-import-order
 
+from utils import decode_stats
+from utils import translation_cache
 from utils import vocab_utils
 from comm_utils.flags import core as flags_core
 
@@ -39,11 +43,15 @@ _ALPHA = 0.6
 def _get_sorted_inputs(filename):
     """Read and sort lines from the file sorted by decreasing length.
 
+    Duplicate lines are only returned once, so that each distinct line is
+    translated a single time. Lines are duplicates when their normalized text
+    (the key of the translation cache) is the same; the first of them is kept.
+
     Args:
       filename: String name of file to read inputs from.
     Returns:
-      Sorted list of inputs, and dictionary mapping original index->sorted index
-      of each element.
+      Sorted list of distinct inputs, and list mapping the index of every line in
+      the file->sorted index of its input.
     """
     with tf.gfile.Open(filename) as f:
         records = f.read().split("\n")
@@ -51,31 +59,32 @@ def _get_sorted_inputs(filename):
         if not inputs[-1]:
             inputs.pop()
 
-    input_lens = [(i, len(line.split())) for i, line in enumerate(inputs)]
+    # Maps the normalized text of each distinct line to its first line.
+    keys = [translation_cache.normalize(line) for line in inputs]
+    first_lines = collections.OrderedDict()
+    for key, line in zip(keys, inputs):
+        first_lines.setdefault(key, line)
+    unique_inputs = list(first_lines.values())
+    if len(unique_inputs) < len(inputs):
+        tf.logging.info("Removed %d duplicate lines out of %d." %
+                        (len(inputs) - len(unique_inputs), len(inputs)))
+
+    input_lens = [(i, len(line.split())) for i, line in enumerate(unique_inputs)]
     sorted_input_lens = sorted(input_lens, key=lambda x: x[1], reverse=True)
 
     sorted_inputs = [None] * len(sorted_input_lens)
-    sorted_keys = [0] * len(sorted_input_lens)
+    sorted_index = {}
     for i, (index, _) in enumerate(sorted_input_lens):
-        sorted_inputs[i] = inputs[index]
-        sorted_keys[index] = i
+        sorted_inputs[i] = unique_inputs[index]
+        sorted_index[translation_cache.normalize(unique_inputs[index])] = i
+    sorted_keys = [sorted_index[key] for key in keys]
     return sorted_inputs, sorted_keys
 
 
-def _encode_and_add_eos(line, vocab_helper):
-    """Encode line with vocab_helper, and add EOS id to the end."""
-    return vocab_helper.encode(line) + [vocab_utils.EOS_ID]
-
-
-def _trim_and_decode(ids, vocab_helper, subword_option=None):
-    """Trim EOS and PAD tokens from ids, and decode to return a string."""
-    try:
-        index = list(ids).index(vocab_utils.EOS_ID)
-        sent = vocab_helper.decode(ids[:index])
-        return _clean(sent, subword_option)
-    except ValueError:  # No EOS found in sequence
-        sent = vocab_helper.decode(ids)
-        return _clean(sent, subword_option)
+def _trim_and_decode_batch(ids_batch, vocab_helper, subword_option=None):
+    """Trim EOS and PAD tokens from a batch of ids, and decode to strings."""
+    return [_clean(sent, subword_option)
+            for sent in vocab_helper.decode_batch(ids_batch)]
 
 
 def _clean(sentence, subword_option):
@@ -95,7 +104,7 @@ def _clean(sentence, subword_option):
 
 def translate_file(
     estimator, vocab_helper, input_file, output_file=None,
-        subword_option=None, print_all_translations=True):
+        subword_option=None, print_all_translations=True, cache=None):
     """Translate lines in file, and save to output file if specified.
 
     Args:
@@ -106,6 +115,8 @@ def translate_file(
       output_file: file that stores the generated translations.
       print_all_translations: If true, all translations are printed to stdout.
       subword_option:
+      cache: Optional TranslationCache. Cached lines are not sent to the
+        estimator, and new translations are added to the cache.
     Raises:
       ValueError: if output file is invalid.
     """
@@ -114,17 +125,25 @@ def translate_file(
     # Read and sort inputs by length. Keep dictionary (original index-->new index
     # in sorted list) to write translations in the original order.
     sorted_inputs, sorted_keys = _get_sorted_inputs(input_file)
-    num_decode_batches = (len(sorted_inputs) - 1) // batch_size + 1
+
+    # Only the lines that are not in the cache are sent to the estimator.
+    translations = [None] * len(sorted_inputs)
+    if cache is not None:
+        translations = [cache.get(line) for line in sorted_inputs]
+    uncached_indices = [i for i, t in enumerate(translations) if t is None]
+    uncached_inputs = [sorted_inputs[i] for i in uncached_indices]
+    num_decode_batches = (len(uncached_inputs) - 1) // batch_size + 1
+    encoded_inputs = vocab_helper.encode_batch(uncached_inputs, add_eos=True)
 
     def input_generator():
         """Yield encoded strings from sorted_inputs."""
-        for i, line in enumerate(sorted_inputs):
+        for i, encoded_input in enumerate(encoded_inputs):
             if i % batch_size == 0:
                 batch_num = (i // batch_size) + 1
 
                 tf.logging.info("Decoding batch %d out of %d." %
                                 (batch_num, num_decode_batches))
-            yield _encode_and_add_eos(line, vocab_helper)
+            yield encoded_input
 
     def input_fn():
         """Created batched dataset of encoded inputs."""
@@ -133,14 +152,32 @@ def translate_file(
         ds = ds.padded_batch(batch_size, [None])
         return ds
 
-    translations = []
-    for i, prediction in enumerate(estimator.predict(input_fn)):
-        translation = _trim_and_decode(prediction["outputs"], vocab_helper, subword_option)
-        translations.append(translation)
-
-        if print_all_translations:
-            tf.logging.info("Translating:\n\tInput: %s\n\tOutput: %s" %
-                            (sorted_inputs[i], translation))
+    # Decode the predictions a whole batch at a time. Instrumented models
+    # (params["instrument_decode"]) also return the beam search stats.
+    num_translated = 0
+    stats = decode_stats.DecodeStats()
+    start = time.time()
+    if uncached_inputs:
+        for predictions in estimator.predict(input_fn, yield_single_examples=False):
+            if "loop_steps" in predictions:
+                stats.add_batch(predictions)
+            for translation in _trim_and_decode_batch(
+                    predictions["outputs"], vocab_helper, subword_option):
+                index = uncached_indices[num_translated]
+                num_translated += 1
+                translations[index] = translation
+                if cache is not None:
+                    cache.put(sorted_inputs[index], translation)
+
+                if print_all_translations:
+                    tf.logging.info("Translating:\n\tInput: %s\n\tOutput: %s" %
+                                    (sorted_inputs[index], translation))
+
+    stats.log_report(time.time() - start)
+
+    if cache is not None:
+        cache.flush()
+        cache.log_stats()
 
     # Write translations in the order they appeared in the original file.
     if output_file is not None:
@@ -153,18 +190,24 @@ def translate_file(
                 f.write("%s\n" % translations[i])
 
 
-def translate_text(estimator, vocab_helper, txt, subword_option=None):
+def translate_text(estimator, vocab_helper, txt, subword_option=None,
+                   cache=None):
     """Translate a single string."""
-    encoded_txt = _encode_and_add_eos(txt, vocab_helper)
-
-    def input_fn():
-        ds = tf.data.Dataset.from_tensors(encoded_txt)
-        ds = ds.batch(_DECODE_BATCH_SIZE)
-        return ds
-
-    predictions = estimator.predict(input_fn)
-    translation = next(predictions)["outputs"]
-    translation = _trim_and_decode(translation, vocab_helper, subword_option)
+    translation = cache.get(txt) if cache is not None else None
+    if translation is None:
+        encoded_txt = vocab_helper.encode_batch([txt], add_eos=True)[0]
+
+        def input_fn():
+            ds = tf.data.Dataset.from_tensors(encoded_txt)
+            ds = ds.batch(_DECODE_BATCH_SIZE)
+            return ds
+
+        predictions = estimator.predict(input_fn)
+        translation = next(predictions)["outputs"]
+        translation = _trim_and_decode_batch(
+            [translation], vocab_helper, subword_option)[0]
+        if cache is not None:
+            cache.put(txt, translation)
     tf.logging.info("Translation of \"%s\": \"%s\"" % (txt, translation))
 
 
@@ -186,13 +229,26 @@ def main(unused_argv):
     params["alpha"] = _ALPHA
     params["extra_decode_length"] = _EXTRA_DECODE_LENGTH
     params["batch_size"] = _DECODE_BATCH_SIZE
+    params["instrument_decode"] = FLAGS.instrument_decode
     estimator = tf.estimator.Estimator(
         model_fn=transformer_subword.model_fn, model_dir=FLAGS.model_dir,
         params=params)
 
+    cache = None
+    if FLAGS.cache_size or FLAGS.cache_file:
+        signature = translation_cache.make_signature(
+            estimator.latest_checkpoint(), beam_size=params["beam_size"],
+            alpha=params["alpha"],
+            extra_decode_length=params["extra_decode_length"],
+            subword_option=FLAGS.subword_option)
+        cache = translation_cache.TranslationCache(
+            signature, capacity=FLAGS.cache_size, ttl=FLAGS.cache_ttl,
+            db_path=FLAGS.cache_file)
+
     if FLAGS.text is not None:
         tf.logging.info("Translating text: %s" % FLAGS.text)
-        translate_text(estimator, vocab_helper, FLAGS.text, FLAGS.subword_option)
+        translate_text(estimator, vocab_helper, FLAGS.text, FLAGS.subword_option,
+                       cache)
 
     if FLAGS.file is not None:
         input_file = os.path.abspath(FLAGS.file)
@@ -205,7 +261,11 @@ def main(unused_argv):
             output_file = os.path.abspath(FLAGS.file_out)
             tf.logging.info("File output specified: %s" % output_file)
 
-        translate_file(estimator, vocab_helper, input_file, output_file, FLAGS.subword_option)
+        translate_file(estimator, vocab_helper, input_file, output_file,
+                       FLAGS.subword_option, cache=cache)
+
+    if cache is not None:
+        cache.close()
 
 
 def define_translate_flags():
@@ -250,6 +310,31 @@ def define_translate_flags():
         name="file_out", default=None,
         help=flags_core.help_wrap(
             "If --file flag is specified, save translation to this file."))
+    flags.DEFINE_bool(
+        name="instrument_decode", default=False,
+        help=flags_core.help_wrap(
+            "If set, record the beam search loop iterations and the number of "
+            "alive and finished beams at every step, and log a report of the "
+            "decode steps per sentence, the steps wasted after EOS and the "
+            "effective tokens/sec of --file."))
+
+    # Translation cache flags
+    flags.DEFINE_integer(
+        name="cache_size", default=0,
+        help=flags_core.help_wrap(
+            "Maximum number of translations kept in the in-memory translation "
+            "cache. Translations are cached by normalized source sentence, model "
+            "checkpoint and decoding parameters."))
+    flags.DEFINE_string(
+        name="cache_file", default=None,
+        help=flags_core.help_wrap(
+            "Path of a SQLite database used as on-disk translation cache. It may "
+            "be shared across runs."))
+    flags.DEFINE_float(
+        name="cache_ttl", default=None,
+        help=flags_core.help_wrap(
+            "Number of seconds after which cached translations expire. By "
+            "default, cached translations never expire."))
 
 
 if __name__ == "__main__":
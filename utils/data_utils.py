@@ -7,7 +7,7 @@ def train_input_fn(params, num_workers=1, jobid=0):
     tgt_file = "%s.%s" % (params.train_prefix, params.tgt)
     src_vocab_file = params.src_vocab_file
     tgt_vocab_file = params.tgt_vocab_file
-    src_vocab_table, tgt_vocab_table = vocab_utils.create_vocab_tables(
+    src_vocab_table, tgt_vocab_table = vocab_utils.create_lookup_tables(
         src_vocab_file, tgt_vocab_file, params.share_vocab)
 
     src_dataset = tf.data.TextLineDataset(src_file)
@@ -26,15 +26,17 @@ def train_input_fn(params, num_workers=1, jobid=0):
                           tgt_max_len=params.tgt_max_len,
                           num_shards=num_workers,
                           shard_index=jobid)
-    batched_iter = dataset.make_one_shot_iterator()
-    return batched_iter.get_next()
+    # The lookup tables are stateful, so the dataset can not be iterated with a
+    # one-shot iterator. The Estimator initializes both the tables and the
+    # iterator of the returned dataset.
+    return dataset
 
 
 def eval_input_fn(params):
     src_vocab_file = params.src_vocab_file
     tgt_vocab_file = params.tgt_vocab_file
 
-    src_vocab_table, tgt_vocab_table = vocab_utils.create_vocab_tables(
+    src_vocab_table, tgt_vocab_table = vocab_utils.create_lookup_tables(
         src_vocab_file, tgt_vocab_file, params.share_vocab)
     src_file_placeholder = tf.placeholder(shape=(), dtype=tf.string)
     tgt_file_placeholder = tf.placeholder(shape=(), dtype=tf.string)
@@ -52,42 +54,13 @@ def eval_input_fn(params):
         num_buckets=params.num_buckets,
         src_max_len=params.src_max_len_infer,
         tgt_max_len=params.tgt_max_len_infer)
-    batched_iter = dataset.make_one_shot_iterator()
-    return batched_iter.get_next()
+    return dataset
 
 
-def get_dataset(src_dataset,
-                tgt_dataset,
-                src_vocab_table,
-                tgt_vocab_table,
-                batch_size,
-                sos,
-                eos,
-                random_seed,
-                num_buckets,
-                src_max_len=None,
-                tgt_max_len=None,
-                num_parallel_calls=4,
-                output_buffer_size=None,
-                skip_count=None,
-                num_shards=1,
-                shard_index=0,
-                reshuffle_each_iteration=True):
-    if not output_buffer_size:
-        output_buffer_size = batch_size * 1000
-    src_eos_id = tf.cast(src_vocab_table.lookup(tf.constant(eos)), tf.int32)
-    tgt_sos_id = tf.cast(tgt_vocab_table.lookup(tf.constant(sos)), tf.int32)
-    tgt_eos_id = tf.cast(tgt_vocab_table.lookup(tf.constant(eos)), tf.int32)
-
-    src_tgt_dataset = tf.data.Dataset.zip((src_dataset, tgt_dataset))
-
-    src_tgt_dataset = src_tgt_dataset.shard(num_shards, shard_index)
-    if skip_count is not None:
-        src_tgt_dataset = src_tgt_dataset.skip(skip_count)
-
-    src_tgt_dataset = src_tgt_dataset.shuffle(
-        output_buffer_size, random_seed, reshuffle_each_iteration)
-
+def _process_examples(src_tgt_dataset, src_vocab_table, tgt_vocab_table,
+                      tgt_sos_id, tgt_eos_id, src_max_len, tgt_max_len,
+                      num_parallel_calls, output_buffer_size):
+    """Convert pairs of text lines to (src, tgt_in, tgt_out, src_len, tgt_len)."""
     src_tgt_dataset = src_tgt_dataset.map(
         lambda src, tgt: (
             tf.string_split([src]).values, tf.string_split([tgt]).values),
@@ -122,11 +95,185 @@ def get_dataset(src_dataset,
         lambda src, tgt_in, tgt_out: (
             src, tgt_in, tgt_out, tf.size(src), tf.size(tgt_in)),
         num_parallel_calls=num_parallel_calls).prefetch(output_buffer_size)
+    return src_tgt_dataset
+
+
+def _process_examples_fused(src_tgt_dataset, src_vocab_table, tgt_vocab_table,
+                            tgt_sos_id, tgt_eos_id, src_max_len, tgt_max_len,
+                            num_parallel_calls, output_buffer_size):
+    """Same as _process_examples, with all the per-example work in one map."""
+    def process(src, tgt):
+        src = tf.string_split([src]).values
+        tgt = tf.string_split([tgt]).values
+        if src_max_len:
+            src = src[:src_max_len]
+        if tgt_max_len:
+            tgt = tgt[:tgt_max_len]
+        src = tf.cast(src_vocab_table.lookup(src), tf.int32)
+        tgt = tf.cast(tgt_vocab_table.lookup(tgt), tf.int32)
+        tgt_in = tf.concat(([tgt_sos_id], tgt), 0)
+        tgt_out = tf.concat((tgt, [tgt_eos_id]), 0)
+        return src, tgt_in, tgt_out, tf.size(src), tf.size(tgt_in)
+
+    src_tgt_dataset = src_tgt_dataset.map(
+        process, num_parallel_calls=num_parallel_calls)
+    # Filter zero length input sequences. Truncation never empties a sequence,
+    # and tgt_in always starts with <sos>.
+    src_tgt_dataset = src_tgt_dataset.filter(
+        lambda src, tgt_in, tgt_out, src_len, tgt_len: tf.logical_and(
+            src_len > 0, tgt_len > 1))
+    return src_tgt_dataset.prefetch(output_buffer_size)
+
+
+def _lookup_lines(lines, vocab_table, max_len, pad_id):
+    """Split and look up a batch of lines.
+
+    Returns:
+      int32 ids padded with pad_id [batch_size, max line length], and int32
+      line lengths [batch_size], both truncated to max_len tokens.
+    """
+    tokens = tf.string_split(lines)
+    ids = tf.sparse_to_dense(
+        tokens.indices, tokens.dense_shape,
+        tf.cast(vocab_table.lookup(tokens.values), tf.int32),
+        default_value=pad_id)
+    lengths = tf.unsorted_segment_sum(
+        tf.ones_like(tokens.values, dtype=tf.int32),
+        tf.to_int32(tokens.indices[:, 0]), tf.size(lines))
+    if max_len:
+        ids = ids[:, :max_len]
+        lengths = tf.minimum(lengths, max_len)
+    return ids, lengths
+
+
+def _process_batches(src_tgt_dataset, batch_size, src_vocab_table,
+                     tgt_vocab_table, src_eos_id, tgt_sos_id, tgt_eos_id,
+                     src_max_len, tgt_max_len, num_parallel_calls):
+    """Batch pairs of text lines, then split and look them up per batch.
+
+    Produces the same batches as _process_examples followed by padded_batch
+    with the same padding values, except that the pairs with an empty line
+    are removed from the batches instead of before batching (so a batch can
+    have fewer than batch_size pairs).
+    """
+    def process(src_lines, tgt_lines):
+        src, src_len = _lookup_lines(
+            src_lines, src_vocab_table, src_max_len, src_eos_id)
+        tgt, tgt_len = _lookup_lines(
+            tgt_lines, tgt_vocab_table, tgt_max_len, tgt_eos_id)
+
+        # Padding positions already hold <eos>, so appending one more <eos>
+        # column ends every target sequence with <eos>.
+        rows = tf.shape(tgt)[:1]
+        tgt_in = tf.concat([tf.expand_dims(tf.fill(rows, tgt_sos_id), 1), tgt], 1)
+        tgt_out = tf.concat([tgt, tf.expand_dims(tf.fill(rows, tgt_eos_id), 1)], 1)
+
+        keep = tf.logical_and(src_len > 0, tgt_len > 0)
+        return tuple(tf.boolean_mask(t, keep) for t in
+                     (src, tgt_in, tgt_out, src_len, tgt_len + 1))
+
+    src_tgt_dataset = src_tgt_dataset.batch(batch_size)
+    src_tgt_dataset = src_tgt_dataset.map(
+        process, num_parallel_calls=num_parallel_calls)
+    return src_tgt_dataset.prefetch(num_parallel_calls)
+
+
+def _get_bucket_batch_sizes(batch_tokens, num_buckets, bucket_width,
+                            src_max_len=None, tgt_max_len=None):
+    """Return the number of pairs per batch of each length bucket.
+
+    Bucket i < num_buckets holds pairs whose longest sequence (tgt_len counts
+    <sos>) has fewer than (i + 1) * bucket_width tokens. The last bucket holds
+    the longer pairs, up to the maximum lengths if they are known.
+    """
+    bucket_max_lengths = [(i + 1) * bucket_width for i in range(num_buckets)]
+    if src_max_len and tgt_max_len:
+        last_bucket_max_length = max(src_max_len, tgt_max_len + 1)
+    else:
+        last_bucket_max_length = (num_buckets + 1) * bucket_width
+    bucket_max_lengths.append(max(last_bucket_max_length, bucket_max_lengths[-1]))
+    return [max(batch_tokens // length, 1) for length in bucket_max_lengths]
+
+
+def get_padding_ratio(batch):
+    """Return the fraction of padding tokens in a batch from get_dataset.
+
+    Args:
+      batch: Tuple of (src, tgt_in, tgt_out, src_len, tgt_len) tensors.
+
+    Returns:
+      float32 scalar tensor. Source and target tokens are counted together.
+    """
+    src, tgt_in, _, src_len, tgt_len = batch
+    real_tokens = tf.reduce_sum(src_len) + tf.reduce_sum(tgt_len)
+    padded_tokens = tf.size(src) + tf.size(tgt_in)
+    return 1. - tf.to_float(real_tokens) / tf.to_float(tf.maximum(padded_tokens, 1))
+
+
+def get_dataset(src_dataset,
+                tgt_dataset,
+                src_vocab_table,
+                tgt_vocab_table,
+                batch_size,
+                sos,
+                eos,
+                random_seed,
+                num_buckets,
+                src_max_len=None,
+                tgt_max_len=None,
+                num_parallel_calls=4,
+                output_buffer_size=None,
+                skip_count=None,
+                num_shards=1,
+                shard_index=0,
+                reshuffle_each_iteration=True,
+                fused=False,
+                batch_tokens=None):
+    """Return a dataset of batched (src, tgt_in, tgt_out, src_len, tgt_len).
+
+    If fused, the per-example work (split, truncate, lookup, add <sos>/<eos>)
+    is done in a single map instead of a chain of maps with their own prefetch
+    buffers. Without bucketing (num_buckets <= 1), the lines are also batched
+    before being split and looked up a whole batch at a time.
+
+    If batch_tokens is set, each length bucket gets its own batch size, such
+    that bucket_batch_size * bucket_max_length <= batch_tokens (like
+    dataset._batch_examples). batch_size is then only used to size the shuffle
+    and prefetch buffers.
+    """
+    if batch_tokens and num_buckets <= 1:
+        raise ValueError("Token-budget batching requires num_buckets > 1.")
+    if not output_buffer_size:
+        output_buffer_size = batch_size * 1000
+    src_eos_id = tf.cast(src_vocab_table.lookup(tf.constant(eos)), tf.int32)
+    tgt_sos_id = tf.cast(tgt_vocab_table.lookup(tf.constant(sos)), tf.int32)
+    tgt_eos_id = tf.cast(tgt_vocab_table.lookup(tf.constant(eos)), tf.int32)
+
+    src_tgt_dataset = tf.data.Dataset.zip((src_dataset, tgt_dataset))
+
+    src_tgt_dataset = src_tgt_dataset.shard(num_shards, shard_index)
+    if skip_count is not None:
+        src_tgt_dataset = src_tgt_dataset.skip(skip_count)
+
+    src_tgt_dataset = src_tgt_dataset.shuffle(
+        output_buffer_size, random_seed, reshuffle_each_iteration)
+
+    if fused and num_buckets <= 1:
+        return _process_batches(
+            src_tgt_dataset, batch_size, src_vocab_table, tgt_vocab_table,
+            src_eos_id, tgt_sos_id, tgt_eos_id, src_max_len, tgt_max_len,
+            num_parallel_calls)
+
+    process_fn = _process_examples_fused if fused else _process_examples
+    src_tgt_dataset = process_fn(
+        src_tgt_dataset, src_vocab_table, tgt_vocab_table, tgt_sos_id,
+        tgt_eos_id, src_max_len, tgt_max_len, num_parallel_calls,
+        output_buffer_size)
 
     # Bucket by source sequence length (buckets for lengths 0-9, 10-19, ...)
-    def batching_func(x):
+    def batching_func(x, bucket_batch_size=batch_size):
         return x.padded_batch(
-            batch_size,
+            bucket_batch_size,
             # The first three entries are the source and target line rows;
             # these have unknown-length vectors.  The last two entries are
             # the source and target row sizes; these are scalars.
@@ -147,28 +294,46 @@ def get_dataset(src_dataset,
                 0))  # tgt_len -- unused
 
     if num_buckets > 1:
+        # Calculate bucket_width by maximum source sequence length.
+        # Pairs with length [0, bucket_width) go to bucket 0, length
+        # [bucket_width, 2 * bucket_width) go to bucket 1, etc.  Pairs with length
+        # over ((num_bucket-1) * bucket_width) words all go into the last bucket.
+        if src_max_len:
+            bucket_width = (src_max_len + num_buckets - 1) // num_buckets
+        else:
+            bucket_width = 10
 
         def key_func(unused_1, unused_2, unused_3, src_len, tgt_len):
-            # Calculate bucket_width by maximum source sequence length.
-            # Pairs with length [0, bucket_width) go to bucket 0, length
-            # [bucket_width, 2 * bucket_width) go to bucket 1, etc.  Pairs with length
-            # over ((num_bucket-1) * bucket_width) words all go into the last bucket.
-            if src_max_len:
-                bucket_width = (src_max_len + num_buckets - 1) // num_buckets
-            else:
-                bucket_width = 10
-
             # Bucket sentence pairs by the length of their source sentence and target
             # sentence.
             bucket_id = tf.maximum(src_len // bucket_width, tgt_len // bucket_width)
             return tf.to_int64(tf.minimum(num_buckets, bucket_id))
 
-        def reduce_func(unused_key, windowed_data):
-            return batching_func(windowed_data)
+        if batch_tokens:
+            bucket_batch_sizes = tf.constant(
+                _get_bucket_batch_sizes(batch_tokens, num_buckets, bucket_width,
+                                        src_max_len, tgt_max_len),
+                dtype=tf.int64)
+
+            def window_size_func(bucket_id):
+                return bucket_batch_sizes[bucket_id]
+
+            def reduce_func(bucket_id, windowed_data):
+                return batching_func(windowed_data, window_size_func(bucket_id))
+
+            batched_dataset = src_tgt_dataset.apply(
+                tf.contrib.data.group_by_window(
+                    key_func=key_func, reduce_func=reduce_func, window_size=None,
+                    window_size_func=window_size_func))
+        else:
+
+            def reduce_func(unused_key, windowed_data):
+                return batching_func(windowed_data)
 
-        batched_dataset = src_tgt_dataset.apply(
-            tf.contrib.data.group_by_window(
-                key_func=key_func, reduce_func=reduce_func, window_size=batch_size))
+            batched_dataset = src_tgt_dataset.apply(
+                tf.contrib.data.group_by_window(
+                    key_func=key_func, reduce_func=reduce_func,
+                    window_size=batch_size))
 
     else:
         batched_dataset = batching_func(src_tgt_dataset)
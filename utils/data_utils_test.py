@@ -0,0 +1,114 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the text input pipeline."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from utils import data_utils
+from utils import vocab_utils
+
+_WORDS = ["a", "b", "c", "d"]
+_SRC_LINES = ["a b c", "d", "a a a a a a", "b c", "c d a b", "d d"]
+_TGT_LINES = ["b", "c d e", "a b", "d c b a", "a", "b b b b b"]
+
+
+class GetDatasetTest(tf.test.TestCase):
+
+    def _read_batches(self, fused, num_buckets, src_lines=_SRC_LINES,
+                      tgt_lines=_TGT_LINES, batch_tokens=None):
+        vocab_file = os.path.join(self.get_temp_dir(), "vocab")
+        with tf.gfile.Open(vocab_file, "w") as f:
+            f.write("\n".join([vocab_utils.UNK, vocab_utils.SOS, vocab_utils.EOS] +
+                              _WORDS) + "\n")
+
+        with tf.Graph().as_default():
+            src_vocab_table, tgt_vocab_table = vocab_utils.create_lookup_tables(
+                vocab_file, vocab_file, share_vocab=True)
+            ds = data_utils.get_dataset(
+                tf.data.Dataset.from_tensor_slices(src_lines),
+                tf.data.Dataset.from_tensor_slices(tgt_lines),
+                src_vocab_table, tgt_vocab_table, batch_size=2,
+                sos=vocab_utils.SOS, eos=vocab_utils.EOS, random_seed=1,
+                num_buckets=num_buckets, src_max_len=4, tgt_max_len=3,
+                fused=fused, batch_tokens=batch_tokens)
+            iterator = ds.make_initializable_iterator()
+            next_element = iterator.get_next()
+            batches = []
+            with tf.Session() as sess:
+                sess.run([tf.tables_initializer(), iterator.initializer])
+                while True:
+                    try:
+                        batches.append(sess.run(next_element))
+                    except tf.errors.OutOfRangeError:
+                        return batches
+
+    def _assert_same_batches(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for expected_batch, actual_batch in zip(expected, actual):
+            for expected_tensor, actual_tensor in zip(expected_batch, actual_batch):
+                self.assertAllEqual(expected_tensor, actual_tensor)
+
+    def test_fused_batches_match_unfused(self):
+        self._assert_same_batches(self._read_batches(False, num_buckets=1),
+                                  self._read_batches(True, num_buckets=1))
+
+    def test_fused_buckets_match_unfused(self):
+        self._assert_same_batches(self._read_batches(False, num_buckets=3),
+                                  self._read_batches(True, num_buckets=3))
+
+    def test_fused_batches_drop_empty_lines(self):
+        batches = self._read_batches(
+            True, num_buckets=1, src_lines=["a", "", "b c"],
+            tgt_lines=["a b", "c", " "])
+        self.assertEqual(1, sum(len(batch[0]) for batch in batches))
+
+        src, tgt_in, tgt_out, src_len, tgt_len = [
+            batch for batch in batches if len(batch[0])][0]
+        self.assertAllEqual([[4]], src)
+        self.assertAllEqual([[vocab_utils.SOS_ID, 4, 5]], tgt_in)
+        self.assertAllEqual([[4, 5, vocab_utils.EOS_ID]], tgt_out)
+        self.assertAllEqual([1], src_len)
+        self.assertAllEqual([3], tgt_len)
+
+    def test_bucket_batch_sizes(self):
+        # Buckets of lengths < 2, < 4, < 6, and the longest pairs (up to 4 source
+        # tokens and 3 + 1 target tokens).
+        self.assertEqual([4, 2, 1, 1], data_utils._get_bucket_batch_sizes(
+            8, num_buckets=3, bucket_width=2, src_max_len=4, tgt_max_len=3))
+
+    def test_token_budget_batches(self):
+        batches = self._read_batches(False, num_buckets=3, batch_tokens=8)
+
+        self.assertEqual(len(_SRC_LINES), sum(len(batch[0]) for batch in batches))
+        for src, tgt_in, tgt_out, _, _ in batches:
+            self.assertLessEqual(len(src) * src.shape[1], 8)
+            self.assertLessEqual(len(tgt_in) * tgt_in.shape[1], 8)
+            self.assertEqual(tgt_in.shape, tgt_out.shape)
+
+    def test_padding_ratio(self):
+        batch = (tf.constant([[4, 5], [4, 2]]), tf.constant([[1, 4, 5], [1, 2, 2]]),
+                 None, tf.constant([2, 1]), tf.constant([3, 1]))
+        with self.test_session() as sess:
+            self.assertAllClose(3. / 10, sess.run(data_utils.get_padding_ratio(batch)))
+
+
+if __name__ == "__main__":
+    tf.test.main()
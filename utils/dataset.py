@@ -45,6 +45,32 @@ Two things to note in the pipeline:
    is the list of training files. Second, while reading records using
    `parallel_interleave`, the `sloppy` argument is used to generate randomness
    in the order of the examples.
+
+3. Resumable input
+
+   When `params["checkpoint_input_pipeline"]` is set, the training pipeline is
+   made deterministic: the file list is shuffled with a fixed seed, records are
+   interleaved in a fixed order, and the dataset is repeated indefinitely. The
+   position of the input iterator can then be saved alongside the model
+   checkpoints (see `tf.contrib.data.CheckpointInputPipelineHook`), so that each
+   call to `estimator.train` continues where the previous one stopped instead of
+   re-reading the first shards.
+
+4. Multi-worker sharding
+
+   When several workers train on the same files, each worker only reads its
+   own share of the data. The files are assigned to the workers in a round
+   robin order before they are shuffled. When there are fewer files than
+   workers, every worker reads all the files in the same order, and keeps
+   every `num_workers`-th record starting at its `worker_index`.
+
+5. Synthetic data
+
+   When `params["use_synthetic_data"]` is set, no file is read. The same batch
+   of constant tokens is repeated forever, with the shape that `_batch_examples`
+   gives to batches of `params["synthetic_length"]` tokens (by default
+   `params["max_length"]`). This isolates the model compute from the input
+   pipeline. Evaluation stops after `_SYNTHETIC_EVAL_BATCHES` batches.
 """
 
 from __future__ import absolute_import
@@ -55,6 +81,8 @@ import os
 
 import tensorflow as tf
 
+from comm_utils.misc import model_helpers
+
 # Buffer size for reading records from a TFRecord file. Each training file is
 # 7.2 MB, so 8 MB allows an entire file to be kept in memory.
 _READ_RECORD_BUFFER = 8 * 1000 * 1000
@@ -64,6 +92,16 @@ _READ_RECORD_BUFFER = 8 * 1000 * 1000
 _MIN_BOUNDARY = 8
 _BOUNDARY_SCALE = 1.1
 
+# Seed used to shuffle the list of training files when the input pipeline must
+# be deterministic (e.g. when its state is saved in the checkpoints).
+_FILE_SHUFFLE_SEED = 20180807
+
+# Token id of the synthetic examples. Any id other than the padding id (0) works.
+_SYNTHETIC_TOKEN_ID = 1
+# Number of synthetic batches per evaluation, since evaluation stops at the end
+# of the dataset.
+_SYNTHETIC_EVAL_BATCHES = 100
+
 
 def _load_records(filename):
     """Read file and return a dataset of tf.Examples."""
@@ -188,7 +226,8 @@ def _batch_examples(dataset, batch_size, max_length):
 
 
 def _read_and_batch_from_files(
-    file_pattern, batch_size, max_length, num_parallel_calls, shuffle, repeat):
+    file_pattern, batch_size, max_length, num_parallel_calls, shuffle, repeat,
+    deterministic=False, num_workers=1, worker_index=0, cycle_length=None):
     """Create dataset where each item is a dict of "inputs" and "targets".
 
     Args:
@@ -199,17 +238,50 @@ def _read_and_batch_from_files(
       shuffle: If true, randomizes order of elements.
       repeat: Number of times to repeat the dataset. If None, the dataset is
         repeated forever.
+      deterministic: If true, the files are shuffled with a fixed seed and the
+        records are interleaved in a fixed order, so that the pipeline produces
+        the same sequence of batches every time it is created. This is required
+        to save and restore the state of the input iterator.
+      num_workers: Number of workers reading from the same files.
+      worker_index: Index of this worker, in the range [0, num_workers).
+      cycle_length: Number of files read concurrently. Defaults to
+        num_parallel_calls.
 
     Returns:
       tf.data.Dataset object containing examples loaded from the files.
     """
-    dataset = tf.data.Dataset.list_files(file_pattern)
+    shard_files = shard_records = False
+    if num_workers > 1:
+        num_files = len(tf.gfile.Glob(file_pattern))
+        shard_files = num_files >= num_workers
+        shard_records = not shard_files
+
+    if shard_files:
+        # Assign the files to workers before shuffling, so that the workers read
+        # disjoint subsets of the files.
+        dataset = tf.data.Dataset.list_files(file_pattern, shuffle=False)
+        dataset = dataset.shard(num_workers, worker_index)
+        if shuffle:
+            dataset = dataset.shuffle(
+                num_files, seed=_FILE_SHUFFLE_SEED if deterministic else None)
+    elif deterministic or shard_records:
+        # When sharding records, all workers must list the files in the same
+        # order, which is guaranteed by the fixed seed.
+        dataset = tf.data.Dataset.list_files(
+            file_pattern, shuffle=shuffle, seed=_FILE_SHUFFLE_SEED)
+    else:
+        dataset = tf.data.Dataset.list_files(file_pattern)
 
     # Read files and interleave results. When training, the order of the examples
-    # will be non-deterministic.
+    # will be non-deterministic unless a deterministic pipeline was requested, or
+    # the records are sharded between workers.
     dataset = dataset.apply(
         tf.contrib.data.parallel_interleave(
-            _load_records, sloppy=shuffle, cycle_length=num_parallel_calls))
+            _load_records, sloppy=shuffle and not (deterministic or shard_records),
+            cycle_length=cycle_length or num_parallel_calls))
+
+    if shard_records:
+        dataset = dataset.shard(num_workers, worker_index)
 
     # Parse each tf.Example into a dictionary
     dataset = dataset.map(_parse_example,
@@ -224,16 +296,48 @@ def _read_and_batch_from_files(
     return dataset
 
 
+def _get_bucket_batch_size(length, batch_size, max_length):
+    """Return the number of examples that _batch_examples groups by length."""
+    buckets_min, buckets_max = _create_min_max_boundaries(max_length)
+    for bucket_min, bucket_max in zip(buckets_min, buckets_max):
+        if bucket_min <= length < bucket_max:
+            return max(batch_size // bucket_max, 1)
+    raise ValueError("Length %d is larger than the maximum length %d." %
+                     (length, max_length))
+
+
+def _generate_synthetic_data(params):
+    """Create a repeating dataset of constant batches of examples.
+
+    The batches have the shape [group_batch_size, synthetic_length] of the
+    batches that _batch_examples produces from examples of that length.
+    """
+    length = params["synthetic_length"] or params["max_length"]
+    group_batch_size = _get_bucket_batch_size(
+        length, params["batch_size"], params["max_length"])
+    shape = tf.TensorShape([group_batch_size, length])
+    return model_helpers.generate_synthetic_data(
+        input_shape=shape, input_value=_SYNTHETIC_TOKEN_ID, input_dtype=tf.int64,
+        label_shape=shape, label_value=_SYNTHETIC_TOKEN_ID, label_dtype=tf.int64)
+
+
 def train_input_fn(params):
     """Load and return dataset of batched examples for use during training."""
+    if params["use_synthetic_data"]:
+        return _generate_synthetic_data(params)
     file_pattern = os.path.join(params["data_dir"] or "", "*train*")
     return _read_and_batch_from_files(
         file_pattern, params["batch_size"], params["max_length"],
-        params["num_parallel_calls"], shuffle=True, repeat=params["repeat_dataset"])
+        params["num_parallel_calls"], shuffle=True, repeat=params["repeat_dataset"],
+        deterministic=bool(params["checkpoint_input_pipeline"]),
+        num_workers=params["num_workers"] or 1,
+        worker_index=params["worker_index"] or 0)
 
 
 def eval_input_fn(params):
     """Load and return dataset of batched examples for use during evaluation."""
+    if params["use_synthetic_data"]:
+        return _generate_synthetic_data(params).take(_SYNTHETIC_EVAL_BATCHES)
     file_pattern = os.path.join(params["data_dir"] or "", "*dev*")
     return _read_and_batch_from_files(
         file_pattern, params["batch_size"], params["max_length"],
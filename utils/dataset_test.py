@@ -0,0 +1,197 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test input pipeline for the transformer model."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import multiprocessing
+import os
+import time
+
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from utils import dataset
+
+_NUM_FILES = 4
+_EXAMPLES_PER_FILE = 25
+
+
+def _write_shards(data_dir, num_files=_NUM_FILES,
+                  examples_per_file=_EXAMPLES_PER_FILE):
+    """Write TFRecord shards where the first input token identifies an example."""
+    for n in range(num_files):
+        filename = os.path.join(data_dir, "test-train-%.5d" % n)
+        with tf.python_io.TFRecordWriter(filename) as writer:
+            for i in range(examples_per_file):
+                example_id = n * examples_per_file + i + 1
+                features = {
+                    "inputs": tf.train.Feature(int64_list=tf.train.Int64List(
+                        value=[example_id, 1])),
+                    "targets": tf.train.Feature(int64_list=tf.train.Int64List(
+                        value=[example_id % 7 + 2, 1]))}
+                example = tf.train.Example(
+                    features=tf.train.Features(feature=features))
+                writer.write(example.SerializeToString())
+    return os.path.join(data_dir, "*train*")
+
+
+def _read_example_ids(sess, ds, num_batches=None):
+    """Return the ids of the examples produced by the dataset, in order."""
+    next_element = ds.make_one_shot_iterator().get_next()
+    example_ids = []
+    while num_batches is None or num_batches > 0:
+        try:
+            inputs, _ = sess.run(next_element)
+        except tf.errors.OutOfRangeError:
+            break
+        example_ids.extend(inputs[:, 0].tolist())
+        if num_batches is not None:
+            num_batches -= 1
+    return example_ids
+
+
+def _read_worker_shard(args):
+    """Read a worker's shard of the training data in a separate process.
+
+    Returns:
+      Tuple of (ids of the examples read by the worker, elapsed seconds).
+    """
+    file_pattern, num_workers, worker_index = args
+    with tf.Graph().as_default():
+        ds = dataset._read_and_batch_from_files(
+            file_pattern, batch_size=16, max_length=8, num_parallel_calls=2,
+            shuffle=True, repeat=1, num_workers=num_workers,
+            worker_index=worker_index)
+        with tf.Session() as sess:
+            start = time.time()
+            example_ids = _read_example_ids(sess, ds)
+            return example_ids, time.time() - start
+
+
+class DatasetTest(tf.test.TestCase):
+
+    def _make_dataset(self, file_pattern, deterministic):
+        return dataset._read_and_batch_from_files(
+            file_pattern, batch_size=16, max_length=8, num_parallel_calls=2,
+            shuffle=True, repeat=1, deterministic=deterministic)
+
+    def test_deterministic_pipeline_is_repeatable(self):
+        file_pattern = _write_shards(self.get_temp_dir())
+
+        with self.test_session() as sess:
+            first = _read_example_ids(sess, self._make_dataset(file_pattern, True))
+        with self.test_session() as sess:
+            second = _read_example_ids(sess, self._make_dataset(file_pattern, True))
+
+        self.assertEqual(_NUM_FILES * _EXAMPLES_PER_FILE, len(first))
+        self.assertEqual(first, second)
+
+    def test_restored_iterator_continues_from_saved_position(self):
+        file_pattern = _write_shards(self.get_temp_dir())
+        prefix = os.path.join(self.get_temp_dir(), "iterator")
+
+        with tf.Graph().as_default():
+            ds = self._make_dataset(file_pattern, True)
+            iterator = ds.make_initializable_iterator()
+            next_element = iterator.get_next()
+            saveable = tf.contrib.data.make_saveable_from_iterator(iterator)
+            saver = tf.train.Saver([saveable])
+            with tf.Session() as sess:
+                sess.run(iterator.initializer)
+                head = [sess.run(next_element)[0][:, 0].tolist() for _ in range(2)]
+                saver.save(sess, prefix)
+                tail = [sess.run(next_element)[0][:, 0].tolist() for _ in range(2)]
+
+        with tf.Graph().as_default():
+            ds = self._make_dataset(file_pattern, True)
+            iterator = ds.make_initializable_iterator()
+            next_element = iterator.get_next()
+            saveable = tf.contrib.data.make_saveable_from_iterator(iterator)
+            saver = tf.train.Saver([saveable])
+            with tf.Session() as sess:
+                sess.run(iterator.initializer)
+                saver.restore(sess, prefix)
+                restored = [sess.run(next_element)[0][:, 0].tolist()
+                            for _ in range(2)]
+
+        self.assertTrue(head)
+        self.assertEqual(tail, restored)
+
+    def _check_worker_shards(self, num_files, num_workers):
+        data_dir = os.path.join(self.get_temp_dir(), "%d_files" % num_files)
+        tf.gfile.MakeDirs(data_dir)
+        file_pattern = _write_shards(data_dir, num_files=num_files)
+
+        # Each worker runs in its own process, as it would in a real job. Spawn
+        # the processes so that they do not inherit the TensorFlow runtime.
+        pool = multiprocessing.get_context("spawn").Pool(num_workers)
+        try:
+            results = pool.map(
+                _read_worker_shard,
+                [(file_pattern, num_workers, i) for i in range(num_workers)])
+        finally:
+            pool.close()
+            pool.join()
+
+        shards = [set(example_ids) for example_ids, _ in results]
+        for example_ids, shard in zip([r[0] for r in results], shards):
+            self.assertTrue(example_ids)
+            self.assertEqual(len(example_ids), len(shard))
+        for i in range(num_workers):
+            for j in range(i + 1, num_workers):
+                self.assertFalse(shards[i] & shards[j])
+        self.assertEqual(set(range(1, num_files * _EXAMPLES_PER_FILE + 1)),
+                         set.union(*shards))
+
+        num_examples = sum(len(shard) for shard in shards)
+        elapsed = max(seconds for _, seconds in results)
+        tf.logging.info(
+            "%d workers, %d files: %d examples in %.3f sec (%.1f examples/sec)",
+            num_workers, num_files, num_examples, elapsed,
+            num_examples / max(elapsed, 1e-6))
+
+    def test_workers_read_disjoint_files(self):
+        self._check_worker_shards(num_files=4, num_workers=2)
+
+    def test_workers_read_disjoint_records_with_fewer_files(self):
+        self._check_worker_shards(num_files=2, num_workers=3)
+
+    def test_synthetic_batches_have_bucket_shape(self):
+        params = collections.defaultdict(
+            lambda: None, batch_size=2048, max_length=256,
+            use_synthetic_data=True, synthetic_length=20)
+
+        ds = dataset.train_input_fn(params)
+        inputs, targets = ds.make_one_shot_iterator().get_next()
+        with self.test_session() as sess:
+            inputs, targets = sess.run([inputs, targets])
+
+        # Examples of 20 tokens fall in the bucket [20, 22).
+        self.assertAllEqual([2048 // 22, 20], inputs.shape)
+        self.assertAllEqual(inputs.shape, targets.shape)
+        self.assertTrue((inputs != 0).all())
+
+        params["synthetic_length"] = None
+        ds = dataset.eval_input_fn(params)
+        inputs, _ = ds.make_one_shot_iterator().get_next()
+        with self.test_session() as sess:
+            self.assertAllEqual([2048 // 257, 256], sess.run(inputs).shape)
+
+
+if __name__ == "__main__":
+    tf.test.main()
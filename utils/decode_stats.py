@@ -0,0 +1,127 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Aggregate the beam search stats returned by an instrumented Transformer.
+
+The stats are returned with the predictions when params["instrument_decode"] is
+set (see Transformer.predict). All sentences of a batch are decoded together, so
+the search loop keeps running until the slowest sentence of the batch is done;
+the steps run after a sentence emitted its EOS are wasted for that sentence.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from model import beam_search
+
+
+class DecodeStats(object):
+    """Accumulates the decoding stats of batches of predictions."""
+
+    def __init__(self):
+        self.num_batches = 0
+        self.max_length_stops = 0
+        self.loop_steps = 0
+        self._decode_steps = []
+        self._wasted_steps = []
+        self._output_lengths = []
+        self._alive_beams = 0
+        self._finished_beams = 0
+        self._beam_steps = 0
+
+    def add_batch(self, predictions):
+        """Add the stats of a batch of predictions.
+
+        Args:
+          predictions: Dictionary of numpy arrays returned by
+            estimator.predict(yield_single_examples=False).
+        """
+        loop_steps = int(predictions["loop_steps"][0])
+        output_lengths = np.asarray(predictions["output_lengths"])
+
+        self.num_batches += 1
+        self.loop_steps += loop_steps
+        if predictions["stop_reason"][0] == beam_search.STOP_MAX_DECODE_LENGTH:
+            self.max_length_stops += 1
+        self._decode_steps.append(np.asarray(predictions["decode_steps"]))
+        self._wasted_steps.append(loop_steps - output_lengths)
+        self._output_lengths.append(output_lengths)
+
+        alive_beams = np.asarray(predictions["alive_beams"])
+        self._alive_beams += int(alive_beams.sum())
+        self._finished_beams += int(np.asarray(predictions["finished_beams"]).sum())
+        self._beam_steps += alive_beams.size
+
+    @property
+    def num_sentences(self):
+        return sum(len(lengths) for lengths in self._output_lengths)
+
+    @property
+    def num_tokens(self):
+        return sum(int(lengths.sum()) for lengths in self._output_lengths)
+
+    def report(self, elapsed_secs):
+        """Return a dictionary of aggregated stats.
+
+        Args:
+          elapsed_secs: Time spent decoding the batches, used to compute the
+            effective tokens/sec (output tokens, including EOS, per second).
+        """
+        if not self.num_batches:
+            return {}
+        decode_steps = np.concatenate(self._decode_steps)
+        wasted_steps = np.concatenate(self._wasted_steps)
+        sentence_steps = wasted_steps.sum() + self.num_tokens
+        return {
+            "sentences": self.num_sentences,
+            "batches": self.num_batches,
+            "max_length_stops": self.max_length_stops,
+            "loop_steps_per_batch": self.loop_steps / self.num_batches,
+            "decode_steps_mean": float(decode_steps.mean()),
+            "decode_steps_p50": float(np.percentile(decode_steps, 50)),
+            "decode_steps_max": int(decode_steps.max()),
+            "wasted_steps_mean": float(wasted_steps.mean()),
+            "wasted_steps_fraction": float(wasted_steps.sum()) / max(
+                sentence_steps, 1),
+            "alive_beams_mean": self._alive_beams / max(self._beam_steps, 1),
+            "finished_beams_mean": self._finished_beams / max(self._beam_steps, 1),
+            "tokens_per_sec": self.num_tokens / max(elapsed_secs, 1e-9)
+        }
+
+    def log_report(self, elapsed_secs):
+        """Log the aggregated stats."""
+        report = self.report(elapsed_secs)
+        if not report:
+            return
+        tf.logging.info(
+            "Decoded %d sentences in %d batches (%d stopped at the maximum decode "
+            "length), %.1f loop steps per batch." % (
+                report["sentences"], report["batches"], report["max_length_stops"],
+                report["loop_steps_per_batch"]))
+        tf.logging.info(
+            "Decode steps per sentence: mean %.1f, median %.1f, max %d." % (
+                report["decode_steps_mean"], report["decode_steps_p50"],
+                report["decode_steps_max"]))
+        tf.logging.info(
+            "Wasted steps after EOS: %.1f per sentence (%.2f%% of the steps)." % (
+                report["wasted_steps_mean"], 100. * report["wasted_steps_fraction"]))
+        tf.logging.info(
+            "Beams per step: %.2f alive, %.2f finished. Effective speed: %.1f "
+            "tokens/sec." % (
+                report["alive_beams_mean"], report["finished_beams_mean"],
+                report["tokens_per_sec"]))
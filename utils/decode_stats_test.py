@@ -0,0 +1,61 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test aggregation of the beam search stats."""
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from model import beam_search
+from utils import decode_stats
+
+
+def _predictions(loop_steps, decode_steps, output_lengths, stop_reason):
+    batch_size = len(decode_steps)
+    return {
+        "loop_steps": np.full(batch_size, loop_steps),
+        "decode_steps": np.array(decode_steps),
+        "output_lengths": np.array(output_lengths),
+        "alive_beams": np.ones([batch_size, loop_steps], np.int32),
+        "finished_beams": np.zeros([batch_size, loop_steps], np.int32),
+        "stop_reason": np.full(batch_size, stop_reason)}
+
+
+class DecodeStatsTest(tf.test.TestCase):
+
+    def test_report(self):
+        stats = decode_stats.DecodeStats()
+        stats.add_batch(_predictions(
+            10, [4, 10], [3, 10], beam_search.STOP_MAX_DECODE_LENGTH))
+        stats.add_batch(_predictions(
+            6, [6, 5], [5, 4], beam_search.STOP_FINISHED_BEAMS))
+
+        report = stats.report(elapsed_secs=2.)
+        self.assertEqual(4, report["sentences"])
+        self.assertEqual(1, report["max_length_stops"])
+        self.assertEqual(8, report["loop_steps_per_batch"])
+        self.assertEqual(6.25, report["decode_steps_mean"])
+        self.assertEqual(10, report["decode_steps_max"])
+        # Wasted steps: 7, 0, 1 and 2 out of 10 + 10 + 6 + 6 steps.
+        self.assertEqual(2.5, report["wasted_steps_mean"])
+        self.assertAllClose(10. / 32, report["wasted_steps_fraction"])
+        self.assertEqual(11, report["tokens_per_sec"])
+        self.assertEqual(1, report["alive_beams_mean"])
+
+    def test_empty_report(self):
+        self.assertEqual({}, decode_stats.DecodeStats().report(elapsed_secs=1.))
+
+
+if __name__ == "__main__":
+    tf.test.main()
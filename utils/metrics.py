@@ -49,7 +49,20 @@ def _pad_tensors_to_same_length(x, y):
     return x, y
 
 
-def padded_cross_entropy_loss(logits, labels, smoothing, vocab_size):
+def _gather_label_logits(logits, labels):
+  """Return the logits of the labels, with the shape of labels."""
+  flat_logits = tf.reshape(logits, [-1, tf.shape(logits)[-1]])
+  flat_labels = tf.reshape(tf.cast(labels, tf.int64), [-1])
+  # The (position, label) indices are int64, because a flat index into the
+  # logits (position * vocab_size + label) overflows int32 for large batches.
+  indices = tf.stack(
+      [tf.range(tf.size(flat_labels, out_type=tf.int64)), flat_labels], axis=1)
+  label_logits = tf.gather_nd(flat_logits, indices)
+  return tf.reshape(label_logits, tf.shape(labels))
+
+
+def padded_cross_entropy_loss(logits, labels, smoothing, vocab_size,
+                              method="one_hot"):
   """Calculate cross entropy loss while ignoring padding.
 
   Args:
@@ -57,6 +70,10 @@ def padded_cross_entropy_loss(logits, labels, smoothing, vocab_size):
     labels: Tensor of size [batch_size, length_labels]
     smoothing: Label smoothing constant, used to determine the on and off values
     vocab_size: int size of the vocabulary
+    method: "one_hot" computes the cross entropy against a one-hot tensor of
+      soft targets with the shape of the logits. "logsumexp" computes the same
+      value from the logsumexp of the logits, the logit of the label and the
+      sum of the logits, without the soft targets tensor.
   Returns:
     Returns the cross entropy loss and weight tensors: float32 tensors with
       shape [batch_size, max(length_logits, length_labels)]
@@ -68,13 +85,24 @@ def padded_cross_entropy_loss(logits, labels, smoothing, vocab_size):
     with tf.name_scope("smoothing_cross_entropy", [logits, labels]):
       confidence = 1.0 - smoothing
       low_confidence = (1.0 - confidence) / tf.to_float(vocab_size - 1)
-      soft_targets = tf.one_hot(
-          tf.cast(labels, tf.int32),
-          depth=vocab_size,
-          on_value=confidence,
-          off_value=low_confidence)
-      xentropy = tf.nn.softmax_cross_entropy_with_logits_v2(
-          logits=logits, labels=soft_targets)
+      if method == "one_hot":
+        soft_targets = tf.one_hot(
+            tf.cast(labels, tf.int32),
+            depth=vocab_size,
+            on_value=confidence,
+            off_value=low_confidence)
+        xentropy = tf.nn.softmax_cross_entropy_with_logits_v2(
+            logits=logits, labels=soft_targets)
+      elif method == "logsumexp":
+        # -sum_i(q_i * log_softmax(logits)_i), where the soft targets q are
+        # low_confidence everywhere except confidence at the label, is
+        # logsumexp(logits) - sum_i(q_i * logits_i).
+        xentropy = (
+            tf.reduce_logsumexp(logits, axis=-1) -
+            (confidence - low_confidence) * _gather_label_logits(logits, labels)
+            - low_confidence * tf.reduce_sum(logits, axis=-1))
+      else:
+        raise ValueError("Unknown cross entropy method: %s" % method)
 
       # Calculate the best (lowest) possible value of cross entropy, and
       # subtract from the cross entropy loss.
@@ -87,6 +115,156 @@ def padded_cross_entropy_loss(logits, labels, smoothing, vocab_size):
     return xentropy * weights, weights
 
 
+def _chunked_smoothing_cross_entropy(chunked_outputs, softmax_weights,
+                                     chunked_labels, confidence,
+                                     low_confidence):
+  """Return the smoothed cross entropy of every position of every chunk.
+
+  The logits of a chunk are computed in the forward pass to get its cross
+  entropy, and recomputed in the backward pass to get its gradients. Both
+  loops run one chunk at a time (parallel_iterations=1), so that at most the
+  [chunk_size, vocab_size] logits and logits gradients of a single chunk are
+  held at once, e.g. 2 * 1024 * 64k float32 values (512MB) with a 64k
+  vocabulary.
+  """
+  @tf.custom_gradient
+  def xentropy_fn(chunked_outputs, softmax_weights):
+    """Return the cross entropy, and the function computing its gradients."""
+    def chunk_xentropy(args):
+      outputs, labels = args
+      logits = tf.matmul(outputs, softmax_weights, transpose_b=True)
+      return (tf.reduce_logsumexp(logits, axis=-1) -
+              (confidence - low_confidence) *
+              _gather_label_logits(logits, labels) -
+              low_confidence * tf.reduce_sum(logits, axis=-1))
+
+    xentropy = tf.map_fn(
+        chunk_xentropy, (chunked_outputs, chunked_labels), dtype=tf.float32,
+        parallel_iterations=1, back_prop=False)
+
+    def grad_fn(dy):
+      """Accumulate the gradients of the outputs and weights chunk by chunk."""
+      num_chunks = tf.shape(chunked_outputs)[0]
+
+      def body(i, d_outputs, d_weights):
+        logits = tf.matmul(chunked_outputs[i], softmax_weights,
+                           transpose_b=True)
+        # The gradient of the cross entropy w.r.t. the logits is the softmax
+        # minus the soft targets.
+        d_logits = tf.nn.softmax(logits) - tf.one_hot(
+            chunked_labels[i], depth=tf.shape(logits)[-1],
+            on_value=confidence, off_value=low_confidence)
+        d_logits *= tf.expand_dims(dy[i], -1)
+        d_outputs = d_outputs.write(i, tf.matmul(d_logits, softmax_weights))
+        d_weights += tf.matmul(d_logits, chunked_outputs[i], transpose_a=True)
+        return i + 1, d_outputs, d_weights
+
+      _, d_outputs, d_weights = tf.while_loop(
+          lambda i, *_: i < num_chunks, body,
+          [0, tf.TensorArray(tf.float32, size=num_chunks),
+           tf.zeros_like(softmax_weights)],
+          parallel_iterations=1)
+      return d_outputs.stack(), d_weights
+
+    return xentropy, grad_fn
+
+  return xentropy_fn(chunked_outputs, softmax_weights)
+
+
+def chunked_cross_entropy_loss(outputs, softmax_weights, labels, smoothing,
+                               vocab_size, chunk_size=1024):
+  """Calculate cross entropy loss from the pre-softmax outputs, chunk by chunk.
+
+  Gives the same loss as padded_cross_entropy_loss on the logits
+  matmul(outputs, softmax_weights, transpose_b=True), without ever holding the
+  logits of more than chunk_size positions: the [batch_size * length,
+  vocab_size] logits tensor, which dominates the memory of large vocabulary
+  models, is never built in the forward or in the backward pass.
+
+  Args:
+    outputs: Tensor of size [batch_size, length, hidden_size], the decoder
+      outputs that are projected to the logits.
+    softmax_weights: Tensor of size [vocab_size, hidden_size]
+    labels: Tensor of size [batch_size, length]
+    smoothing: Label smoothing constant, used to determine the on and off values
+    vocab_size: int size of the vocabulary
+    chunk_size: int number of positions whose logits are computed together.
+      The logits part of the peak memory is about 2 * chunk_size * vocab_size
+      float32 values, a chunk's logits and their gradients.
+  Returns:
+    Returns the cross entropy loss and weight tensors: float32 tensors with
+      shape [batch_size, length]
+  """
+  with tf.name_scope("chunked_loss", [outputs, softmax_weights, labels]):
+    hidden_size = tf.shape(outputs)[-1]
+    flat_outputs = tf.reshape(outputs, [-1, hidden_size])
+    flat_labels = tf.reshape(tf.cast(labels, tf.int32), [-1])
+
+    # Pad the positions to a multiple of chunk_size.
+    num_positions = tf.shape(flat_labels)[0]
+    num_chunks = (num_positions + chunk_size - 1) // chunk_size
+    num_padding = num_chunks * chunk_size - num_positions
+    chunked_outputs = tf.reshape(
+        tf.pad(flat_outputs, [[0, num_padding], [0, 0]]),
+        [num_chunks, chunk_size, hidden_size])
+    chunked_labels = tf.reshape(
+        tf.pad(flat_labels, [[0, num_padding]]), [num_chunks, chunk_size])
+
+    with tf.name_scope("smoothing_cross_entropy"):
+      confidence = 1.0 - smoothing
+      low_confidence = (1.0 - confidence) / tf.to_float(vocab_size - 1)
+      xentropy = _chunked_smoothing_cross_entropy(
+          chunked_outputs, softmax_weights, chunked_labels, confidence,
+          low_confidence)
+      xentropy = tf.reshape(
+          tf.reshape(xentropy, [-1])[:num_positions], tf.shape(labels))
+
+      # Subtract the best possible cross entropy, as in
+      # padded_cross_entropy_loss.
+      normalizing_constant = -(
+          confidence * tf.log(confidence) + tf.to_float(vocab_size - 1) *
+          low_confidence * tf.log(low_confidence + 1e-20))
+      xentropy -= normalizing_constant
+
+    weights = tf.to_float(tf.not_equal(labels, 0))
+    return xentropy * weights, weights
+
+
+def sampled_softmax_loss(outputs, softmax_weights, labels, vocab_size,
+                         num_sampled):
+  """Calculate the sampled softmax loss from the pre-softmax outputs.
+
+  The softmax of every position is computed over its label and num_sampled
+  classes drawn for the whole batch from a log-uniform distribution, which
+  assumes that the lower ids are the more frequent tokens. The loss is a biased
+  estimate of the cross entropy, meant for training only, and does not use
+  label smoothing.
+
+  Args:
+    outputs: Tensor of size [batch_size, length, hidden_size]
+    softmax_weights: Tensor of size [vocab_size, hidden_size]
+    labels: Tensor of size [batch_size, length]
+    vocab_size: int size of the vocabulary
+    num_sampled: int number of classes sampled per batch.
+  Returns:
+    Returns the loss and weight tensors: float32 tensors with shape
+      [batch_size, length]
+  """
+  with tf.name_scope("sampled_loss", [outputs, softmax_weights, labels]):
+    hidden_size = tf.shape(outputs)[-1]
+    xentropy = tf.nn.sampled_softmax_loss(
+        weights=softmax_weights,
+        biases=tf.zeros([vocab_size]),
+        labels=tf.reshape(tf.cast(labels, tf.int64), [-1, 1]),
+        inputs=tf.reshape(outputs, [-1, hidden_size]),
+        num_sampled=num_sampled,
+        num_classes=vocab_size)
+    xentropy = tf.reshape(xentropy, tf.shape(labels))
+
+    weights = tf.to_float(tf.not_equal(labels, 0))
+    return xentropy * weights, weights
+
+
 def _convert_to_eval_metric(metric_fn):
   """Wrap a metric fn that returns scores and weights as an eval metric fn.
 
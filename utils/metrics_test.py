@@ -0,0 +1,107 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the padded, chunked and sampled cross entropy losses."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from utils import metrics
+
+_VOCAB_SIZE = 50
+_HIDDEN_SIZE = 8
+
+
+class PaddedCrossEntropyLossTest(tf.test.TestCase):
+
+    def _loss_and_gradients(self, method, smoothing):
+        rng = np.random.RandomState(0)
+        logits = tf.constant(rng.normal(scale=3., size=[3, 7, _VOCAB_SIZE]),
+                             dtype=tf.float32)
+        # Labels are shorter than the logits, and end with padding.
+        labels = rng.randint(1, _VOCAB_SIZE, size=[3, 5])
+        labels[0, 3:] = 0
+        xentropy, weights = metrics.padded_cross_entropy_loss(
+            logits, tf.constant(labels), smoothing, _VOCAB_SIZE, method=method)
+        loss = tf.reduce_sum(xentropy) / tf.reduce_sum(weights)
+        with self.test_session() as sess:
+            return sess.run([xentropy, tf.gradients(loss, logits)[0]])
+
+    def test_logsumexp_matches_one_hot(self):
+        for smoothing in (0., 0.1):
+            xentropy, gradients = self._loss_and_gradients("one_hot", smoothing)
+            xentropy_lse, gradients_lse = self._loss_and_gradients(
+                "logsumexp", smoothing)
+            self.assertAllClose(xentropy, xentropy_lse, rtol=1e-5, atol=1e-5)
+            self.assertAllClose(gradients, gradients_lse, rtol=1e-5, atol=1e-6)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            metrics.padded_cross_entropy_loss(
+                tf.zeros([1, 2, _VOCAB_SIZE]), tf.zeros([1, 2], tf.int32), 0.1,
+                _VOCAB_SIZE, method="sampled")
+
+
+class ChunkedCrossEntropyLossTest(tf.test.TestCase):
+
+    def _inputs(self):
+        rng = np.random.RandomState(0)
+        outputs = tf.constant(rng.normal(size=[3, 5, _HIDDEN_SIZE]),
+                              dtype=tf.float32)
+        softmax_weights = tf.constant(
+            rng.normal(size=[_VOCAB_SIZE, _HIDDEN_SIZE]), dtype=tf.float32)
+        labels = rng.randint(1, _VOCAB_SIZE, size=[3, 5])
+        labels[1, 2:] = 0
+        return outputs, softmax_weights, tf.constant(labels)
+
+    def _run(self, xentropy, weights, outputs, softmax_weights):
+        loss = tf.reduce_sum(xentropy) / tf.reduce_sum(weights)
+        with self.test_session() as sess:
+            return sess.run(
+                [xentropy] + tf.gradients(loss, [outputs, softmax_weights]))
+
+    def test_chunked_matches_padded(self):
+        outputs, softmax_weights, labels = self._inputs()
+        logits = tf.einsum("blh,vh->blv", outputs, softmax_weights)
+        xentropy, weights = metrics.padded_cross_entropy_loss(
+            logits, labels, 0.1, _VOCAB_SIZE)
+        expected = self._run(xentropy, weights, outputs, softmax_weights)
+
+        # 15 positions do not fill the last chunk of 4 positions.
+        for chunk_size in (4, 15, 64):
+            xentropy, weights = metrics.chunked_cross_entropy_loss(
+                outputs, softmax_weights, labels, 0.1, _VOCAB_SIZE,
+                chunk_size=chunk_size)
+            results = self._run(xentropy, weights, outputs, softmax_weights)
+            for value, expected_value in zip(results, expected):
+                self.assertAllClose(expected_value, value, rtol=1e-5, atol=1e-5)
+
+    def test_sampled_softmax_loss(self):
+        outputs, softmax_weights, labels = self._inputs()
+        xentropy, weights = metrics.sampled_softmax_loss(
+            outputs, softmax_weights, labels, _VOCAB_SIZE, num_sampled=10)
+        xentropy, d_outputs, _ = self._run(
+            xentropy, weights, outputs, softmax_weights)
+        self.assertEqual((3, 5), xentropy.shape)
+        self.assertAllEqual(np.zeros(3), xentropy[1, 2:])
+        self.assertTrue(np.all(xentropy[0] > 0))
+        self.assertEqual((3, 5, _HIDDEN_SIZE), d_outputs.shape)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -80,6 +80,9 @@ class Subtokenizer(object):
         self._cache_size = 2 ** 20
         self._cache = [(None, None)] * self._cache_size
 
+        # Create cache to speed up unescaping of decoded tokens
+        self._unescape_cache = [(None, None)] * self._cache_size
+
     @staticmethod
     def init_from_files(
         vocab_file, files, target_vocab_size, threshold, min_count=None,
@@ -161,6 +164,49 @@ class Subtokenizer(object):
         return _unicode_to_native(
             _join_tokens_to_string(self._subtoken_ids_to_tokens(subtokens)))
 
+    def decode_batch(self, subtokens_batch):
+        """Converts a batch of int subtoken id sequences into strings.
+
+        Each sequence is truncated at its first EOS_ID. The EOS positions of a
+        [batch, length] array are found with a single NumPy operation.
+
+        Args:
+          subtokens_batch: 2-D array of subtoken ids (e.g. the padded model
+            outputs), or list of subtoken id sequences.
+
+        Returns:
+          List of decoded strings.
+        """
+        if isinstance(subtokens_batch, np.ndarray) and subtokens_batch.ndim == 2:
+            is_eos = subtokens_batch == EOS_ID
+            lengths = np.where(is_eos.any(axis=1), is_eos.argmax(axis=1),
+                               subtokens_batch.shape[1]).tolist()
+            rows = subtokens_batch.tolist()
+        else:
+            rows = [np.asarray(subtokens).tolist() for subtokens in subtokens_batch]
+            lengths = [row.index(EOS_ID) if EOS_ID in row else len(row)
+                       for row in rows]
+
+        ret = []
+        for row, length in zip(rows, lengths):
+            if length:
+                ret.append(_unicode_to_native(_join_tokens_to_string(
+                    self._subtoken_ids_to_tokens(row[:length]))))
+            else:
+                ret.append("")
+        return ret
+
+    def _cached_unescape_token(self, token):
+        """Unescape a single token, caching the results."""
+        cache_location = hash(token) % self._cache_size
+        cache_key, cache_value = self._unescape_cache[cache_location]
+        if cache_key == token:
+            return cache_value
+
+        ret = _unescape_token(token)
+        self._unescape_cache[cache_location] = (token, ret)
+        return ret
+
     def _subtoken_ids_to_tokens(self, subtokens):
         """Convert list of int subtoken ids to a list of string tokens."""
         escaped_tokens = "".join([
@@ -173,7 +219,7 @@ class Subtokenizer(object):
         ret = []
         for token in escaped_tokens:
             if token:
-                ret.append(_unescape_token(token))
+                ret.append(self._cached_unescape_token(token))
         return ret
 
 
@@ -17,6 +17,7 @@
 import collections
 import tempfile
 
+import numpy as np
 import tensorflow as tf  # pylint: disable=g-bad-import-order
 
 from utils import tokenizer
@@ -46,6 +47,17 @@ class SubtokenizerTest(tf.test.TestCase):
         decoded_str = subtokenizer.decode(encoded_list)
         self.assertEqual("testing 123", decoded_str)
 
+    def test_decode_batch(self):
+        vocab_list = ["<pad>", "<EOS>", "123_", "test", "ing_"]
+        subtokenizer = self._init_subtokenizer(vocab_list)
+        encoded = np.array([[3, 4, 2, 1, 0],
+                            [2, 1, 3, 4, 0],
+                            [1, 0, 0, 0, 0]])
+        self.assertEqual(["testing 123", "123", ""],
+                         subtokenizer.decode_batch(encoded))
+        self.assertEqual(["testing 123", "123"],
+                         subtokenizer.decode_batch([[3, 4, 2], [2, 1, 3]]))
+
     def test_subtoken_ids_to_tokens(self):
         vocab_list = ["123_", "test", "ing_"]
         subtokenizer = self._init_subtokenizer(vocab_list)
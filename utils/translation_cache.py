@@ -0,0 +1,173 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Cache of translations keyed by the normalized source sentence.
+
+The cache has two tiers:
+  1. An in-memory LRU of at most `capacity` entries.
+  2. An optional SQLite database, which can be shared across runs.
+
+Every entry belongs to a signature, built from the model checkpoint and the
+decoding parameters, so that translations produced by a different model or with
+different beam parameters are never returned. Entries older than `ttl` seconds
+are treated as missing in both tiers.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import re
+import sqlite3
+import time
+import unicodedata
+
+import six
+import tensorflow as tf
+
+_WHITESPACE_REGEX = re.compile(r"\s+", re.UNICODE)
+
+
+def normalize(text):
+    """Return the cache key of a source sentence.
+
+    The text is converted to unicode NFC form, and runs of whitespace are
+    collapsed to single spaces.
+    """
+    if isinstance(text, six.binary_type):
+        text = text.decode("utf-8")
+    text = unicodedata.normalize("NFC", text)
+    return _WHITESPACE_REGEX.sub(u" ", text).strip()
+
+
+def make_signature(checkpoint, **decode_params):
+    """Return a string identifying the model checkpoint and decoding parameters.
+
+    Args:
+      checkpoint: Path of the checkpoint used to translate.
+      **decode_params: Parameters that affect the translations (e.g. beam_size,
+        alpha, extra_decode_length).
+    """
+    params = ",".join("%s=%s" % (k, decode_params[k])
+                      for k in sorted(decode_params))
+    return "%s|%s" % (checkpoint, params)
+
+
+class TranslationCache(object):
+    """Two-tier LRU/TTL cache of translations."""
+
+    def __init__(self, signature, capacity=100000, ttl=None, db_path=None):
+        """Create the cache.
+
+        Args:
+          signature: String returned by make_signature(). Only entries with the
+            same signature are read from the on-disk tier.
+          capacity: Maximum number of entries kept in memory.
+          ttl: Number of seconds after which an entry expires. If None, entries
+            never expire.
+          db_path: Path of the SQLite database used as on-disk tier. If None, only
+            the in-memory tier is used.
+        """
+        self.signature = signature
+        self.capacity = capacity
+        self.ttl = ttl
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # Maps normalized source -> (translation, creation time), in LRU order.
+        self._entries = collections.OrderedDict()
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "signature TEXT NOT NULL, source TEXT NOT NULL, "
+                "translation TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (signature, source))")
+            self._db.commit()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key, translation, created):
+        # Re-insert the key, so that it becomes the most recently used entry.
+        self._entries.pop(key, None)
+        self._entries[key] = (translation, created)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, source):
+        """Return the cached translation of source, or None."""
+        key = normalize(source)
+
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            if not self._expired(entry[1]):
+                self._entries[key] = entry
+                self.memory_hits += 1
+                return entry[0]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT translation, created FROM translations "
+                "WHERE signature = ? AND source = ?",
+                (self.signature, key)).fetchone()
+            if row is not None and not self._expired(row[1]):
+                self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def put(self, source, translation):
+        """Add the translation of source to both tiers."""
+        key = normalize(source)
+        created = time.time()
+        self._remember(key, translation, created)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                (self.signature, key, translation, created))
+
+    def flush(self):
+        """Write the pending entries of the on-disk tier."""
+        if self._db is not None:
+            self._db.commit()
+
+    def close(self):
+        """Flush and close the on-disk tier."""
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    @property
+    def lookups(self):
+        return self.memory_hits + self.disk_hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return (self.memory_hits + self.disk_hits) / max(self.lookups, 1)
+
+    def log_stats(self):
+        """Log the number of lookups and the hit rate of each tier."""
+        tf.logging.info(
+            "Translation cache: %d lookups, %d memory hits, %d disk hits, "
+            "%d misses (hit rate %.2f%%)." % (
+                self.lookups, self.memory_hits, self.disk_hits, self.misses,
+                100. * self.hit_rate))
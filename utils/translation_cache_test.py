@@ -0,0 +1,80 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test the two-tier translation cache."""
+
+import os
+
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from utils import translation_cache
+
+
+class NormalizeTest(tf.test.TestCase):
+
+    def test_whitespace_is_collapsed(self):
+        self.assertEqual(u"Save changes ?",
+                         translation_cache.normalize("  Save \t changes\n? "))
+
+    def test_unicode_is_composed(self):
+        self.assertEqual(translation_cache.normalize(u"caf\u00e9"),
+                         translation_cache.normalize(u"cafe\u0301"))
+
+
+class TranslationCacheTest(tf.test.TestCase):
+
+    def test_memory_lru_eviction(self):
+        cache = translation_cache.TranslationCache("sig", capacity=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        self.assertEqual("A", cache.get("a"))  # "b" is now least recently used.
+        cache.put("c", "C")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("A", cache.get("a"))
+        self.assertEqual("C", cache.get(" c "))
+        self.assertEqual(3, cache.memory_hits)
+        self.assertEqual(1, cache.misses)
+        self.assertAllClose(0.75, cache.hit_rate)
+
+    def test_entries_expire(self):
+        cache = translation_cache.TranslationCache("sig", ttl=10)
+        with tf.test.mock.patch.object(translation_cache.time, "time") as now:
+            now.return_value = 100.
+            cache.put("a", "A")
+            now.return_value = 105.
+            self.assertEqual("A", cache.get("a"))
+            now.return_value = 111.
+            self.assertIsNone(cache.get("a"))
+
+    def test_disk_tier_is_shared_between_runs(self):
+        db_path = os.path.join(self.get_temp_dir(), "cache.db")
+        cache = translation_cache.TranslationCache("sig", db_path=db_path)
+        cache.put("Hello world", "Hallo Welt")
+        cache.close()
+
+        cache = translation_cache.TranslationCache("sig", db_path=db_path)
+        self.assertEqual("Hallo Welt", cache.get("Hello  world"))
+        self.assertEqual(1, cache.disk_hits)
+        self.assertEqual("Hallo Welt", cache.get("Hello world"))
+        self.assertEqual(1, cache.memory_hits)
+        cache.close()
+
+        other = translation_cache.TranslationCache("other", db_path=db_path)
+        self.assertIsNone(other.get("Hello world"))
+        other.close()
+
+
+if __name__ == "__main__":
+    tf.test.main()
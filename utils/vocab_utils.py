@@ -20,7 +20,10 @@ from __future__ import division
 from __future__ import print_function
 
 import codecs
+import itertools
 import os
+
+import numpy as np
 import tensorflow as tf
 
 UNK = "<unk>"
@@ -38,7 +41,11 @@ class VocabHelper(object):
             src_vocab_file, tgt_vocab_file, share_vocab)
         self.reverse_tgt_vocab_table = reverse_vocab_table(self.tgt_vocab_table)
 
-        pass
+        self.src_vocab = ArrayVocab(self.src_vocab_table)
+        if self.tgt_vocab_table is self.src_vocab_table:
+            self.tgt_vocab = self.src_vocab
+        else:
+            self.tgt_vocab = ArrayVocab(self.tgt_vocab_table)
 
     def encode(self, raw_string, add_eos=False):
         return _encode(self.src_vocab_table, raw_string, add_eos)
@@ -54,6 +61,102 @@ class VocabHelper(object):
                          if token_id in self.reverse_tgt_vocab_table else UNK
                          for token_id in ids])
 
+    def encode_batch(self, raw_strings, add_eos=False):
+        return self.src_vocab.encode_batch(raw_strings, add_eos)
+
+    def encode_source_batch(self, raw_strings, add_eos=False):
+        return self.src_vocab.encode_batch(raw_strings, add_eos)
+
+    def encode_target_batch(self, raw_strings, add_eos=False):
+        return self.tgt_vocab.encode_batch(raw_strings, add_eos)
+
+    def decode_batch(self, ids_batch):
+        return self.tgt_vocab.decode_batch(ids_batch)
+
+
+class ArrayVocab(object):
+    """Vocabulary that encodes and decodes whole batches of lines at once.
+
+    Ids are mapped to tokens with a NumPy array, and tokens are mapped to ids
+    with a hash table. Encoding splits all the lines of a batch in a single pass,
+    and decoding looks up all the ids of a batch with a single indexing
+    operation, so that the per-token work happens outside the Python
+    interpreter loop.
+    """
+
+    def __init__(self, vocab_table):
+        """Create the arrays from a dictionary mapping tokens to ids."""
+        self.token_to_id = dict(vocab_table)
+        self.vocab_size = max(self.token_to_id.values()) + 1 if vocab_table else 0
+
+        # Ids that are not in the vocabulary (including the last slot, used for
+        # ids out of range) are decoded as UNK.
+        self.id_to_token = np.full(self.vocab_size + 1, UNK, dtype=object)
+        for token, token_id in self.token_to_id.items():
+            self.id_to_token[token_id] = token
+
+    def encode_batch(self, raw_strings, add_eos=False):
+        """Encode a list of lines, splitting tokens on single spaces.
+
+        Args:
+          raw_strings: List of strings to encode.
+          add_eos: If true, EOS_ID is appended to every encoded line.
+
+        Returns:
+          List of int64 arrays with the token ids of each line.
+        """
+        if not raw_strings:
+            return []
+        tokens = " ".join(raw_strings).split(" ")
+        ids = np.fromiter(
+            map(self.token_to_id.get, tokens, itertools.repeat(UNK_ID)),
+            dtype=np.int64, count=len(tokens))
+
+        lengths = np.array([line.count(" ") + 1 for line in raw_strings])
+        ends = np.cumsum(lengths)
+        if add_eos:
+            ids = np.insert(ids, ends, EOS_ID)
+            ends += np.arange(1, len(ends) + 1)
+        return np.split(ids, ends[:-1])
+
+    def decode_batch(self, ids_batch):
+        """Decode a batch of id sequences into strings.
+
+        Each sequence is truncated at its first EOS_ID.
+
+        Args:
+          ids_batch: 2-D array (e.g. padded model outputs) or list of id
+            sequences.
+
+        Returns:
+          List of decoded strings.
+        """
+        if len(ids_batch) == 0:  # pylint: disable=g-explicit-length-test
+            return []
+
+        if isinstance(ids_batch, np.ndarray) and ids_batch.ndim == 2:
+            is_eos = ids_batch == EOS_ID
+            lengths = np.where(
+                is_eos.any(axis=1), is_eos.argmax(axis=1), ids_batch.shape[1])
+            flat_ids = ids_batch[np.arange(ids_batch.shape[1]) < lengths[:, None]]
+        else:
+            sequences = [_trim_eos(np.asarray(ids, dtype=np.int64))
+                         for ids in ids_batch]
+            lengths = np.array([len(ids) for ids in sequences], dtype=np.int64)
+            flat_ids = np.concatenate(sequences)
+
+        flat_ids = np.where((flat_ids >= 0) & (flat_ids < self.vocab_size),
+                            flat_ids, self.vocab_size)
+        tokens = self.id_to_token[flat_ids]
+        ends = np.cumsum(lengths)
+        return [" ".join(line) for line in np.split(tokens, ends[:-1])]
+
+
+def _trim_eos(ids):
+    """Return the ids up to (not including) the first EOS_ID."""
+    eos = np.flatnonzero(ids == EOS_ID)
+    return ids[:eos[0]] if eos.size else ids
+
 
 def _encode(src_vocab_table, raw_string, add_eos=False):
     token_ids = [src_vocab_table[token] if token in src_vocab_table else UNK_ID
@@ -122,3 +225,20 @@ def create_vocab_tables(src_vocab_file, tgt_vocab_file, share_vocab):
         for token in load_vocab(tgt_vocab_file)[0]:
             tgt_vocab_table[token] = len(tgt_vocab_table)
     return src_vocab_table, tgt_vocab_table
+
+
+def create_lookup_tables(src_vocab_file, tgt_vocab_file, share_vocab):
+    """Creates TensorFlow lookup tables mapping tokens to ids.
+
+    Unlike create_vocab_tables, the tables can be used inside the graph (e.g.
+    in tf.data pipelines). They must be initialized with tf.tables_initializer().
+    Tokens that are not in the vocabulary are mapped to UNK_ID.
+    """
+    src_vocab_table = tf.contrib.lookup.index_table_from_file(
+        src_vocab_file, default_value=UNK_ID)
+    if share_vocab:
+        tgt_vocab_table = src_vocab_table
+    else:
+        tgt_vocab_table = tf.contrib.lookup.index_table_from_file(
+            tgt_vocab_file, default_value=UNK_ID)
+    return src_vocab_table, tgt_vocab_table
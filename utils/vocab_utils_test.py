@@ -0,0 +1,64 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test VocabHelper and the batched vocabulary lookups."""
+
+import tempfile
+
+import numpy as np
+import tensorflow as tf  # pylint: disable=g-bad-import-order
+
+from utils import vocab_utils
+
+
+class VocabHelperTest(tf.test.TestCase):
+
+    def _init_vocab_helper(self, vocab_list):
+        temp_file = tempfile.NamedTemporaryFile(delete=False)
+        with tf.gfile.Open(temp_file.name, 'w') as w:
+            for token in vocab_list:
+                w.write(token)
+                w.write("\n")
+        return vocab_utils.VocabHelper(temp_file.name)
+
+    def setUp(self):
+        super(VocabHelperTest, self).setUp()
+        self.vocab_helper = self._init_vocab_helper(
+            [vocab_utils.UNK, vocab_utils.SOS, vocab_utils.EOS,
+             "hello", "world", "foo@@", "bar"])
+
+    def test_encode_batch_matches_encode(self):
+        lines = ["hello world", "foo@@ bar baz", "", "world  hello"]
+        encoded = self.vocab_helper.encode_batch(lines, add_eos=True)
+        self.assertEqual(len(lines), len(encoded))
+        for line, ids in zip(lines, encoded):
+            self.assertEqual(self.vocab_helper.encode(line, add_eos=True),
+                             ids.tolist())
+
+    def test_encode_batch_empty(self):
+        self.assertEqual([], self.vocab_helper.encode_batch([]))
+
+    def test_decode_batch_matches_decode(self):
+        ids_batch = [[3, 4, 2, 5], [5, 6, 9], [2, 3]]
+        decoded = self.vocab_helper.decode_batch(ids_batch)
+        self.assertEqual(["hello world", "foo@@ bar <unk>", ""], decoded)
+
+    def test_decode_batch_padded_array(self):
+        ids_batch = np.array([[3, 4, 2, 0], [6, 3, 4, 3]], dtype=np.int64)
+        decoded = self.vocab_helper.decode_batch(ids_batch)
+        self.assertEqual(["hello world", "bar hello world hello"], decoded)
+
+
+if __name__ == "__main__":
+    tf.test.main()